@@ -5,7 +5,8 @@
 import stat
 import sys
 import time
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import timedelta
 from functools import partial
@@ -35,7 +36,7 @@
 from .helpers import Error, IntegrityError, set_ec
 from .platform import uid2user, user2uid, gid2group, group2gid, get_birthtime_ns
 from .helpers import parse_timestamp, archive_ts_now
-from .helpers import OutputTimestamp, format_timedelta, format_file_size, file_status, FileSize
+from .helpers import OutputTimestamp, format_timedelta, format_file_size, format_io_rate, file_status, FileSize
 from .helpers import safe_encode, make_path_safe, remove_surrogates, text_to_json, join_cmd, remove_dotdot_prefixes
 from .helpers import StableDict
 from .helpers import bin_to_hex
@@ -67,6 +68,8 @@ def __init__(self, output_json=False, iec=False):
         self.hashing_time = 0.0
         self.rx_bytes = 0
         self.tx_bytes = 0
+        self.rpc_window = None  # summary of the RemoteRepository in-flight window (if any)
+        self.rpc_window_history = None  # history of the RemoteRepository in-flight window (if any)
 
     def update(self, size, unique):
         self.osize += size
@@ -84,12 +87,17 @@ def __add__(self, other):
         stats.hashing_time = self.hashing_time + other.hashing_time
         st1, st2 = self.files_stats, other.files_stats
         stats.files_stats = defaultdict(int, {key: (st1[key] + st2[key]) for key in st1.keys() | st2.keys()})
+        stats.rpc_window = other.rpc_window if other.rpc_window is not None else self.rpc_window
+        stats.rpc_window_history = (
+            other.rpc_window_history if other.rpc_window_history is not None else self.rpc_window_history
+        )
 
         return stats
 
     def __str__(self):
         hashing_time = format_timedelta(timedelta(seconds=self.hashing_time))
         chunking_time = format_timedelta(timedelta(seconds=self.chunking_time))
+        rpc_window = f"RPC in-flight window: {self.rpc_window}\n" if self.rpc_window is not None else ""
         return """\
 Number of files: {stats.nfiles}
 Original size: {stats.osize_fmt}
@@ -103,8 +111,9 @@ def __str__(self):
 Files changed while reading: {files_changed_while_reading}
 Bytes read from remote: {stats.rx_bytes}
 Bytes sent to remote: {stats.tx_bytes}
-""".format(
+{rpc_window}""".format(
             stats=self,
+            rpc_window=rpc_window,
             hashing_time=hashing_time,
             chunking_time=chunking_time,
             added_files=self.files_stats["A"],
@@ -126,6 +135,8 @@ def as_dict(self):
             "hashing_time": self.hashing_time,
             "chunking_time": self.chunking_time,
             "files_stats": self.files_stats,
+            "rpc_window": self.rpc_window,
+            "rpc_window_history": self.rpc_window_history,
         }
 
     def as_raw_dict(self):
@@ -263,17 +274,19 @@ def __init__(self, repository, repo_objs):
         self.repository = repository
         self.repo_objs = repo_objs
         self.hlids_preloaded = None
+        self.objs_read = self.bytes_read = 0  # repository objects fetched by fetch_many
 
-    def unpack_many(self, ids, *, filter=None):
+    def unpack_many(self, ids, *, filter=None, workers=1):
         """
         Return iterator of items.
 
         *ids* is a chunk ID list of an item content data stream.
         *filter* is an optional callable to decide whether an item will be yielded, default: yield all items.
+        *workers* is the count of threads parsing (decrypting, decompressing) the item content data stream chunks.
         """
         self.hlids_preloaded = set()
         unpacker = msgpack.Unpacker(use_list=False)
-        for data in self.fetch_many(ids, ro_type=ROBJ_ARCHIVE_STREAM, replacement_chunk=False):
+        for data in self.fetch_many(ids, ro_type=ROBJ_ARCHIVE_STREAM, replacement_chunk=False, workers=workers):
             if data is None:
                 continue  # archive stream chunk missing
             unpacker.feed(data)
@@ -314,7 +327,13 @@ def preload_item_chunks(self, item, optimize_hardlinks=False):
                 self.repository.preload([c.id for c in item.chunks])
         return preload_chunks
 
-    def fetch_many(self, chunks, is_preloaded=False, ro_type=None, replacement_chunk=True):
+    def fetch_many(self, chunks, is_preloaded=False, ro_type=None, replacement_chunk=True, workers=1):
+        """
+        Return iterator of the data of the given chunks (in the same order).
+
+        With workers > 1, the chunks are parsed (decrypted, decompressed, verified) by multiple
+        threads, while the next chunks are fetched from the repository.
+        """
         assert ro_type is not None
         ids = []
         sizes = []
@@ -327,9 +346,8 @@ def fetch_many(self, chunks, is_preloaded=False, ro_type=None, replacement_chunk
             sizes = [None] * len(ids)
         else:
             raise TypeError(f"unsupported or mixed element types: {chunks}")
-        for id, size, cdata in zip(
-            ids, sizes, self.repository.get_many(ids, is_preloaded=is_preloaded, raise_missing=False)
-        ):
+
+        def parse(id, size, cdata):
             if cdata is None:
                 if replacement_chunk and size is not None:
                     logger.error(f"repository object {bin_to_hex(id)} missing, returning {size} zero bytes.")
@@ -340,7 +358,28 @@ def fetch_many(self, chunks, is_preloaded=False, ro_type=None, replacement_chunk
             else:
                 _, data = self.repo_objs.parse(id, cdata, ro_type=ro_type)
             assert size is None or len(data) == size
-            yield data
+            return data
+
+        def get_many():
+            for cdata in self.repository.get_many(ids, is_preloaded=is_preloaded, raise_missing=False):
+                if cdata is not None:
+                    self.objs_read += 1
+                    self.bytes_read += len(cdata)
+                yield cdata
+
+        objects = zip(ids, sizes, get_many())
+        if workers <= 1:
+            for id, size, cdata in objects:
+                yield parse(id, size, cdata)
+            return
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="borg-parse") as executor:
+            pending = deque()  # futures of the chunks being parsed, in order
+            for id, size, cdata in objects:
+                pending.append(executor.submit(parse, id, size, cdata))
+                if len(pending) > 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
 
 
 class ChunkBuffer:
@@ -644,8 +683,10 @@ def __repr__(self):
     def item_filter(self, item, filter=None):
         return filter(item) if filter else True
 
-    def iter_items(self, filter=None):
-        yield from self.pipeline.unpack_many(self.metadata.items, filter=lambda item: self.item_filter(item, filter))
+    def iter_items(self, filter=None, workers=1):
+        yield from self.pipeline.unpack_many(
+            self.metadata.items, filter=lambda item: self.item_filter(item, filter), workers=workers
+        )
 
     def preload_item_chunks(self, item, optimize_hardlinks=False):
         """
@@ -709,9 +750,10 @@ def save(self, name=None, comment=None, timestamp=None, stats=None, additional_m
                 raise Error("%s - archive too big (issue #1473)!" % err_msg)
             else:
                 raise
+        self.cache.flush_chunks()
         while self.repository.async_response(wait=True) is not None:
             pass
-        self.manifest.archives.create(name, self.id, metadata.time)
+        self.manifest.archives.create(name, self.id, metadata.time, metadata=metadata)
         self.manifest.write()
         return metadata
 
@@ -997,7 +1039,7 @@ def set_meta(self, key, value):
         data = self.key.pack_metadata(metadata.as_dict())
         new_id = self.key.id_hash(data)
         self.cache.add_chunk(new_id, {}, data, stats=self.stats, ro_type=ROBJ_ARCHIVE_META)
-        self.manifest.archives.create(self.name, new_id, metadata.time, overwrite=True)
+        self.manifest.archives.create(self.name, new_id, metadata.time, overwrite=True, metadata=metadata)
         self.id = new_id
 
     def rename(self, name):
@@ -1160,29 +1202,98 @@ def cached_hash(chunk, id_hash):
 class ChunksProcessor:
     # Processes an iterator of chunks for an Item
 
+    # lazy chunks index: read ahead (and hash) up to this many chunks / bytes to ask the repo about them at once
+    READAHEAD_CHUNKS = 100
+    READAHEAD_BYTES = 32 * 1024 * 1024
+
     def __init__(self, *, key, cache, add_item, rechunkify):
         self.key = key
         self.cache = cache
         self.add_item = add_item
         self.rechunkify = rechunkify
 
-    def process_file_chunks(self, item, cache, stats, show_progress, chunk_iter, chunk_processor=None):
+    def process_file_chunks(
+        self, item, cache, stats, show_progress, chunk_iter, chunk_processor=None, known_blocks=None
+    ):
+        """
+        Process the chunks of a file and set item.chunks.
+
+        :param known_blocks: None or a dict checksum -> ChunkListEntry of the blocks known from the
+                             previous backup of this file (see Cache.known_blocks). If given, data
+                             chunks with a known checksum are reused without computing their id hash.
+        :return: dict checksum -> ChunkListEntry of the file's data chunks, if known_blocks was given.
+        """
+        blocks = {}
+        chunks_args = ((chunk,) for chunk in chunk_iter)
         if not chunk_processor:
 
-            def chunk_processor(chunk):
+            def chunk_processor(chunk, checksum=None, hashed=None):
+                # checksum and hashed (chunk id and data) might have been computed already, see readahead.
                 started_hashing = time.monotonic()
-                chunk_id, data = cached_hash(chunk, self.key.id_hash)
+                if known_blocks is not None and chunk.meta["allocation"] == CH_DATA:
+                    if checksum is None:
+                        checksum = cache.blocks_checksum(chunk.data)
+                    block = known_blocks.get(checksum)
+                    if block is not None and cache.seen_chunk(block.id, chunk.meta["size"]):
+                        stats.hashing_time += time.monotonic() - started_hashing
+                        chunk_entry = blocks[checksum] = cache.reuse_chunk(block.id, block.size, stats)
+                        return chunk_entry
+                chunk_id, data = hashed or cached_hash(chunk, self.key.id_hash)
                 stats.hashing_time += time.monotonic() - started_hashing
                 chunk_entry = cache.add_chunk(chunk_id, {}, data, stats=stats, wait=False, ro_type=ROBJ_FILE_STREAM)
                 self.cache.repository.async_response(wait=False)
+                if checksum is not None:
+                    blocks[checksum] = chunk_entry
                 return chunk_entry
 
+            if getattr(cache, "chunks_lazy", False):
+                chunks_args = self.readahead(cache, stats, chunk_iter, known_blocks)
+
         item.chunks = []
-        for chunk in chunk_iter:
-            chunk_entry = chunk_processor(chunk)
+        for args in chunks_args:
+            chunk_entry = chunk_processor(*args)
             item.chunks.append(chunk_entry)
             if show_progress:
                 stats.show_progress(item=item, dt=0.2)
+        if known_blocks is not None:
+            return blocks
+
+    def readahead(self, cache, stats, chunk_iter, known_blocks):
+        """
+        Read ahead and hash groups of chunks and ask the repo about all of them at once (lazy chunks index).
+
+        Otherwise, add_chunk would ask the repo about each new chunk separately (one round trip per chunk).
+        Yields (chunk, checksum, hashed) tuples for chunk_processor.
+        """
+        group = []
+        group_bytes = 0
+
+        def prefetched():
+            ids = []
+            for chunk, checksum, hashed in group:
+                block = known_blocks.get(checksum) if checksum is not None else None
+                ids.append(block.id if block is not None else hashed[0])
+            cache.seen_chunks(ids)  # one has_many call for the whole group
+            yield from group
+            group.clear()
+
+        for chunk in chunk_iter:
+            started_hashing = time.monotonic()
+            checksum = hashed = None
+            if chunk.meta["allocation"] == CH_DATA:
+                # the chunker may reuse the buffer behind a memoryview, so we need our own copy of the data.
+                chunk = chunk._replace(data=bytes(chunk.data))
+                group_bytes += len(chunk.data)
+                if known_blocks is not None:
+                    checksum = cache.blocks_checksum(chunk.data)
+            if checksum is None or checksum not in known_blocks:
+                hashed = cached_hash(chunk, self.key.id_hash)
+            stats.hashing_time += time.monotonic() - started_hashing
+            group.append((chunk, checksum, hashed))
+            if len(group) >= self.READAHEAD_CHUNKS or group_bytes >= self.READAHEAD_BYTES:
+                yield from prefetched()
+                group_bytes = 0
+        yield from prefetched()
 
 
 def maybe_exclude_by_attr(item):
@@ -1215,6 +1326,8 @@ def __init__(
         log_json,
         iec,
         file_status_printer=None,
+        chunker_threads=1,
+        blocks_cache=False,
     ):
         self.metadata_collector = metadata_collector
         self.cache = cache
@@ -1227,7 +1340,8 @@ def __init__(
         self.hlm = HardLinkManager(id_type=tuple, info_type=(list, type(None)))  # (dev, ino) -> chunks or None
         self.stats = Statistics(output_json=log_json, iec=iec)  # threading: done by cache (including progress)
         self.cwd = os.getcwd()
-        self.chunker = get_chunker(*chunker_params, key=key, sparse=sparse)
+        self.chunker = get_chunker(*chunker_params, key=key, sparse=sparse, threads=chunker_threads)
+        self.blocks_cache = blocks_cache
 
     @contextmanager
     def create_helper(self, path, st, status=None, hardlinkable=True, strip_prefix=None):
@@ -1413,11 +1527,9 @@ def process_file(self, *, path, parent_fd, name, st, cache, flags=flags_normal,
                         known, chunks = False, None
                     if chunks is not None:
                         # Make sure all ids are available
-                        for chunk in chunks:
-                            if not cache.seen_chunk(chunk.id):
-                                # cache said it is unmodified, but we lost a chunk: process file like modified
-                                status = "M"
-                                break
+                        if not all(cache.seen_chunks([chunk.id for chunk in chunks])):
+                            # cache said it is unmodified, but we lost a chunk: process file like modified
+                            status = "M"
                         else:
                             item.chunks = []
                             for chunk in chunks:
@@ -1425,22 +1537,33 @@ def process_file(self, *, path, parent_fd, name, st, cache, flags=flags_normal,
                                 cache.reuse_chunk(chunk.id, chunk.size, self.stats)
                                 item.chunks.append(chunk)
                             status = "U"  # regular file, unchanged
+                            if self.blocks_cache:
+                                # we did not read the file, but we still need its blocks when it changes.
+                                cache.touch_blocks(path_hash)
                     else:
                         status = "M" if known else "A"  # regular file, modified or added
                     self.print_file_status(status, path)
                     # Only chunkify the file if needed
                     changed_while_backup = False
                     if "chunks" not in item:
+                        known_blocks = None
+                        if self.blocks_cache:
+                            # special files are also supported here, the blocks cache is validated by the contents.
+                            blocks_path_hash = path_hash or self.key.id_hash(safe_encode(item.path))
+                            known_blocks = cache.known_blocks(blocks_path_hash)
                         start_reading = time.time_ns()
                         with backup_io("read"):
-                            self.process_file_chunks(
+                            blocks = self.process_file_chunks(
                                 item,
                                 cache,
                                 self.stats,
                                 self.show_progress,
                                 backup_io_iter(self.chunker.chunkify(None, fd)),
+                                known_blocks=known_blocks,
                             )
                             self.stats.chunking_time = self.chunker.chunking_time
+                        if known_blocks is not None:
+                            cache.memorize_blocks(blocks_path_hash, blocks)
                         end_reading = time.time_ns()
                         if not is_win32:  # TODO for win32
                             with backup_io("fstat2"):
@@ -1789,12 +1912,16 @@ def verify_data(self):
         errors = 0
         defect_chunks = []
         pi = ProgressIndicatorPercent(
-            total=chunks_count, msg="Verifying data %6.2f%%", step=0.01, msgid="check.verify_data"
+            total=chunks_count, msg="Verifying data %6.2f%% (%s)", step=0.01, msgid="check.verify_data"
         )
+        t_start = time.monotonic()
+        bytes_read = objs_read = 0
         for chunk_id, _ in self.chunks.iteritems():
-            pi.show()
+            pi.show(info=[format_io_rate(bytes_read, objs_read, time.monotonic() - t_start)])
             try:
                 encrypted_data = self.repository.get(chunk_id)
+                bytes_read += len(encrypted_data)
+                objs_read += 1
             except (Repository.ObjectNotFound, IntegrityErrorBase) as err:
                 self.error_found = True
                 errors += 1
@@ -1921,7 +2048,7 @@ def valid_archive(obj):
                     self.error_found = True
                     if self.repair:
                         logger.warning(f"Creating archives directory entry for {name} {archive_id_hex}.")
-                        self.manifest.archives.create(name, archive_id, archive.time)
+                        self.manifest.archives.create(name, archive_id, archive.time, metadata=archive)
                     else:
                         logger.warning(f"Would create archives directory entry for {name} {archive_id_hex}.")
 
@@ -2120,7 +2247,7 @@ def valid_item(obj):
                     logger.debug(f"archive id new: {bin_to_hex(new_archive_id)}")
                     cdata = self.repo_objs.format(new_archive_id, {}, data, ro_type=ROBJ_ARCHIVE_META)
                     add_reference(new_archive_id, len(data), cdata)
-                    self.manifest.archives.create(info.name, new_archive_id, info.ts)
+                    self.manifest.archives.create(info.name, new_archive_id, info.ts, metadata=archive)
                     if archive_id != new_archive_id:
                         self.manifest.archives.delete_by_id(archive_id)
             pi.finish()
@@ -38,14 +38,26 @@ def get_repository(location, *, create, exclusive, lock_wait, lock, args, v1_or_
         )
 
     elif location.proto in ("sftp", "file", "rclone") and not v1_or_v2:  # stuff directly supported by borgstore
-        repository = Repository(location, create=create, exclusive=exclusive, lock_wait=lock_wait, lock=lock)
+        repository = Repository(
+            location, create=create, exclusive=exclusive, lock_wait=lock_wait, lock=lock, **read_rate_limits(args)
+        )
 
     else:
         RepoCls = LegacyRepository if v1_or_v2 else Repository
-        repository = RepoCls(location.path, create=create, exclusive=exclusive, lock_wait=lock_wait, lock=lock)
+        kwargs = {} if v1_or_v2 else read_rate_limits(args)
+        repository = RepoCls(
+            location.path, create=create, exclusive=exclusive, lock_wait=lock_wait, lock=lock, **kwargs
+        )
     return repository
 
 
+def read_rate_limits(args):
+    """return the Repository kwargs for the --max-read-rate / --max-ops-rate options (if the command has them)"""
+    max_read_rate = getattr(args, "max_read_rate", None) or 0
+    max_ops_rate = getattr(args, "max_ops_rate", None) or 0
+    return dict(max_read_rate=max_read_rate * 1024, max_ops_rate=max_ops_rate)  # kiB/s -> B/s
+
+
 def compat_check(*, create, manifest, key, cache, compatibility, decorator_name):
     if not create and (manifest or key or cache):
         if compatibility is None:
@@ -63,7 +75,14 @@ def compat_check(*, create, manifest, key, cache, compatibility, decorator_name)
 
 
 def with_repository(
-    create=False, lock=True, exclusive=False, manifest=True, cache=False, secure=True, compatibility=None
+    create=False,
+    lock=True,
+    exclusive=False,
+    manifest=True,
+    cache=False,
+    lazy_chunks=False,
+    secure=True,
+    compatibility=None,
 ):
     """
     Method decorator for subcommand-handling methods: do_XYZ(self, args, repository, …)
@@ -74,6 +93,7 @@ def with_repository(
     :param exclusive: (bool) lock repository exclusively (for writing)
     :param manifest: load manifest and repo_objs (key), pass them as keyword arguments
     :param cache: open cache, pass it as keyword argument (implies manifest)
+    :param lazy_chunks: the cache may use a lazy chunks index (see BORG_CHUNKS_INDEX_LAZY)
     :param secure: do assert_secure after loading manifest
     :param compatibility: mandatory if not create and (manifest or cache), specifies mandatory
            feature categories to check
@@ -137,6 +157,7 @@ def wrapper(self, args, **kwargs):
                         cache_mode=getattr(args, "files_cache_mode", FILES_CACHE_MODE_DISABLED),
                         start_backup=getattr(self, "start_backup", None),
                         iec=getattr(args, "iec", False),
+                        lazy_chunks=lazy_chunks,
                     ) as cache_:
                         return method(self, args, repository=repository, cache=cache_, **kwargs)
                 else:
@@ -333,6 +354,27 @@ def define_exclusion_group(subparser, **kwargs):
     return exclude_group
 
 
+def define_read_rate_options(add_option):
+    add_option(
+        "--max-read-rate",
+        metavar="RATE",
+        dest="max_read_rate",
+        type=int,
+        default=0,
+        action=Highlander,
+        help="limit the repository read rate to RATE kiByte/s (default: 0=unlimited)",
+    )
+    add_option(
+        "--max-ops-rate",
+        metavar="RATE",
+        dest="max_ops_rate",
+        type=int,
+        default=0,
+        action=Highlander,
+        help="limit the repository read / delete rate to RATE objects/s (default: 0=unlimited)",
+    )
+
+
 def define_archive_filters_group(
     subparser, *, sort_by=True, first_last=True, oldest_newest=True, older_newer=True, deleted=False
 ):
@@ -534,6 +576,14 @@ def define_common_options(add_common_option):
         action=Highlander,
         help="set network upload buffer size in MiB. (default: 0=no buffer)",
     )
+    add_common_option(
+        "--remote-connections",
+        metavar="N",
+        dest="remote_connections",
+        type=int,
+        action=Highlander,
+        help="use N parallel connections to borg serve for ssh:// repositories (default: 1)",
+    )
     add_common_option(
         "--debug-profile",
         metavar="FILE",
@@ -158,10 +158,40 @@ def chunkit(ch):
                 "chunkit(ch)",
                 locals(),
             ),
+            ("fastcdc,19,23,21", "ch = get_chunker('fastcdc', 19, 23, 21, sparse=False)", "chunkit(ch)", locals()),
             ("fixed,1048576", "ch = get_chunker('fixed', 1048576, sparse=False)", "chunkit(ch)", locals()),
         ]:
             print(f"{spec:<24} {size:<10} {timeit(func, setup, number=100, globals=vars):.3f}s")
 
+        class BigFile(io.RawIOBase):
+            """A big, synthetic file made of repeated random data."""
+
+            def __init__(self, size):
+                self.size = size
+                self.offset = 0
+
+            def readable(self):
+                return True
+
+            def read(self, n=-1):
+                n = min(n, self.size - self.offset)
+                start = self.offset % len(random_10M)
+                data = random_10M[start : start + n]
+                while len(data) < n:
+                    data += random_10M[: n - len(data)]
+                self.offset += n
+                return data
+
+        def chunkit_big(ch):
+            for _ in ch.chunkify(fd=BigFile(4 * 1000 * 1000 * 1000)):
+                pass
+
+        size = "4GB"
+        for threads in (1, 4):
+            spec = f"buzhash,19,23,21,4095 {threads}T"
+            ch = get_chunker("buzhash", 19, 23, 21, 4095, sparse=False, threads=threads)
+            print(f"{spec:<24} {size:<10} {timeit(lambda: chunkit_big(ch), number=1):.3f}s")
+
         from ..checksums import crc32, xxh64
 
         print("Non-cryptographic checksums / hashes ===========================")
@@ -213,6 +243,35 @@ def chunkit(ch):
         for spec, func in tests:
             print(f"{spec:<24} {size:<10} {timeit(func, number=100):.3f}s")
 
+        from ..crypto.key import AESOCBRepoKey, CHPORepoKey
+
+        print("Decryption of small objects (AEAD session keys) ================")
+        count = 2000
+        size = "4kB"
+        for name, key_cls in [("aes-256-ocb", AESOCBRepoKey), ("chacha20-poly1305", CHPORepoKey)]:
+            key = key_cls(None)
+            key.init_from_random_data()
+            objects = []
+            for i in range(count):
+                if i % 500 == 0:
+                    key.init_ciphers()  # new session
+                data = random_10M[i * 4096 : (i + 1) * 4096]
+                id = key.id_hash(data)
+                objects.append((id, key.encrypt(id, data)))
+
+            def decrypt_uncached(key=key, objects=objects):
+                # derives the session key and sets up a new cipher for each object.
+                for id, data in objects:
+                    key._get_cipher(bytes(data[8:32]), int.from_bytes(data[2:8], "big")).decrypt(data, aad=id)
+
+            def decrypt(key=key, objects=objects):
+                # reuses the cipher of the session.
+                for id, data in objects:
+                    key.decrypt(id, data)
+
+            for spec, func in [(f"{name} uncached", decrypt_uncached), (f"{name} cached", decrypt)]:
+                print(f"{spec:<30} {count} * {size:<4} {timeit(func, number=10):.3f}s")
+
         print("KDFs (slow is GOOD, use argon2!) ===============================")
         count = 5
         for spec, func in [
@@ -52,7 +52,7 @@ def do_check(self, args, repository):
             except IntegrityError:
                 pass  # will try to make key later again
         if not args.archives_only:
-            if not repository.check(repair=args.repair, max_duration=args.max_duration):
+            if not repository.check(repair=args.repair, max_duration=args.max_duration, jobs=args.jobs):
                 set_ec(EXIT_WARNING)
         if not args.repo_only and not archive_checker.check(
             repository,
@@ -73,7 +73,7 @@ def do_check(self, args, repository):
 
     def build_parser_check(self, subparsers, common_parser, mid_common_parser):
         from ._common import process_epilog
-        from ._common import define_archive_filters_group
+        from ._common import define_archive_filters_group, define_read_rate_options
 
         check_epilog = process_epilog(
             """
@@ -117,6 +117,19 @@ def build_parser_check(self, subparsers, common_parser, mid_common_parser):
         ``--max-duration`` you must also pass ``--repository-only``, and must not pass
         ``--archives-only``, nor ``--repair``.
 
+        The repository check is split into 16 shards (by object ID). The ``--jobs N`` option
+        checks them with N parallel worker processes (on the server, for ssh://
+        repositories) instead of one after the other. This is useful if the storage can
+        deliver more throughput than one process can check. It can be combined with
+        ``--max-duration``, every shard then continues from its own checkpoint, so a
+        partial check can be continued with or without ``--jobs``.
+
+        ``--max-read-rate`` and ``--max-ops-rate`` limit the rate of repository object
+        reads (kiByte/s and objects/s) of the repository check and of ``--verify-data``,
+        so that checks can run in the background without starving other users of the
+        same storage. For ssh:// repositories, the limits are enforced by the server.
+        With ``--jobs N``, the limits are shared by the worker processes.
+
         **Warning:** Please note that partial repository checks (i.e. running it with
         ``--max-duration``) can only perform non-cryptographic checksum checks on the
         repository files. Enabling partial repository checks excepts archive checks
@@ -219,4 +232,14 @@ def build_parser_check(self, subparsers, common_parser, mid_common_parser):
             action=Highlander,
             help="do only a partial repo check for max. SECONDS seconds (Default: unlimited)",
         )
+        subparser.add_argument(
+            "--jobs",
+            metavar="N",
+            dest="jobs",
+            type=int,
+            default=1,
+            action=Highlander,
+            help="check the repository with N parallel worker processes (Default: 1)",
+        )
+        define_read_rate_options(subparser.add_argument)
         define_archive_filters_group(subparser)
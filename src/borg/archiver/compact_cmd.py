@@ -1,14 +1,16 @@
 import argparse
+import time
 from pathlib import Path
 
 from ._common import with_repository
 from ..archive import Archive
-from ..cache import write_chunkindex_to_repo_cache, build_chunkindex_from_repo
+from ..cache import write_chunkindex_to_repo_cache, build_chunkindex_from_repo, new_chunkindex
+from ..cache import list_chunkindex_sizes, estimate_chunks_count
 from ..cache import files_cache_name, discover_files_cache_names
 from ..helpers import get_cache_dir
 from ..constants import *  # NOQA
 from ..hashindex import ChunkIndex, ChunkIndexEntry
-from ..helpers import set_ec, EXIT_ERROR, format_file_size, bin_to_hex
+from ..helpers import set_ec, EXIT_ERROR, format_file_size, format_io_rate, bin_to_hex
 from ..helpers import ProgressIndicatorPercent
 from ..manifest import Manifest
 from ..remote import RemoteRepository
@@ -35,7 +37,7 @@ def __init__(self, repository, manifest, *, stats, iec):
     def repository_size(self):
         if self.chunks is None or not self.stats:
             return None
-        return sum(entry.size for id, entry in self.chunks.iteritems())  # sum of stored sizes
+        return self.chunks.sum_sizes()  # sum of stored sizes
 
     def garbage_collect(self):
         """Removes unused chunks from a repository."""
@@ -52,7 +54,8 @@ def get_repository_chunks(self) -> ChunkIndex:
         """return a chunks index"""
         if self.stats:  # slow method: build a fresh chunks index, with stored chunk sizes.
             logger.info("Getting object IDs present in the repository...")
-            chunks = ChunkIndex()
+            expected = estimate_chunks_count(list_chunkindex_sizes(self.repository))
+            chunks = new_chunkindex(self.repository, expected=expected)
             for id, stored_size in repo_lister(self.repository, limit=LIST_SCAN_LIMIT):
                 # we add this id to the chunks index (as unused chunk), because
                 # we do not know yet whether it is actually referenced from some archives.
@@ -95,12 +98,18 @@ def cleanup_files_cache(self):
         # Get the set of all existing files cache file names.
         try:
             files_cache_names = set(discover_files_cache_names(cache_dir))
+            files_cache_names |= set(discover_files_cache_names(cache_dir, "filesjournal"))
+            files_cache_names |= set(discover_files_cache_names(cache_dir, "filestable"))
+            files_cache_names |= set(discover_files_cache_names(cache_dir, "blocks"))
             logger.debug(f"Found {len(files_cache_names)} files cache files.")
         except (FileNotFoundError, PermissionError) as e:
             logger.warning(f"Could not access cache directory: {e}")
             return
 
         used_files_cache_names = {files_cache_name(series_name) for series_name in existing_series}
+        used_files_cache_names |= {files_cache_name(series_name, "filesjournal") for series_name in existing_series}
+        used_files_cache_names |= {files_cache_name(series_name, "filestable") for series_name in existing_series}
+        used_files_cache_names |= {files_cache_name(series_name, "blocks") for series_name in existing_series}
         unused_files_cache_names = files_cache_names - used_files_cache_names
 
         for cache_filename in unused_files_cache_names:
@@ -128,11 +137,13 @@ def use_it(id):
         archive_infos = self.manifest.archives.list(sort_by=["ts"])
         num_archives = len(archive_infos)
         pi = ProgressIndicatorPercent(
-            total=num_archives, msg="Computing used chunks %3.1f%%", step=0.1, msgid="compact.analyze_archives"
+            total=num_archives, msg="Computing used chunks %3.1f%% (%s)", step=0.1, msgid="compact.analyze_archives"
         )
         total_size, total_files = 0, 0
+        objs_read = bytes_read = 0  # archive metadata read so far
+        t_start = time.monotonic()
         for i, info in enumerate(archive_infos):
-            pi.show(i)
+            pi.show(i, info=[format_io_rate(bytes_read, objs_read, time.monotonic() - t_start)])
             logger.info(
                 f"Analyzing archive {info.name} {info.ts.astimezone()} {bin_to_hex(info.id)} ({i + 1}/{num_archives})"
             )
@@ -150,6 +161,8 @@ def use_it(id):
                     for id, size in item.chunks:
                         total_size += size  # original, uncompressed file content size
                         use_it(id)
+            objs_read += archive.pipeline.objs_read
+            bytes_read += archive.pipeline.bytes_read
         pi.finish()
         return missing_chunks, total_files, total_size, num_archives
 
@@ -169,20 +182,35 @@ def report_and_delete(self):
             except self.repository.ObjectNotFound:
                 logger.warning(f"Soft-deleted archive {name} {hex_id} not found.")
 
+        logger.info("Updating archives index...")
+        # the new archives index objects are used, the replaced ones (maybe listing nuked archives) get deleted.
+        replaced_ids = set(self.manifest.archives.index_ids())
+        new_ids = self.manifest.archives.update_index()
+        for id in replaced_ids - set(new_ids):
+            if id in self.chunks:
+                del self.chunks[id]  # already deleted by update_index
+        for id in new_ids:
+            entry = self.chunks.get(id, ChunkIndexEntry(flags=ChunkIndex.F_NONE, size=0))
+            self.chunks[id] = entry._replace(flags=entry.flags | ChunkIndex.F_USED)
+
         repo_size_before = self.repository_size
         logger.info("Determining unused objects...")
-        unused = set()
-        for id, entry in self.chunks.iteritems():
-            if not (entry.flags & ChunkIndex.F_USED):
-                unused.add(id)
+        unused = self.chunks.extract(ChunkIndex.F_USED, ChunkIndex.F_NONE, keys_only=True)
         logger.info(f"Deleting {len(unused)} unused objects...")
         pi = ProgressIndicatorPercent(
-            total=len(unused), msg="Deleting unused objects %3.1f%%", step=0.1, msgid="compact.report_and_delete"
+            total=len(unused),
+            msg="Deleting unused objects %3.1f%% (%.0f objects/s)",
+            step=0.1,
+            msgid="compact.report_and_delete",
         )
+        t_start = time.monotonic()
         for i, id in enumerate(unused):
-            pi.show(i)
-            self.repository.delete(id)
+            pi.show(i, info=[i / max(time.monotonic() - t_start, 1e-6)])
+            self.repository.delete(id, wait=False)
+            self.repository.async_response(wait=False)
             del self.chunks[id]
+        while self.repository.async_response(wait=True) is not None:
+            pass
         pi.finish()
         repo_size_after = self.repository_size
 
@@ -213,7 +241,7 @@ def do_compact(self, args, repository, manifest):
             ArchiveGarbageCollector(repository, manifest, stats=args.stats, iec=args.iec).garbage_collect()
 
     def build_parser_compact(self, subparsers, common_parser, mid_common_parser):
-        from ._common import process_epilog
+        from ._common import process_epilog, define_read_rate_options
 
         compact_epilog = process_epilog(
             """
@@ -257,6 +285,11 @@ def build_parser_compact(self, subparsers, common_parser, mid_common_parser):
             Without ``--stats``, borg will rely on the cached chunks index to determine
             existing object IDs (but there is no stored size information in the index,
             thus it can't compute before/after compaction size statistics).
+
+            ``--max-read-rate`` and ``--max-ops-rate`` limit the rate of repository object
+            reads (kiByte/s) and reads / deletes (objects/s), so that compaction can run in the
+            background without starving other users of the same storage. For ssh://
+            repositories, the limits are enforced by the server.
             """
         )
         subparser = subparsers.add_parser(
@@ -273,3 +306,4 @@ def build_parser_compact(self, subparsers, common_parser, mid_common_parser):
         subparser.add_argument(
             "-s", "--stats", dest="stats", action="store_true", help="print statistics (might be much slower)"
         )
+        define_read_rate_options(subparser.add_argument)
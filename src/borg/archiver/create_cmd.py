@@ -21,7 +21,7 @@
 from ..helpers import eval_escapes
 from ..helpers import timestamp, archive_ts_now
 from ..helpers import get_cache_dir, os_stat, get_strip_prefix
-from ..helpers import dir_is_tagged
+from ..helpers import dir_is_tagged, DirPrefetcher
 from ..helpers import log_multi
 from ..helpers import basic_json_data, json_print
 from ..helpers import flags_dir, flags_special_follow, flags_special
@@ -33,6 +33,7 @@
 from ..manifest import Manifest
 from ..patterns import PatternMatcher
 from ..platform import is_win32
+from ..remote import RemoteRepository
 
 from ..logger import create_logger
 
@@ -194,6 +195,9 @@ def create_inner(archive, cache, fso):
                 archive.stats += fso.stats
                 archive.stats.rx_bytes = getattr(repository, "rx_bytes", 0)
                 archive.stats.tx_bytes = getattr(repository, "tx_bytes", 0)
+                if isinstance(repository, RemoteRepository):
+                    archive.stats.rpc_window = repository.rpc_window_summary()
+                    archive.stats.rpc_window_history = repository.rpc_window_history()
                 if sig_int:
                     # do not save the archive if the user ctrl-c-ed.
                     raise Error("Got Ctrl-C / SIGINT.")
@@ -211,6 +215,14 @@ def create_inner(archive, cache, fso):
         self.noflags = args.noflags
         self.noacls = args.noacls
         self.noxattrs = args.noxattrs
+        self.prefetcher = None
+        if args.prefetch_threads > 0:
+            self.prefetcher = DirPrefetcher(
+                args.prefetch_threads,
+                matcher=matcher,
+                exclude_caches=args.exclude_caches,
+                exclude_if_present=args.exclude_if_present,
+            )
         dry_run = args.dry_run
         self.start_backup = time.time_ns()
         t0 = archive_ts_now()
@@ -224,6 +236,8 @@ def create_inner(archive, cache, fso):
                 cache_mode=args.files_cache_mode,
                 iec=args.iec,
                 archive_name=args.name,
+                workers=args.jobs,
+                lazy_chunks=True,
             ) as cache:
                 archive = Archive(
                     manifest,
@@ -259,13 +273,23 @@ def create_inner(archive, cache, fso):
                     chunker_params=args.chunker_params,
                     show_progress=args.progress,
                     sparse=args.sparse,
+                    chunker_threads=args.chunker_threads,
+                    blocks_cache=args.blocks_cache,
                     log_json=args.log_json,
                     iec=args.iec,
                     file_status_printer=self.print_file_status,
                 )
-                create_inner(archive, cache, fso)
+                try:
+                    create_inner(archive, cache, fso)
+                finally:
+                    if self.prefetcher is not None:
+                        self.prefetcher.close()
         else:
-            create_inner(None, None, None)
+            try:
+                create_inner(None, None, None)
+            finally:
+                if self.prefetcher is not None:
+                    self.prefetcher.close()
 
     def _process_any(self, *, path, parent_fd, name, st, fso, cache, read_special, dry_run, strip_prefix):
         """
@@ -417,10 +441,15 @@ def _rec_walk(
         read_special,
         dry_run,
         strip_prefix,
+        prefetched_st=None,
+        prefetched_dir=None,
     ):
         """
         Process *path* (or, preferably, parent_fd/name) recursively according to the various parameters.
 
+        prefetched_st is the stat result of *path* and prefetched_dir a future for its directory
+        listing (see DirPrefetcher), if they were fetched in advance.
+
         This should only raise on critical errors. Per-item errors must be handled within this method.
         """
         if sig_int and sig_int.action_done():
@@ -431,8 +460,11 @@ def _rec_walk(
         try:
             recurse_excluded_dir = False
             if matcher.match(path):
-                with backup_io("stat"):
-                    st = os_stat(path=path, parent_fd=parent_fd, name=name, follow_symlinks=False)
+                if prefetched_st is not None:
+                    st = prefetched_st
+                else:
+                    with backup_io("stat"):
+                        st = os_stat(path=path, parent_fd=parent_fd, name=name, follow_symlinks=False)
             else:
                 self.print_file_status("-", path)  # excluded
                 # get out here as quickly as possible:
@@ -442,8 +474,11 @@ def _rec_walk(
                 if not matcher.recurse_dir:
                     return
                 recurse_excluded_dir = True
-                with backup_io("stat"):
-                    st = os_stat(path=path, parent_fd=parent_fd, name=name, follow_symlinks=False)
+                if prefetched_st is not None:
+                    st = prefetched_st
+                else:
+                    with backup_io("stat"):
+                        st = os_stat(path=path, parent_fd=parent_fd, name=name, follow_symlinks=False)
                 if not stat.S_ISDIR(st.st_mode):
                     return
 
@@ -513,14 +548,32 @@ def _rec_walk(
                         else:
                             status = "+"  # included (dir)
                     if recurse:
-                        with backup_io("scandir"):
-                            entries = helpers.scandir_inorder(path=path, fd=child_fd)
-                        for dirent in entries:
-                            normpath = os.path.normpath(os.path.join(path, dirent.name))
+                        entries = self._dir_entries(path=path, fd=child_fd, st=st, prefetched_dir=prefetched_dir)
+                        prefetched_dirs = {}  # index of the entry -> future for its directory listing
+                        prefetch_index = 0
+                        for index, (entry_name, entry_st, entry_is_dir) in enumerate(entries):
+                            normpath = os.path.normpath(os.path.join(path, entry_name))
+                            if self.prefetcher is not None:
+                                # look ahead for subdirectories and start fetching them.
+                                while prefetch_index < min(index + self.prefetcher.window, len(entries)):
+                                    prefetch_name, prefetch_st, prefetch_is_dir = entries[prefetch_index]
+                                    if prefetch_is_dir:
+                                        prefetch_st, future = self._prefetch_dir(
+                                            path=os.path.join(path, prefetch_name),
+                                            parent_fd=child_fd,
+                                            name=prefetch_name,
+                                            st=prefetch_st,
+                                            matcher=matcher,
+                                            restrict_dev=restrict_dev,
+                                        )
+                                        entries[prefetch_index] = prefetch_name, prefetch_st, prefetch_is_dir
+                                        if future is not None:
+                                            prefetched_dirs[prefetch_index] = future
+                                    prefetch_index += 1
                             self._rec_walk(
                                 path=normpath,
                                 parent_fd=child_fd,
-                                name=dirent.name,
+                                name=entry_name,
                                 fso=fso,
                                 cache=cache,
                                 matcher=matcher,
@@ -532,6 +585,8 @@ def _rec_walk(
                                 read_special=read_special,
                                 dry_run=dry_run,
                                 strip_prefix=strip_prefix,
+                                prefetched_st=entry_st,
+                                prefetched_dir=prefetched_dirs.pop(index, None),
                             )
 
         except BackupError as e:
@@ -544,6 +599,57 @@ def _rec_walk(
             if not dry_run and status is not None:
                 fso.stats.files_stats[status] += 1
 
+    def _prefetch_dir(self, *, path, parent_fd, name, st, matcher, restrict_dev):
+        """
+        Start prefetching directory *path* (*st* is its prefetched stat result or None), but only if
+        the traversal will recurse into it. Return (st, future), future is None if not prefetching.
+        """
+        # do not touch excluded directories (see #3209), the synchronous traversal deals with them.
+        if not matcher.match(os.path.normpath(path)):
+            return st, None
+        if restrict_dev is not None:
+            # do not list other filesystems with --one-file-system (e.g. automounts).
+            if st is None:
+                try:
+                    # the traversal uses this stat result, so this is no additional syscall.
+                    st = os_stat(path=path, parent_fd=parent_fd, name=name, follow_symlinks=False)
+                except OSError:
+                    return None, None  # the traversal will stat again and deal with the error
+            if st.st_dev != restrict_dev:
+                return st, None
+        return st, self.prefetcher.prefetch(path)
+
+    def _dir_entries(self, *, path, fd, st, prefetched_dir):
+        """
+        Return a list of (name, st, is_dir) tuples for the entries of directory *path* / *fd* (in
+        scandir_inorder order). st is the prefetched stat result (or None), is_dir tells whether the
+        entry is a directory that shall be prefetched.
+        """
+        if prefetched_dir is not None:
+            try:
+                dir_st, entries = prefetched_dir.result()
+            except OSError:
+                pass  # list the directory again, so errors get handled as usual
+            else:
+                # only use the result if it is for the same directory that we have opened.
+                if entries is not None and (dir_st.st_ino, dir_st.st_dev) == (st.st_ino, st.st_dev):
+                    return [
+                        (name, entry_st, entry_st is not None and stat.S_ISDIR(entry_st.st_mode))
+                        for name, entry_st in entries
+                    ]
+        with backup_io("scandir"):
+            entries = helpers.scandir_inorder(path=path, fd=fd)
+        if self.prefetcher is None:
+            return [(dirent.name, None, False) for dirent in entries]
+        result = []
+        for dirent in entries:
+            try:
+                is_dir = dirent.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            result.append((dirent.name, None, is_dir))
+        return result
+
     def build_parser_create(self, subparsers, common_parser, mid_common_parser):
         from ._common import process_epilog
         from ._common import define_exclusion_group
@@ -584,6 +690,8 @@ def build_parser_create(self, subparsers, common_parser, mid_common_parser):
 
         - ctime,size,inode (default)
         - mtime,size,inode (default behaviour of borg versions older than 1.1.0rc4)
+        - ctime,size,inode,moved (also recognize unchanged files that were renamed or moved)
+        - mtime,size,inode,moved (also recognize unchanged files that were renamed or moved)
         - ctime,size (ignore the inode number)
         - mtime,size (ignore the inode number)
         - rechunk,ctime (all files are considered modified - rechunk, cache ctime)
@@ -616,6 +724,13 @@ def build_parser_create(self, subparsers, common_parser, mid_common_parser):
         is used to determine changed files quickly uses absolute filenames.
         If this is not possible, consider creating a bind mount to a stable location.
 
+        With ``moved`` in the files cache mode, a file that is not found by its path in the
+        files cache is looked up by its inode number, size and mtime. If there is exactly one
+        files cache entry with these values, the file is considered unchanged (renamed or moved
+        within the same filesystem) and the cached chunks list is used. As a rename updates the
+        ctime, the ctime is not compared for such files, so this relies on the mtime like the
+        mtime based cache modes do.
+
         The ``--progress`` option shows (from left to right) Original and (uncompressed)
         deduplicated size (O and U respectively), then the Number of files (N) processed so far,
         followed by the currently processed path.
@@ -626,6 +741,35 @@ def build_parser_create(self, subparsers, common_parser, mid_common_parser):
         the state after creation. Also, the ``--stats`` and ``--dry-run`` options are mutually
         exclusive because the data is not actually compressed and deduplicated during a dry run.
 
+        The ``--prefetch-threads N`` option makes borg fetch the directory listings and the stat
+        results of upcoming subdirectories with N parallel threads while it processes the current
+        directory. This does not change the order in which the files are processed and archived,
+        but it can speed up the directory traversal a lot if the latency of these operations is
+        high, e.g. on network filesystems with many unchanged files.
+
+        The ``--jobs N`` option compresses new chunks with N parallel threads, while borg
+        continues reading, chunking and hashing the input files. The chunks are encrypted
+        and stored in the order they were created. This is useful if a single CPU core
+        can not keep up with the compression, e.g. when using zstd with a higher level.
+        If the files cache needs to be rebuilt from the previous archive, N threads are also
+        used to decrypt and decompress the archive's item metadata.
+
+        The ``--chunker-threads N`` option cuts big files (like VM images or block devices
+        read with ``--read-special``) into chunks using N parallel threads for the buzhash
+        computation. The chunks are identical to the ones cut by a single thread, so this
+        does not influence deduplication. It is only supported by the buzhash chunker.
+
+        The ``--blocks-cache`` option makes borg remember a cheap checksum (keyed xxh64) and the
+        chunk id of each block of the files it reads. When backing up a changed file (or a block
+        device / image file with ``--read-special``) the next time, blocks with a known checksum
+        reuse the chunk id instead of computing the much more expensive id hash. This is useful
+        for big, mostly unchanged images, e.g. together with ``--chunker-params fixed,4194304``.
+        Like the files cache, the blocks cache is kept per archive series in the local cache
+        directory. The checksum is not cryptographically secure: a changed block with the same
+        size and checksum as the old one would be backed up as the old block. This is very
+        unlikely to happen by accident, but do not use ``--blocks-cache`` for files that
+        untrusted parties can write to, they might be able to craft such blocks.
+
         For more help on include/exclude patterns, see the :ref:`borg_patterns` command output.
 
         For more help on placeholders, see the :ref:`borg_placeholders` command output.
@@ -879,6 +1023,15 @@ def build_parser_create(self, subparsers, common_parser, mid_common_parser):
             action="store_true",
             help="detect sparse holes in input (supported only by fixed chunker)",
         )
+        fs_group.add_argument(
+            "--prefetch-threads",
+            metavar="N",
+            dest="prefetch_threads",
+            type=int,
+            default=0,
+            action=Highlander,
+            help="prefetch directory listings and stat results with N threads (Default: 0, disabled)",
+        )
         fs_group.add_argument(
             "--files-cache",
             metavar="MODE",
@@ -888,6 +1041,12 @@ def build_parser_create(self, subparsers, common_parser, mid_common_parser):
             default=FILES_CACHE_MODE_UI_DEFAULT,
             help="operate files cache in MODE. default: %s" % FILES_CACHE_MODE_UI_DEFAULT,
         )
+        fs_group.add_argument(
+            "--blocks-cache",
+            dest="blocks_cache",
+            action="store_true",
+            help="remember checksums of file blocks to quickly recognize unchanged blocks of changed files",
+        )
         fs_group.add_argument(
             "--read-special",
             dest="read_special",
@@ -936,6 +1095,24 @@ def build_parser_create(self, subparsers, common_parser, mid_common_parser):
             action=Highlander,
             help="select compression algorithm, see the output of the " '"borg help compression" command for details.',
         )
+        archive_group.add_argument(
+            "--jobs",
+            metavar="N",
+            dest="jobs",
+            type=int,
+            default=1,
+            action=Highlander,
+            help="compress new chunks with N parallel threads (Default: 1)",
+        )
+        archive_group.add_argument(
+            "--chunker-threads",
+            metavar="N",
+            dest="chunker_threads",
+            type=int,
+            default=1,
+            action=Highlander,
+            help="chunk big files with N parallel threads (buzhash chunker only, Default: 1)",
+        )
 
         subparser.add_argument("name", metavar="NAME", type=archivename_validator, help="specify the archive name")
         subparser.add_argument(
@@ -1,4 +1,5 @@
 import argparse
+import itertools
 from collections import defaultdict
 
 from ._common import with_repository, Highlander
@@ -15,22 +16,26 @@
 logger = create_logger()
 
 
+def check_chunk(repository, repo_objs, id, stats, ctype, clevel, olevel):
+    """check if a chunk needs processing (usually: recompression)."""
+    chunk_no_data = repository.get(id, read_data=False)
+    meta = repo_objs.parse_meta(id, chunk_no_data, ro_type=ROBJ_DONTCARE)
+    compr_found = meta["ctype"], meta["clevel"], meta.get("olevel", -1)
+    stats["compr_keys"].add(compr_found)
+    stats[compr_found] += 1
+    stats["checked_count"] += 1
+    return compr_found != (ctype, clevel, olevel)
+
+
 def find_chunks(repository, repo_objs, cache, stats, ctype, clevel, olevel):
     """find and flag chunks that need processing (usually: recompression)."""
-    compr_keys = stats["compr_keys"] = set()
-    compr_wanted = ctype, clevel, olevel
+    stats["compr_keys"] = set()
     recompress_count = 0
     for id, cie in cache.chunks.iteritems():
-        chunk_no_data = repository.get(id, read_data=False)
-        meta = repo_objs.parse_meta(id, chunk_no_data, ro_type=ROBJ_DONTCARE)
-        compr_found = meta["ctype"], meta["clevel"], meta.get("olevel", -1)
-        if compr_found != compr_wanted:
+        if check_chunk(repository, repo_objs, id, stats, ctype, clevel, olevel):
             flags_compress = cie.flags | ChunkIndex.F_COMPRESS
             cache.chunks[id] = cie._replace(flags=flags_compress)
             recompress_count += 1
-        compr_keys.add(compr_found)
-        stats[compr_found] += 1
-        stats["checked_count"] += 1
     return recompress_count
 
 
@@ -108,6 +113,13 @@ def get_csettings(c):
         stats_find = defaultdict(int)
         stats_process = defaultdict(int)
         recompress_candidate_count = find_chunks(repository, repo_objs, cache, stats_find, ctype, clevel, olevel)
+        # the archives index objects are not in the chunks index, but they need to be recompressed also:
+        index_ids = [
+            id
+            for id in manifest.archives.index_ids()
+            if check_chunk(repository, repo_objs, id, stats_find, ctype, clevel, olevel)
+        ]
+        recompress_candidate_count += len(index_ids)
 
         pi = ProgressIndicatorPercent(
             total=recompress_candidate_count,
@@ -115,11 +127,10 @@ def get_csettings(c):
             step=0.1,
             msgid="repo_compress.process_chunks",
         )
-        for id, cie in cache.chunks.iteritems():
+        for id in itertools.chain(cache.chunks.extract(ChunkIndex.F_COMPRESS, keys_only=True), index_ids):
             if sig_int and sig_int.action_done():
                 break
-            if cie.flags & ChunkIndex.F_COMPRESS:
-                process_chunks(repository, repo_objs, stats_process, [id], olevel)
+            process_chunks(repository, repo_objs, stats_process, [id], olevel)
             pi.show()
         pi.finish()
         if sig_int:
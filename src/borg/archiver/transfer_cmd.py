@@ -65,6 +65,8 @@ def transfer_chunks(
                 transfer += size
     else:
         # Original implementation without re-chunking
+        # with a lazy chunks index, this asks the repo about all the chunks at once (not one by one):
+        cache.seen_chunks([chunk_id for chunk_id, _ in other_chunks])
         for chunk_id, size in other_chunks:
             chunk_present = cache.seen_chunk(chunk_id, size)
             if not chunk_present:  # target repo does not yet have this chunk
@@ -118,7 +120,7 @@ def transfer_chunks(
 
 class TransferMixIn:
     @with_other_repository(manifest=True, compatibility=(Manifest.Operation.READ,))
-    @with_repository(manifest=True, cache=True, compatibility=(Manifest.Operation.WRITE,))
+    @with_repository(manifest=True, cache=True, lazy_chunks=True, compatibility=(Manifest.Operation.WRITE,))
     def do_transfer(self, args, *, repository, manifest, cache, other_repository=None, other_manifest=None):
         """archives transfer from other repository, optionally upgrade data format"""
         key = manifest.key
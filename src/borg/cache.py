@@ -3,7 +3,9 @@
 import os
 import shutil
 import stat
-from collections import namedtuple
+import struct
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from time import perf_counter
@@ -32,11 +34,12 @@
 from .helpers.msgpack import int_to_timestamp, timestamp_to_int
 from .item import ChunkListEntry
 from .crypto.key import PlaintextKey
-from .crypto.file_integrity import IntegrityCheckedFile, FileIntegrityError
+from .crypto.file_integrity import IntegrityCheckedFile, FileIntegrityError, XXH64FileHashingWrapper
+from .filescache import FilesCacheTable
 from .manifest import Manifest
 from .platform import SaveFile
 from .remote import RemoteRepository
-from .repository import LIST_SCAN_LIMIT, Repository, StoreObjectNotFound, repo_lister
+from .repository import LIST_SCAN_LIMIT, Repository, StoreObjectNotFound, repo_lister, repo_sharded_lister
 
 
 def files_cache_name(archive_name, files_cache_name="files"):
@@ -70,6 +73,9 @@ def discover_files_cache_names(path, files_cache_name="files"):
 # chunks is a list of ChunkListEntry
 FileCacheEntry = namedtuple("FileCacheEntry", "age inode size ctime mtime chunks")
 
+# blocks is a list of (checksum, id, size) tuples
+BlocksCacheEntry = namedtuple("BlocksCacheEntry", "age blocks")
+
 
 class SecurityManager:
     """
@@ -379,6 +385,8 @@ def __new__(
         iec=False,
         archive_name=None,
         start_backup=None,
+        workers=1,
+        lazy_chunks=False,
     ):
         return AdHocWithFilesCache(
             manifest=manifest,
@@ -389,6 +397,8 @@ def __new__(
             cache_mode=cache_mode,
             archive_name=archive_name,
             start_backup=start_backup,
+            workers=workers,
+            lazy_chunks=lazy_chunks,
         )
 
 
@@ -400,16 +410,41 @@ class FilesCacheMixin:
     inode number and chunks id/size list.
     When finding a file on disk, we use the metadata to determine if the file is unchanged.
     If so, we use the cached chunks list and skip reading/chunking the file contents.
+
+    Optionally, we also keep a "blocks cache" that has a cheap checksum of each chunk (block)
+    of a file together with the chunk's id/size. If a file has changed (or we can not tell,
+    like for block devices), it is read and chunked, but for blocks with a known checksum we
+    reuse the chunk id instead of computing the (expensive) id hash over the block.
+
+    With BORG_FILES_CACHE_BACKEND=mmap, the files cache is not a dict that is completely
+    read at startup and written at the end, but a memory-mapped on-disk hash table
+    (see FilesCacheTable) that is updated in place.
+
+    With "v" (moved) in the cache_mode, we also build a secondary index (inode, size, mtime)
+    -> path_hash from the files cache, so we can recognize unchanged files that were renamed
+    or moved to another path.
     """
 
     FILES_CACHE_NAME = "files"
+    FILES_JOURNAL_NAME = "filesjournal"
+    FILES_JOURNAL_RATIO = 0.5  # compact the journal when it gets bigger than this ratio of the base files cache
+    FILES_TABLE_NAME = "filestable"
+    BLOCKS_CACHE_NAME = "blocks"
 
     def __init__(self, cache_mode, archive_name=None, start_backup=None):
         self.archive_name = archive_name  # ideally a SERIES name
         assert not ("c" in cache_mode and "m" in cache_mode)
         assert "d" in cache_mode or "c" in cache_mode or "m" in cache_mode
         self.cache_mode = cache_mode
+        self.files_cache_backend = os.environ.get("BORG_FILES_CACHE_BACKEND", "msgpack")
+        if self.files_cache_backend not in ("msgpack", "mmap"):
+            raise Error(f"Invalid BORG_FILES_CACHE_BACKEND: {self.files_cache_backend!r} (use msgpack or mmap).")
         self._files = None
+        self._files_journal = None  # infos about the base files cache and journal we read (if we can journal)
+        self._files_dirty = set()  # path_hashes of files cache entries that were changed
+        self._files_moved = None  # (inode, size, mtime_ns) -> path_hash, see _get_moved_file_entry
+        self._blocks = None
+        self._blocks_seed = None
         self._newest_cmtime = 0
         self._newest_path_hashes = set()
         self.start_backup = start_backup
@@ -427,7 +462,13 @@ def compress_entry(self, entry):
         assert isinstance(entry, FileCacheEntry)
         compressed_chunks = []
         for id, size in entry.chunks:
-            cie = self.chunks[id]  # may raise KeyError if chunk id is not in repo
+            try:
+                cie = self.chunks[id]  # may raise KeyError if chunk id is not in repo
+            except KeyError:
+                if not self.chunks_lazy:
+                    raise
+                # the lazy chunks index does not know yet whether the repo has this chunk, see seen_chunks.
+                cie = self.chunks[id] = ChunkIndexEntry(flags=ChunkIndex.F_NONE, size=0)
             if cie.size == 0:  # size is not known in the chunks index yet
                 self.chunks[id] = cie._replace(size=size)
             else:
@@ -455,6 +496,8 @@ def decompress_entry(self, entry_packed):
 
     @property
     def files(self):
+        if self._files is None and self.files_cache_backend == "mmap":
+            self._files = self._open_files_table()
         if self._files is None:
             self._files = self._read_files_cache()  # try loading from cache dir
         if self._files is None:
@@ -463,8 +506,16 @@ def files(self):
             self._files = {}  # start from scratch
         return self._files
 
-    def _build_files_cache(self):
-        """rebuild the files cache by reading previous archive from repository"""
+    def _build_files_cache(self, files=None):
+        """
+        rebuild the files cache by reading previous archive from repository
+
+        The archive's item metadata stream is fetched with prefetching and, if we have multiple
+        workers, decrypted and decompressed by multiple threads.
+
+        :param files: files cache (dict or FilesCacheTable) to put the entries into, default: new dict
+        :return: the files cache or None if there is no previous archive
+        """
         if "d" in self.cache_mode:  # d(isabled)
             return
 
@@ -483,54 +534,212 @@ def _build_files_cache(self):
             return
         prev_archive = archives[0]
 
-        files = {}
+        files = {} if files is None else files
+        entries = 0
         logger.debug(
             f"Building files cache from {prev_archive.name} {prev_archive.ts} {bin_to_hex(prev_archive.id)} ..."
         )
         files_cache_logger.debug("FILES-CACHE-BUILD: starting...")
         archive = Archive(self.manifest, prev_archive.id)
-        for item in archive.iter_items():
-            # only put regular files' infos into the files cache:
-            if stat.S_ISREG(item.mode):
-                path_hash = self.key.id_hash(safe_encode(item.path))
-                # keep track of the key(s) for the most recent timestamp(s):
-                ctime_ns = item.ctime
-                if ctime_ns > self._newest_cmtime:
-                    self._newest_cmtime = ctime_ns
-                    self._newest_path_hashes = {path_hash}
-                elif ctime_ns == self._newest_cmtime:
-                    self._newest_path_hashes.add(path_hash)
-                mtime_ns = item.mtime
-                if mtime_ns > self._newest_cmtime:
-                    self._newest_cmtime = mtime_ns
-                    self._newest_path_hashes = {path_hash}
-                elif mtime_ns == self._newest_cmtime:
-                    self._newest_path_hashes.add(path_hash)
-                # add the file to the in-memory files cache
-                entry = FileCacheEntry(
-                    age=0,
-                    inode=item.get("inode", 0),
-                    size=item.size,
-                    ctime=int_to_timestamp(ctime_ns),
-                    mtime=int_to_timestamp(mtime_ns),
-                    chunks=item.chunks,
-                )
-                # note: if the repo is an a valid state, next line should not fail with KeyError:
-                files[path_hash] = self.compress_entry(entry)
+        # only put regular files' infos into the files cache:
+        for item in archive.iter_items(filter=lambda item: stat.S_ISREG(item.mode), workers=self.workers):
+            path_hash = self.key.id_hash(safe_encode(item.path))
+            # keep track of the key(s) for the most recent timestamp(s):
+            ctime_ns = item.ctime
+            if ctime_ns > self._newest_cmtime:
+                self._newest_cmtime = ctime_ns
+                self._newest_path_hashes = {path_hash}
+            elif ctime_ns == self._newest_cmtime:
+                self._newest_path_hashes.add(path_hash)
+            mtime_ns = item.mtime
+            if mtime_ns > self._newest_cmtime:
+                self._newest_cmtime = mtime_ns
+                self._newest_path_hashes = {path_hash}
+            elif mtime_ns == self._newest_cmtime:
+                self._newest_path_hashes.add(path_hash)
+            # add the file to the files cache
+            entry = FileCacheEntry(
+                age=0,
+                inode=item.get("inode", 0),
+                size=item.size,
+                ctime=int_to_timestamp(ctime_ns),
+                mtime=int_to_timestamp(mtime_ns),
+                chunks=item.chunks,
+            )
+            # note: if the repo is an a valid state, next line should not fail with KeyError:
+            self._put_file_entry(path_hash, entry, files)
+            entries += 1
         # deal with special snapshot / timestamp granularity case, see FAQ:
         for path_hash in self._newest_path_hashes:
-            del files[path_hash]
-        files_cache_logger.debug("FILES-CACHE-BUILD: finished, %d entries loaded.", len(files))
+            if isinstance(files, FilesCacheTable):
+                files.delete(path_hash)
+            else:
+                del files[path_hash]
+            entries -= 1
+        files_cache_logger.debug("FILES-CACHE-BUILD: finished, %d entries loaded.", entries)
         return files
 
     def files_cache_name(self):
         return files_cache_name(self.archive_name, self.FILES_CACHE_NAME)
 
+    def files_table_name(self):
+        return files_cache_name(self.archive_name, self.FILES_TABLE_NAME)
+
+    def _open_files_table(self):
+        """open the files cache table in the cache directory (if there is none, build it from previous archive)"""
+        ttl = int(os.environ.get("BORG_FILES_CACHE_TTL", 2))
+        table = FilesCacheTable(self.path / self.files_table_name(), ttl=ttl)
+        if self.start_backup is not None:
+            table.recent_after = self.start_backup - TIME_DIFFERS2_NS
+        if table.created:
+            self._build_files_cache(table)
+        return table
+
+    def _close_files_table(self, table):
+        """close the files cache table, discarding entries of potentially problematic files"""
+        max_time_ns = 2**63 - 1  # nanoseconds, good until y2262
+        newest_cmtime = max(self._newest_cmtime or 0, table.newest_cmtime)
+        start_backup_time = self.start_backup - TIME_DIFFERS2_NS if self.start_backup is not None else max_time_ns
+        discard_after = min(newest_cmtime, start_backup_time)
+        race_discarded = table.close(discard_after)
+        t_str = datetime.fromtimestamp(discard_after / 1e9, timezone.utc).isoformat()
+        files_cache_logger.debug(f"FILES-CACHE-KILL: removed {race_discarded} entries with ctime/mtime >= {t_str}")
+
+    def _get_file_entry(self, path_hash):
+        """return the FileCacheEntry for path_hash (or None if we do not have one)"""
+        files = self.files
+        if isinstance(files, FilesCacheTable):
+            entry = files.get(path_hash)
+            if entry is None:
+                return None
+            age, inode, size, ctime_ns, mtime_ns, chunks = entry
+            entry = FileCacheEntry(age, inode, size, int_to_timestamp(ctime_ns), int_to_timestamp(mtime_ns), chunks)
+            try:
+                self.compress_entry(entry)  # check that we (still) have all the chunks
+            except KeyError:
+                # repo is missing a chunk referenced from entry
+                files_cache_logger.debug(f"compress_entry failed for {entry}, skipping.")
+                return None
+            return entry
+        entry = files.get(path_hash)
+        return self.decompress_entry(entry) if entry else None
+
+    def _build_moved_index(self):
+        """
+        build the secondary index (inode, size, mtime_ns) -> path_hash from the files cache
+
+        If there are multiple entries with the same key, but different chunks, the key is ambiguous
+        and maps to None.
+        """
+        moved = {}
+        chunks_of = {}  # key -> checksum of the chunks list of the entry
+        files = self.files
+
+        def stat_items():
+            if isinstance(files, FilesCacheTable):
+                yield from files.stat_items()
+            else:
+                for path_hash, packed in files.items():
+                    _, inode, size, _, mtime, chunks = msgpack.unpackb(packed)
+                    # like the mmap table, only keep a checksum of the chunks list, not a copy of it.
+                    yield path_hash, inode, size, timestamp_to_int(mtime), xxh64(msgpack.packb(chunks))
+
+        for path_hash, inode, size, mtime_ns, chunks_checksum in stat_items():
+            key = inode, size, mtime_ns
+            if key not in moved:
+                moved[key] = path_hash
+                chunks_of[key] = chunks_checksum
+            elif chunks_of[key] != chunks_checksum:
+                moved[key] = None
+        ambiguous = sum(1 for path_hash in moved.values() if path_hash is None)
+        files_cache_logger.debug("FILES-CACHE-MOVED: indexed %d entries, %d ambiguous.", len(moved), ambiguous)
+        return moved
+
+    def _get_moved_file_entry(self, st):
+        """return the FileCacheEntry of a file with the same inode, size and mtime (or None if there is none)"""
+        if self._files_moved is None:
+            self._files_moved = self._build_moved_index()
+        key = st.st_ino, st.st_size, safe_ns(st.st_mtime_ns)
+        path_hash = self._files_moved.get(key)
+        if path_hash is None:
+            return None
+        entry = self._get_file_entry(path_hash)
+        # the entry might have been updated since we built the index:
+        if entry is None or (entry.inode, entry.size, timestamp_to_int(entry.mtime)) != key:
+            return None
+        return entry
+
+    def _put_file_entry(self, path_hash, entry, files=None):
+        """put the FileCacheEntry for path_hash into the files cache"""
+        files = self.files if files is None else files
+        if isinstance(files, FilesCacheTable):
+            ctime_ns, mtime_ns = timestamp_to_int(entry.ctime), timestamp_to_int(entry.mtime)
+            files.put(path_hash, entry.inode, entry.size, ctime_ns, mtime_ns, entry.chunks)
+        else:
+            packed = self.compress_entry(entry)
+            if self._files_journal is not None:
+                old = files.get(path_hash)
+                # the age does not matter here, we only need to journal entries with new infos:
+                if old is None or msgpack.unpackb(old)[1:] != msgpack.unpackb(packed)[1:]:
+                    self._files_dirty.add(path_hash)
+            files[path_hash] = packed
+
     def discover_files_cache_names(self, path):
         return discover_files_cache_names(path, self.FILES_CACHE_NAME)
 
+    def files_journal_name(self):
+        return files_cache_name(self.archive_name, self.FILES_JOURNAL_NAME)
+
+    def _read_files_journal(self, base_id):
+        """
+        read the files cache journal from cache directory
+
+        :param base_id: identifies the base files cache the journal belongs to
+        :return: list of deltas, one per backup run, None if the journal is unusable
+        """
+        deltas = []
+        try:
+            with open(self.path / self.files_journal_name(), "rb") as fd:
+                u = msgpack.Unpacker(use_list=True)
+                for data in iter(lambda: fd.read(64 * 1024), b""):
+                    u.feed(data)
+                    for checksum, delta in u:
+                        if checksum != xxh64(delta):
+                            logger.debug("The files cache journal is corrupted.")
+                            return None
+                        delta_base_id, updated, deleted, missed = msgpack.unpackb(delta)
+                        if delta_base_id != base_id:
+                            logger.debug("The files cache journal does not belong to the files cache.")
+                            return None
+                        updated = {path_hash: FileCacheEntry(*entry) for path_hash, entry in updated}
+                        deltas.append((updated, set(deleted), set(missed)))
+        except FileNotFoundError:
+            pass
+        except (OSError, TypeError, ValueError) as exc:
+            logger.debug("The files cache journal can't be read. [%s]" % str(exc))
+            return None
+        return deltas
+
+    @staticmethod
+    def _replay_files_journal(entry, path_hash, deltas):
+        """return the entry for path_hash (or None) after replaying the journal deltas on the base entry"""
+        for updated, deleted, missed in deltas:
+            if path_hash in updated:
+                entry = updated[path_hash]
+            elif path_hash in deleted:
+                entry = None
+            elif entry is not None:
+                # if the file was not seen in that backup run, it got older, otherwise it was seen unchanged.
+                entry = entry._replace(age=entry.age + 1 if path_hash in missed else 0)
+        return entry
+
     def _read_files_cache(self):
-        """read files cache from cache directory"""
+        """
+        read files cache from cache directory
+
+        The files cache on disk consists of a base files cache (a full snapshot of the files cache) and
+        a journal with the changes of the backup runs after the snapshot was made.
+        """
         if "d" in self.cache_mode:  # d(isabled)
             return
 
@@ -538,11 +747,24 @@ def _read_files_cache(self):
         logger.debug("Reading files cache ...")
         files_cache_logger.debug("FILES-CACHE-LOAD: starting...")
         msg = None
+        base_id = self.cache_config.integrity.get(self.files_cache_name())
+        deltas = self._read_files_journal(base_id) if base_id is not None else None
+        journaled = set()  # path_hashes changed by the journal
+        for updated, deleted, missed in deltas or []:
+            journaled |= updated.keys() | deleted | missed
+        base_entries = {}  # base entries of journaled path_hashes
+
+        def add_entry(path_hash, entry):
+            entry = entry._replace(age=entry.age + 1)
+            try:
+                files[path_hash] = self.compress_entry(entry)
+            except KeyError:
+                # repo is missing a chunk referenced from entry
+                logger.debug(f"compress_entry failed for {entry}, skipping.")
+
         try:
             with IntegrityCheckedFile(
-                path=str(self.path / self.files_cache_name()),
-                write=False,
-                integrity_data=self.cache_config.integrity.get(self.files_cache_name()),
+                path=str(self.path / self.files_cache_name()), write=False, integrity_data=base_id
             ) as fd:
                 u = msgpack.Unpacker(use_list=True)
                 while True:
@@ -553,15 +775,17 @@ def _read_files_cache(self):
                     try:
                         for path_hash, entry in u:
                             entry = FileCacheEntry(*entry)
-                            entry = entry._replace(age=entry.age + 1)
-                            try:
-                                files[path_hash] = self.compress_entry(entry)
-                            except KeyError:
-                                # repo is missing a chunk referenced from entry
-                                logger.debug(f"compress_entry failed for {entry}, skipping.")
+                            if path_hash in journaled:
+                                base_entries[path_hash] = entry
+                            else:
+                                if deltas:
+                                    # not in the journal: the file was seen unchanged in all later backup runs.
+                                    entry = entry._replace(age=0)
+                                add_entry(path_hash, entry)
                     except (TypeError, ValueError) as exc:
                         msg = "The files cache seems invalid. [%s]" % str(exc)
                         break
+            base_size = os.stat(self.path / self.files_cache_name()).st_size
         except OSError as exc:
             msg = "The files cache can't be read. [%s]" % str(exc)
         except FileIntegrityError as fie:
@@ -569,11 +793,36 @@ def _read_files_cache(self):
         if msg is not None:
             logger.debug(msg)
             files = None
-        files_cache_logger.debug("FILES-CACHE-LOAD: finished, %d entries loaded.", len(files or {}))
+        else:
+            for path_hash in journaled:
+                entry = self._replay_files_journal(base_entries.get(path_hash), path_hash, deltas)
+                if entry is not None:
+                    add_entry(path_hash, entry)
+            if deltas is not None:
+                # we can add the changes of this backup run to the journal
+                self._files_journal = dict(
+                    base_id=base_id, base_size=base_size, runs=len(deltas), journal_size=self._files_journal_size()
+                )
+        files_cache_logger.debug(
+            "FILES-CACHE-LOAD: finished, %d entries loaded, %d journal entries replayed.",
+            len(files or {}),
+            len(journaled),
+        )
         return files
 
+    def _files_journal_size(self):
+        try:
+            return os.stat(self.path / self.files_journal_name()).st_size
+        except FileNotFoundError:
+            return 0
+
     def _write_files_cache(self, files):
-        """write files cache to cache directory"""
+        """
+        write files cache to cache directory
+
+        If the journal is small compared to the base files cache, only the changes of this backup run
+        are appended to the journal. Otherwise, a new base files cache is written and the journal removed.
+        """
         max_time_ns = 2**63 - 1  # nanoseconds, good until y2262
         # _self._newest_cmtime might be None if it was never set because no files were modified/added.
         newest_cmtime = self._newest_cmtime if self._newest_cmtime is not None else max_time_ns
@@ -581,12 +830,17 @@ def _write_files_cache(self, files):
         # we don't want to persist files cache entries of potentially problematic files:
         discard_after = min(newest_cmtime, start_backup_time)
         ttl = int(os.environ.get("BORG_FILES_CACHE_TTL", 2))
-        files_cache_logger.debug("FILES-CACHE-SAVE: starting...")
-        # TODO: use something like SaveFile here, but that didn't work due to SyncFile missing .seek().
-        with IntegrityCheckedFile(path=str(self.path / self.files_cache_name()), write=True) as fd:
-            entries = 0
-            age_discarded = 0
-            race_discarded = 0
+        journal = self._files_journal
+        if journal is not None and journal["journal_size"] > journal["base_size"] * self.FILES_JOURNAL_RATIO:
+            journal = None  # time to compact the journal into a new base files cache
+        files_cache_logger.debug("FILES-CACHE-SAVE: starting%s...", " (journal)" if journal is not None else "")
+        updated, deleted, missed = [], [], []
+        entries = 0
+        age_discarded = 0
+        race_discarded = 0
+
+        def kept_entries():
+            nonlocal entries, age_discarded, race_discarded
             for path_hash, entry in files.items():
                 entry = self.decompress_entry(entry)
                 if entry.age == 0:  # current entries
@@ -605,14 +859,147 @@ def _write_files_cache(self, files):
                         keep = False
                         age_discarded += 1
                 if keep:
-                    msgpack.pack((path_hash, entry), fd)
                     entries += 1
+                    yield path_hash, entry
+                    if entry.age > 0:
+                        missed.append(path_hash)
+                    elif path_hash in self._files_dirty:
+                        updated.append((path_hash, entry))
+                else:
+                    deleted.append(path_hash)
+
+        if journal is not None:
+            for _ in kept_entries():
+                pass
+            delta = msgpack.packb((journal["base_id"], updated, deleted, missed))
+            with open(self.path / self.files_journal_name(), "ab") as fd:
+                fd.write(msgpack.packb((xxh64(delta), delta)))
+                fd.flush()
+                os.fsync(fd.fileno())
+            integrity_data = journal["base_id"]
+        else:
+            # TODO: use something like SaveFile here, but that didn't work due to SyncFile missing .seek().
+            with IntegrityCheckedFile(path=str(self.path / self.files_cache_name()), write=True) as fd:
+                for path_hash, entry in kept_entries():
+                    msgpack.pack((path_hash, entry), fd)
+            integrity_data = fd.integrity_data
+            # the journal belongs to the previous base files cache:
+            (self.path / self.files_journal_name()).unlink(missing_ok=True)
         files_cache_logger.debug(f"FILES-CACHE-KILL: removed {age_discarded} entries with age >= TTL [{ttl}]")
         t_str = datetime.fromtimestamp(discard_after / 1e9, timezone.utc).isoformat()
         files_cache_logger.debug(f"FILES-CACHE-KILL: removed {race_discarded} entries with ctime/mtime >= {t_str}")
-        files_cache_logger.debug(f"FILES-CACHE-SAVE: finished, {entries} remaining entries saved.")
+        if journal is not None:
+            files_cache_logger.debug(
+                f"FILES-CACHE-SAVE: finished, {entries} remaining entries, "
+                f"{len(updated)} updated, {len(deleted)} deleted, {len(missed)} missed entries journaled."
+            )
+        else:
+            files_cache_logger.debug(f"FILES-CACHE-SAVE: finished, {entries} remaining entries saved.")
+        return integrity_data
+
+    @property
+    def blocks(self):
+        if self._blocks is None:
+            self._blocks = self._read_blocks_cache()  # try loading from cache dir
+        if self._blocks is None:
+            self._blocks = {}  # start from scratch
+        return self._blocks
+
+    def blocks_cache_name(self):
+        return files_cache_name(self.archive_name, self.BLOCKS_CACHE_NAME)
+
+    def _read_blocks_cache(self):
+        """read blocks cache from cache directory"""
+        blocks = {}
+        logger.debug("Reading blocks cache ...")
+        msg = None
+        try:
+            with IntegrityCheckedFile(
+                path=str(self.path / self.blocks_cache_name()),
+                write=False,
+                integrity_data=self.cache_config.integrity.get(self.blocks_cache_name()),
+            ) as fd:
+                u = msgpack.Unpacker(use_list=True)
+                while True:
+                    data = fd.read(64 * 1024)
+                    if not data:
+                        break
+                    u.feed(data)
+                    try:
+                        for path_hash, entry in u:
+                            entry = BlocksCacheEntry(*entry)
+                            blocks[path_hash] = msgpack.packb(entry._replace(age=entry.age + 1))
+                    except (TypeError, ValueError) as exc:
+                        msg = "The blocks cache seems invalid. [%s]" % str(exc)
+                        break
+        except OSError as exc:
+            msg = "The blocks cache can't be read. [%s]" % str(exc)
+        except FileIntegrityError as fie:
+            msg = "The blocks cache is corrupted. [%s]" % str(fie)
+        if msg is not None:
+            logger.debug(msg)
+            blocks = None
+        return blocks
+
+    def _write_blocks_cache(self, blocks):
+        """write blocks cache to cache directory"""
+        ttl = int(os.environ.get("BORG_FILES_CACHE_TTL", 2))
+        with IntegrityCheckedFile(path=str(self.path / self.blocks_cache_name()), write=True) as fd:
+            for path_hash, entry in blocks.items():
+                entry = BlocksCacheEntry(*msgpack.unpackb(entry))
+                # the checksums are over the contents we read, so there is no race condition like for the
+                # files cache, we only need to get rid of entries of files that we did not see for a while.
+                if entry.age < ttl:
+                    msgpack.pack((path_hash, entry), fd)
         return fd.integrity_data
 
+    def blocks_checksum(self, data):
+        """
+        Return a cheap checksum of the block data for the blocks cache.
+
+        The 64bit xxh64 checksum is seeded with a secret derived from the id key, but it is
+        neither a cryptographic hash nor a MAC: if a changed block has the same size and
+        checksum as the old block, the old chunk is reused and the backup of the file is
+        silently wrong. Accidental collisions are very unlikely, crafted ones can not be
+        ruled out, so the blocks cache must not be used for data written by untrusted parties.
+        """
+        if self._blocks_seed is None:
+            seed = self.key.derive_key(salt=b"", domain=b"blocks_cache", size=8, from_id_key=True)
+            self._blocks_seed = int.from_bytes(seed, "little")
+        return xxh64(data, seed=self._blocks_seed)
+
+    def known_blocks(self, path_hash):
+        """
+        Return the blocks we know from the previous backup of the file that has this path_hash.
+
+        :return: dict checksum -> ChunkListEntry (might be empty)
+        """
+        entry = self.blocks.get(path_hash)
+        if entry is None:
+            return {}
+        entry = BlocksCacheEntry(*msgpack.unpackb(entry))
+        return {checksum: ChunkListEntry(id, size) for checksum, id, size in entry.blocks}
+
+    def memorize_blocks(self, path_hash, blocks):
+        """
+        Memorize the blocks of the file that has this path_hash.
+
+        :param blocks: dict checksum -> ChunkListEntry
+        """
+        entry = BlocksCacheEntry(age=0, blocks=[(checksum, id, size) for checksum, (id, size) in blocks.items()])
+        self.blocks[path_hash] = msgpack.packb(entry)
+        files_cache_logger.debug("BLOCKS-CACHE-UPDATE: put %d blocks", len(blocks))
+
+    def touch_blocks(self, path_hash):
+        """
+        Keep the blocks of the file that has this path_hash (the file is unchanged, so we did not read it).
+        """
+        entry = self.blocks.get(path_hash)
+        if entry is not None:
+            entry = BlocksCacheEntry(*msgpack.unpackb(entry))
+            if entry.age:
+                self.blocks[path_hash] = msgpack.packb(entry._replace(age=0))
+
     def file_known_and_unchanged(self, hashed_path, path_hash, st):
         """
         Check if we know the file that has this path_hash (know == it is in our files cache) and
@@ -636,12 +1023,17 @@ def file_known_and_unchanged(self, hashed_path, path_hash, st):
         if "r" in cache_mode:  # r(echunk)
             files_cache_logger.debug("UNKNOWN: rechunking enforced")
             return False, None
-        entry = self.files.get(path_hash)
+        entry = self._get_file_entry(path_hash)
+        moved = False
+        if not entry and "v" in cache_mode:
+            entry = self._get_moved_file_entry(st)
+            if entry:
+                files_cache_logger.debug("KNOWN-MOVED: same inode number/size/mtime as cached file: %r", hashed_path)
+                moved = True
         if not entry:
             files_cache_logger.debug("UNKNOWN: no file metadata in cache for: %r", hashed_path)
             return False, None
         # we know the file!
-        entry = self.decompress_entry(entry)
         if "s" in cache_mode and entry.size != st.st_size:
             files_cache_logger.debug("KNOWN-CHANGED: file size has changed: %r", hashed_path)
             return True, None
@@ -649,7 +1041,8 @@ def file_known_and_unchanged(self, hashed_path, path_hash, st):
             files_cache_logger.debug("KNOWN-CHANGED: file inode number has changed: %r", hashed_path)
             return True, None
         ctime = int_to_timestamp(safe_ns(st.st_ctime_ns))
-        if "c" in cache_mode and entry.ctime != ctime:
+        # renaming / moving a file updates its ctime, so we can only compare it for the same path:
+        if "c" in cache_mode and not moved and entry.ctime != ctime:
             files_cache_logger.debug("KNOWN-CHANGED: file ctime has changed: %r", hashed_path)
             return True, None
         mtime = int_to_timestamp(safe_ns(st.st_mtime_ns))
@@ -665,7 +1058,7 @@ def file_known_and_unchanged(self, hashed_path, path_hash, st):
         # V comparison in a future backup run (and avoid chunking everything again at
         # that time), we need to update V in the cache with what we see in the filesystem.
         entry = entry._replace(inode=st.st_ino, ctime=ctime, mtime=mtime, age=0)
-        self.files[path_hash] = self.compress_entry(entry)
+        self._put_file_entry(path_hash, entry)
         chunks = [ChunkListEntry(*chunk) for chunk in entry.chunks]  # convert to list of namedtuple
         return True, chunks
 
@@ -686,12 +1079,19 @@ def memorize_file(self, hashed_path, path_hash, st, chunks):
             mtime=int_to_timestamp(mtime_ns),
             chunks=chunks,
         )
-        self.files[path_hash] = self.compress_entry(entry)
+
+        def update():
+            # compress_entry needs the file's chunks in the chunks index, so wait until they are stored.
+            self._put_file_entry(path_hash, entry)
+            files_cache_logger.debug(
+                "FILES-CACHE-UPDATE: put %r <- %r",
+                entry._replace(chunks="[%d entries]" % len(entry.chunks)),
+                hashed_path,
+            )
+
+        self.when_chunks_stored(update)
         self._newest_cmtime = max(self._newest_cmtime or 0, ctime_ns)
         self._newest_cmtime = max(self._newest_cmtime or 0, mtime_ns)
-        files_cache_logger.debug(
-            "FILES-CACHE-UPDATE: put %r <- %r", entry._replace(chunks="[%d entries]" % len(entry.chunks)), hashed_path
-        )
 
 
 def try_upgrade_to_b14(repository):
@@ -705,16 +1105,26 @@ def try_upgrade_to_b14(repository):
             pass  # likely already upgraded
 
 
-def list_chunkindex_hashes(repository):
-    hashes = []
+def list_chunkindex_sizes(repository):
+    """return a dict hash -> size of the cached chunk indexes"""
+    sizes = {}
     for info in repository.store_list("cache"):
         info = ItemInfo(*info)  # RPC does not give namedtuple
         if info.name.startswith("chunks."):
             hash = info.name.removeprefix("chunks.")
-            hashes.append(hash)
-    hashes = sorted(hashes)
-    logger.debug(f"cached chunk indexes: {hashes}")
-    return hashes
+            sizes[hash] = info.size
+    logger.debug(f"cached chunk indexes: {sorted(sizes)}")
+    return sizes
+
+
+def estimate_chunks_count(sizes):
+    """estimate the count of chunks in the repository from the sizes of its cached chunk indexes"""
+    # a serialized chunk index entry has 40 bytes, incremental chunk indexes hardly overlap.
+    return sum(sizes.values()) // 40
+
+
+def list_chunkindex_hashes(repository):
+    return sorted(list_chunkindex_sizes(repository))
 
 
 def delete_chunkindex_cache(repository):
@@ -733,24 +1143,28 @@ def delete_chunkindex_cache(repository):
 
 
 def write_chunkindex_to_repo_cache(
-    repository, chunks, *, incremental=True, clear=False, force_write=False, delete_other=False, delete_these=None
+    repository,
+    chunks,
+    *,
+    incremental=True,
+    used_only=False,
+    clear=False,
+    force_write=False,
+    delete_other=False,
+    delete_these=None,
 ):
-    # for now, we don't want to serialize the flags or the size, just the keys (chunk IDs):
-    cleaned_value = ChunkIndexEntry(flags=ChunkIndex.F_NONE, size=0)
-    chunks_to_write = ChunkIndex()
-    # incremental==True:
-    # the borghash code has no means to only serialize the F_NEW table entries,
-    # thus we copy only the new entries to a temporary table.
-    # incremental==False:
-    # maybe copying the stuff into a new ChunkIndex is not needed here,
-    # but for simplicity, we do it anyway.
-    for key, _ in chunks.iteritems(only_new=incremental):
-        chunks_to_write[key] = cleaned_value
+    # for now, we don't want to serialize the flags or the size, just the keys (chunk IDs).
+    # incremental==True: only serialize the F_NEW table entries.
+    # used_only==True: only serialize the F_USED table entries (e.g. a lazy chunks index, where the other
+    # entries are not known to be in the repo).
+    # write_keys serializes a temporary ChunkIndex with only the keys of the matching entries.
+    flags = ChunkIndex.F_NEW if incremental else ChunkIndex.F_NONE
+    if used_only:
+        flags |= ChunkIndex.F_USED
     with io.BytesIO() as f:
-        chunks_to_write.write(f)
+        count = chunks.write_keys(f, flags)
         data = f.getvalue()
-    logger.debug(f"caching {len(chunks_to_write)} chunks (incremental={incremental}).")
-    chunks_to_write.clear()  # free memory of the temporary table
+    logger.debug(f"caching {count} chunks (incremental={incremental}).")
     if clear:
         # if we don't need the in-memory chunks index anymore:
         chunks.clear()  # free memory, immediately
@@ -767,8 +1181,8 @@ def write_chunkindex_to_repo_cache(
         cache_name = f"cache/chunks.{new_hash}"
         logger.debug(f"caching chunks index as {cache_name} in repository...")
         repository.store_store(cache_name, data)
-        # we have successfully stored to the repository, so we can clear all F_NEW flags now:
-        chunks.clear_new()
+        # we have successfully stored these entries to the repository, so we can clear their F_NEW flags now:
+        chunks.clear_new(flags)
         # delete some not needed cached chunk indexes, but never the one we just wrote:
         if delete_other:
             delete_these = set(cached_hashes) - {new_hash}
@@ -788,7 +1202,8 @@ def write_chunkindex_to_repo_cache(
     return new_hash
 
 
-def read_chunkindex_from_repo_cache(repository, hash):
+def load_chunkindex_from_repo_cache(repository, hash):
+    """return the serialized chunk index cache/chunks.<hash> (None if it does not exist or is invalid)"""
     cache_name = f"cache/chunks.{hash}"
     logger.debug(f"trying to load {cache_name} from the repo...")
     try:
@@ -799,49 +1214,149 @@ def read_chunkindex_from_repo_cache(repository, hash):
     else:
         if xxh64(chunks_data, seed=CHUNKINDEX_HASH_SEED) == hex_to_bin(hash):
             logger.debug(f"{cache_name} is valid.")
-            with io.BytesIO(chunks_data) as f:
-                chunks = ChunkIndex.read(f)
-            return chunks
+            return chunks_data
         else:
             logger.debug(f"{cache_name} is invalid.")
 
 
+CHUNKINDEX_LOCAL_NAME = "chunkindex"
+CHUNKINDEX_MMAP_THRESHOLD = 50_000_000  # by default, use a memory-mapped ChunkIndex for more chunks than this
+
+
+def new_chunkindex(repository, expected=0):
+    """
+    Create a new, empty ChunkIndex for about <expected> chunks.
+
+    BORG_CHUNKS_INDEX_BACKEND=memory or =mmap chooses the backend, by default a memory-mapped
+    ChunkIndex (with its files in the cache directory) is used if more than CHUNKINDEX_MMAP_THRESHOLD
+    chunks are expected. The callers estimate this from the cached chunk indexes in the repository
+    (see estimate_chunks_count), so without any of these, only BORG_CHUNKS_INDEX_BACKEND=mmap selects mmap.
+    """
+    backend = os.environ.get("BORG_CHUNKS_INDEX_BACKEND")
+    if backend not in (None, "memory", "mmap"):
+        raise Error(f"Invalid BORG_CHUNKS_INDEX_BACKEND: {backend!r} (use memory or mmap).")
+    if backend == "mmap" or backend is None and expected > CHUNKINDEX_MMAP_THRESHOLD:
+        path = cache_dir(repository)
+        if not path.is_dir():
+            path = Path(get_cache_dir())
+        logger.debug(f"using a memory-mapped chunk index in {path} ({expected} chunks expected).")
+        return ChunkIndex(usable=expected, mmap_dir=path)
+    return ChunkIndex(usable=expected)
+
+
+def chunkindex_local_path(repository):
+    return Path(get_cache_dir(create=False)) / repository.id_str / CHUNKINDEX_LOCAL_NAME
+
+
+def write_chunkindex_to_local_cache(repository, chunks, hashes):
+    """
+    Store a local copy of the chunk index, merged from the repo-cached chunk indexes <hashes>.
+
+    The local copy is only stored if the local cache directory of the repository exists.
+    """
+    path = chunkindex_local_path(repository)
+    if not path.parent.is_dir():
+        return
+    with SaveFile(path, binary=True) as fd:
+        # header (hashes and count of the keys), serialized chunk index keys, xxh64 of all that
+        hasher = XXH64FileHashingWrapper(backing_fd=fd, write=True)
+        header = msgpack.packb({"hashes": sorted(hashes), "count": len(chunks)})
+        hasher.write(struct.pack("<I", len(header)) + header)
+        chunks.write_keys(hasher)
+        fd.write(hasher.hash.digest())
+    logger.debug(f"stored local copy of the chunk index (merged from {sorted(hashes)}).")
+
+
+def read_chunkindex_from_local_cache(repository, chunks):
+    """
+    Load the local copy of the chunk index into the empty ChunkIndex chunks.
+
+    :return: the set of the repo-cached chunk indexes it was merged from, None if there is no valid local copy.
+    """
+    path = chunkindex_local_path(repository)
+    try:
+        with open(path, "rb") as fd:
+            data = memoryview(fd.read())
+    except OSError:
+        return None
+    try:
+        if len(data) < 12 or xxh64(data[:-8]) != data[-8:]:
+            raise ValueError("checksum mismatch")
+        header_end = 4 + struct.unpack_from("<I", data)[0]
+        header = msgpack.unpackb(data[4:header_end])
+        chunks.merge_serialized(data[header_end:-8])
+    except (ValueError, KeyError, TypeError, msgpack.UnpackException) as exc:
+        logger.debug(f"local copy of the chunk index {path} is invalid [{exc}].")
+        chunks.clear()
+        return None
+    chunks.clear_new()
+    return set(header["hashes"])
+
+
 def build_chunkindex_from_repo(repository, *, disable_caches=False, cache_immediately=False):
     try_upgrade_to_b14(repository)
     # first, try to build a fresh, mostly complete chunk index from centrally cached chunk indexes:
+    # even if we do not use the cached chunk indexes, their sizes tell how many chunks to expect.
+    sizes = list_chunkindex_sizes(repository)
     if not disable_caches:
-        hashes = list_chunkindex_hashes(repository)
+        hashes = sorted(sizes)
         if hashes:  # we have at least one cached chunk index!
-            merged = 0
-            chunks = ChunkIndex()  # we'll merge all we find into this
+            chunks = new_chunkindex(repository, expected=estimate_chunks_count(sizes))  # we'll merge all into this
+            # if we have a local copy merged from some of these, we only need to get and merge the others.
+            # if the local copy was merged from a cached chunk index that does not exist anymore, it is
+            # outdated (chunks might have been deleted from the repository since then), so we can't use it.
+            local_hashes = read_chunkindex_from_local_cache(repository, chunks)
+            if local_hashes is not None and local_hashes <= set(hashes):
+                logger.debug(f"using local copy of the chunk index (merged from {sorted(local_hashes)}).")
+            else:
+                if local_hashes is not None:
+                    chunks.clear()
+                local_hashes = set()
+            merged_hashes = set(local_hashes)
             for hash in hashes:
-                chunks_to_merge = read_chunkindex_from_repo_cache(repository, hash)
-                if chunks_to_merge is not None:
+                if hash in local_hashes:
+                    continue
+                chunks_data = load_chunkindex_from_repo_cache(repository, hash)
+                if chunks_data is not None:
                     logger.debug(f"cached chunk index {hash} gets merged...")
-                    for k, v in chunks_to_merge.items():
-                        chunks[k] = v
-                    merged += 1
-                    chunks_to_merge.clear()
-            if merged > 0:
-                if merged > 1 and cache_immediately:
+                    chunks.merge_serialized(chunks_data)
+                    merged_hashes.add(hash)
+                    del chunks_data
+            if merged_hashes:
+                if len(merged_hashes) > 1 and cache_immediately:
                     # immediately update cache/chunks, so we don't have to merge these again:
-                    write_chunkindex_to_repo_cache(
-                        repository, chunks, clear=False, force_write=True, delete_these=hashes
+                    new_hash = write_chunkindex_to_repo_cache(
+                        repository, chunks, incremental=False, clear=False, force_write=True, delete_these=hashes
                     )
+                    merged_hashes = {new_hash}
                 else:
                     chunks.clear_new()
+                if merged_hashes != local_hashes:
+                    write_chunkindex_to_local_cache(repository, chunks, merged_hashes)
                 return chunks
     # if we didn't get anything from the cache, compute the ChunkIndex the slow way:
     logger.debug("querying the chunk IDs list from the repo...")
-    chunks = ChunkIndex()
+    chunks = new_chunkindex(repository, expected=estimate_chunks_count(sizes))
     t0 = perf_counter()
     num_chunks = 0
     # The repo says it has these chunks, so we assume they are referenced/used chunks.
     # We do not know the plaintext size (!= stored_size), thus we set size = 0.
     init_entry = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=0)
-    for id, stored_size in repo_lister(repository, limit=LIST_SCAN_LIMIT):
-        num_chunks += 1
-        chunks[id] = init_entry
+    if isinstance(repository, (Repository, RemoteRepository)):
+        # list the shards of data/ with parallel threads (done by borg serve for remote repos).
+        lister = repo_sharded_lister(repository)
+    else:
+        lister = repo_lister(repository, limit=LIST_SCAN_LIMIT)
+    try:
+        for id, stored_size in lister:
+            num_chunks += 1
+            chunks[id] = init_entry
+    except RemoteRepository.RPCServerOutdated:
+        # borg serve is too old for list_prefix, this happens at the first shard, before we got anything.
+        assert num_chunks == 0
+        for id, stored_size in repo_lister(repository, limit=LIST_SCAN_LIMIT):
+            num_chunks += 1
+            chunks[id] = init_entry
     # Cache does not contain the manifest.
     if not isinstance(repository, (Repository, RemoteRepository)):
         del chunks[Manifest.MANIFEST_ID]
@@ -852,31 +1367,104 @@ def build_chunkindex_from_repo(repository, *, disable_caches=False, cache_immedi
     logger.debug(f"queried {num_chunks} chunk IDs in {duration} s, ~{speed}/s")
     if cache_immediately:
         # immediately update cache/chunks, so we only rarely have to do it the slow way:
-        write_chunkindex_to_repo_cache(repository, chunks, clear=False, force_write=True, delete_other=True)
+        new_hash = write_chunkindex_to_repo_cache(repository, chunks, clear=False, force_write=True, delete_other=True)
+        write_chunkindex_to_local_cache(repository, chunks, {new_hash})
     return chunks
 
 
 class ChunksMixin:
     """
     Chunks index related code for misc. Cache implementations.
+
+    With workers > 1, new chunks added with wait=False are processed in a pipeline: the caller continues
+    with reading, chunking and hashing while a thread pool compresses the chunks (the compressors release
+    the GIL). The compressed chunks are then encrypted and stored in the order they were added. A pending
+    chunk counts as seen for deduplication, but only gets into the chunks index after it was stored.
+
+    With lazy_chunks and BORG_CHUNKS_INDEX_LAZY=yes, the chunks index is not built from the repo (which
+    needs to get all chunk IDs of the repo), but starts empty: if we need to know whether the repo has
+    some chunks we do not know yet, we ask the repo via has_many (in batches, see seen_chunks). Only
+    chunks with F_USED are known to be in the repo, other entries just remember the chunk size for the
+    files cache. Thus, only the new entries with F_USED are written to the repo cache.
     """
 
-    def __init__(self):
+    PENDING_CHUNKS_PER_WORKER = 4  # bounds the memory used for chunks in the pipeline
+    HAS_MANY_IDS = 1000  # max. count of chunk IDs per has_many call
+
+    def __init__(self, workers=1, lazy_chunks=False):
         self._chunks = None
+        self.chunks_lazy = lazy_chunks and os.environ.get("BORG_CHUNKS_INDEX_LAZY", "no").lower() == "yes"
+        self._chunks_missing = set()  # lazy chunks index: IDs of chunks the repo did not have
         self.last_refresh_dt = datetime.now(timezone.utc)
         self.refresh_td = timedelta(seconds=60)
         self.chunks_cache_last_write = datetime.now(timezone.utc)
         self.chunks_cache_write_td = timedelta(seconds=600)
+        self.workers = workers
+        self._compress_executor = None
+        self._pending_chunks = {}  # id -> (size, future), in the order the chunks were added
+        self._pending_added = 0  # count of chunks added to the pipeline
+        self._pending_stored = 0  # count of chunks stored from the pipeline
+        self._when_stored = deque()  # (pending_added, callback), see when_chunks_stored
 
     @property
     def chunks(self):
         if self._chunks is None:
-            self._chunks = build_chunkindex_from_repo(self.repository, cache_immediately=True)
+            if self.chunks_lazy and not self._has_many_supported():
+                self.chunks_lazy = False
+            if self.chunks_lazy:
+                logger.debug("using a lazy chunks index.")
+                self._chunks = ChunkIndex()
+                self._chunks_missing = set()
+            else:
+                self._chunks = build_chunkindex_from_repo(self.repository, cache_immediately=True)
         return self._chunks
 
+    def _has_many_supported(self):
+        try:
+            self.repository.has_many([])
+        except RemoteRepository.RPCServerOutdated:
+            logger.debug("borg serve does not support has_many, can not use a lazy chunks index.")
+            return False
+        return True
+
+    def _query_chunks(self, ids):
+        # lazy chunks index: ask the repo about the chunks we do not know yet.
+        chunks = self.chunks
+        query = []
+        for id in ids:
+            if id in self._pending_chunks or id in self._chunks_missing:
+                continue
+            entry = chunks.get(id)
+            if entry is None or not entry.flags & ChunkIndex.F_USED:
+                query.append(id)
+        query = list(dict.fromkeys(query))  # without duplicates, but in order
+        for i in range(0, len(query), self.HAS_MANY_IDS):
+            batch = query[i : i + self.HAS_MANY_IDS]
+            bitmap = self.repository.has_many(batch)
+            for j, id in enumerate(batch):
+                if bitmap[j // 8] & (1 << j % 8):
+                    entry = chunks.get(id)
+                    chunks[id] = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=entry.size if entry else 0)
+                else:
+                    self._chunks_missing.add(id)
+
+    def seen_chunks(self, ids):
+        """return a list of bools: which of the chunks <ids> did we see (see seen_chunk)?"""
+        if self.chunks_lazy:
+            self._query_chunks(ids)  # one has_many call for many ids, instead of one per id
+        return [self.seen_chunk(id) for id in ids]
+
     def seen_chunk(self, id, size=None):
+        pending = self._pending_chunks.get(id)
+        if pending is not None:
+            assert size is None or size == pending[0]
+            return True
+        if self.chunks_lazy:
+            self._query_chunks([id])
         entry = self.chunks.get(id)
         entry_exists = entry is not None
+        if entry_exists and self.chunks_lazy:
+            entry_exists = bool(entry.flags & ChunkIndex.F_USED)  # otherwise, the repo did not have it
         if entry_exists and size is not None:
             if entry.size == 0:
                 # AdHocWithFilesCache:
@@ -920,19 +1508,68 @@ def add_chunk(
             # there could be a long time without any repository operations and the repo lock would get stale.
             self.refresh_lock(now)
             return self.reuse_chunk(id, size, stats)
-        cdata = self.repo_objs.format(
-            id, meta, data, compress=compress, size=size, ctype=ctype, clevel=clevel, ro_type=ro_type
-        )
-        self.repository.put(id, cdata, wait=wait)
-        self.last_refresh_dt = now  # .put also refreshed the lock
-        self.chunks.add(id, size)
+        if self.workers > 1 and compress and not wait:
+            self._add_pending_chunk(id, meta, data, size, ro_type)
+        else:
+            cdata = self.repo_objs.format(
+                id, meta, data, compress=compress, size=size, ctype=ctype, clevel=clevel, ro_type=ro_type
+            )
+            self.repository.put(id, cdata, wait=wait)
+            self.last_refresh_dt = now  # .put also refreshed the lock
+            self.chunks.add(id, size)
         stats.update(size, not exists)
         return ChunkListEntry(id, size)
 
+    def _add_pending_chunk(self, id, meta, data, size, ro_type):
+        if self._compress_executor is None:
+            self._compress_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="borg-compress")
+        # the chunker may reuse the buffer behind a memoryview, so the worker needs its own copy of the data.
+        future = self._compress_executor.submit(self.repo_objs.compress, meta, bytes(data), ro_type=ro_type)
+        self._pending_chunks[id] = (size, future)
+        self._pending_added += 1
+        self._store_pending_chunks(max_pending=self.workers * self.PENDING_CHUNKS_PER_WORKER)
+
+    def _store_pending_chunks(self, max_pending=0):
+        # encrypt and store the compressed pending chunks (in order), until at most max_pending are left.
+        while self._pending_chunks:
+            id, (size, future) = next(iter(self._pending_chunks.items()))
+            if len(self._pending_chunks) <= max_pending and not future.done():
+                break
+            meta, data_compressed = future.result()
+            cdata = self.repo_objs.format_compressed(id, meta, data_compressed)
+            self.repository.put(id, cdata, wait=False)
+            self.last_refresh_dt = datetime.now(timezone.utc)  # .put also refreshed the lock
+            del self._pending_chunks[id]
+            self.chunks.add(id, size)
+            self._pending_stored += 1
+            while self._when_stored and self._when_stored[0][0] <= self._pending_stored:
+                self._when_stored.popleft()[1]()
+
+    def when_chunks_stored(self, callback):
+        """call callback when all chunks added so far are stored and in the chunks index"""
+        if self._pending_chunks:
+            self._when_stored.append((self._pending_added, callback))
+        else:
+            callback()
+
+    def flush_chunks(self):
+        """store all pending chunks, must be called before referring to them in the manifest"""
+        self._store_pending_chunks()
+
+    def _discard_pending_chunks(self):
+        # pending chunks were not stored (e.g. due to an exception), thus they never got into the chunks index.
+        self._pending_chunks.clear()
+        self._when_stored.clear()
+        if self._compress_executor is not None:
+            self._compress_executor.shutdown(cancel_futures=True)
+            self._compress_executor = None
+
     def _maybe_write_chunks_cache(self, now, force=False, clear=False):
         if force or now > self.chunks_cache_last_write + self.chunks_cache_write_td:
             if self._chunks is not None:
-                write_chunkindex_to_repo_cache(self.repository, self._chunks, clear=clear)
+                # the cached chunks index must only refer to stored chunks.
+                self._store_pending_chunks()
+                write_chunkindex_to_repo_cache(self.repository, self._chunks, used_only=self.chunks_lazy, clear=clear)
             self.chunks_cache_last_write = now
 
     def refresh_lock(self, now):
@@ -964,13 +1601,18 @@ def __init__(
         iec=False,
         archive_name=None,
         start_backup=None,
+        workers=1,
+        lazy_chunks=False,
     ):
         """
         :param warn_if_unencrypted: print warning if accessing unknown unencrypted repository
         :param cache_mode: what shall be compared in the file stat infos vs. cached stat infos comparison
+        :param workers: count of threads for compressing new chunks (see ChunksMixin)
+        :param lazy_chunks: the caller only uses seen_chunk(s) and add_chunk, so a lazy chunks index
+                            can be used (see ChunksMixin)
         """
         FilesCacheMixin.__init__(self, cache_mode, archive_name, start_backup)
-        ChunksMixin.__init__(self)
+        ChunksMixin.__init__(self, workers, lazy_chunks)
         assert isinstance(manifest, Manifest)
         self.manifest = manifest
         self.repository = manifest.repository
@@ -1004,7 +1646,11 @@ def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+        try:
+            if exc_type is None:
+                self.flush_chunks()
+        finally:
+            self.close()
         self._chunks = None
 
     def create(self):
@@ -1021,12 +1667,20 @@ def open(self):
         self.cache_config.load()
 
     def close(self):
+        self._discard_pending_chunks()
         self.security_manager.save(self.manifest, self.key)
         pi = ProgressIndicatorMessage(msgid="cache.close")
-        if self._files is not None:
+        if isinstance(self._files, FilesCacheTable):
+            pi.output("Saving files cache")
+            self._close_files_table(self._files)
+        elif self._files is not None:
             pi.output("Saving files cache")
             integrity_data = self._write_files_cache(self._files)
             self.cache_config.integrity[self.files_cache_name()] = integrity_data
+        if self._blocks is not None:
+            pi.output("Saving blocks cache")
+            integrity_data = self._write_blocks_cache(self._blocks)
+            self.cache_config.integrity[self.blocks_cache_name()] = integrity_data
         if self._chunks is not None:
             for key, value in sorted(self._chunks.stats.items()):
                 logger.debug(f"Chunks index stats: {key}: {value}")
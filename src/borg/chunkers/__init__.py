@@ -1,7 +1,9 @@
 from .buzhash import Chunker
 from .buzhash64 import ChunkerBuzHash64
 from .failing import ChunkerFailing
+from .fastcdc import ChunkerFastCDC
 from .fixed import ChunkerFixed
+from .parallel import ChunkerParallel
 from .reader import *  # noqa
 
 API_VERSION = "1.2_01"
@@ -10,6 +12,7 @@
 def get_chunker(algo, *params, **kw):
     key = kw.get("key", None)
     sparse = kw.get("sparse", False)
+    threads = kw.get("threads", 1)
     # key.chunk_seed only has 32bits
     seed = key.chunk_seed if key is not None else 0
     # for buzhash64, we want a much longer key, so we derive it from the id key
@@ -17,9 +20,17 @@ def get_chunker(algo, *params, **kw):
         key.derive_key(salt=b"", domain=b"buzhash64", size=32, from_id_key=True) if key is not None else b"\0" * 32
     )
     if algo == "buzhash":
+        if threads > 1:
+            return ChunkerParallel(seed, *params, sparse=sparse, threads=threads)
         return Chunker(seed, *params, sparse=sparse)
     if algo == "buzhash64":
         return ChunkerBuzHash64(bh64_key, *params, sparse=sparse)
+    if algo == "fastcdc":
+        # the gear table is generated from a key derived from the id key, like for buzhash64
+        fastcdc_key = (
+            key.derive_key(salt=b"", domain=b"fastcdc", size=32, from_id_key=True) if key is not None else b"\0" * 32
+        )
+        return ChunkerFastCDC(fastcdc_key, *params, sparse=sparse)
     if algo == "fixed":
         return ChunkerFixed(*params, sparse=sparse)
     if algo == "fail":
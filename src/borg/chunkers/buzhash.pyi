@@ -8,6 +8,7 @@ def buzhash(data: bytes, seed: int) -> int: ...
 def buzhash_update(sum: int, remove: int, add: int, len: int, seed: int) -> int: ...
 
 class Chunker:
+    chunking_time: float
     def __init__(
         self,
         seed: int,
@@ -17,4 +18,5 @@ class Chunker:
         hash_window_size: int,
         sparse: bool = False,
     ) -> None: ...
+    def cut_candidates(self, data: bytes) -> List[int]: ...
     def chunkify(self, fd: BinaryIO = None, fh: int = -1, fmap: List[fmap_entry] = None) -> Iterator: ...
@@ -6,7 +6,7 @@ import cython
 import time
 from cpython.bytes cimport PyBytes_AsString
 from libc.stdint cimport uint8_t, uint32_t
-from libc.stdlib cimport malloc, free
+from libc.stdlib cimport malloc, realloc, free
 from libc.string cimport memcpy, memmove
 
 from ..constants import CH_DATA, CH_ALLOC, CH_HOLE, zeros
@@ -78,7 +78,7 @@ cdef extern from *:
    """
    #define BARREL_SHIFT(v, shift) (((v) << (shift)) | ((v) >> (((32 - (shift)) & 0x1f))))
    """
-   uint32_t BARREL_SHIFT(uint32_t v, uint32_t shift)
+   uint32_t BARREL_SHIFT(uint32_t v, uint32_t shift) nogil
 
 
 @cython.boundscheck(False)  # Deactivate bounds checking
@@ -95,7 +95,7 @@ cdef uint32_t* buzhash_init_table(uint32_t seed):
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)  # Deactivate negative indexing.
 @cython.cdivision(True)  # Use C division/modulo semantics for integer division.
-cdef uint32_t _buzhash(const unsigned char* data, size_t len, const uint32_t* h):
+cdef uint32_t _buzhash(const unsigned char* data, size_t len, const uint32_t* h) noexcept nogil:
     """Calculate the buzhash of the given data."""
     cdef uint32_t i
     cdef uint32_t sum = 0, imod
@@ -109,7 +109,7 @@ cdef uint32_t _buzhash(const unsigned char* data, size_t len, const uint32_t* h)
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)  # Deactivate negative indexing.
 @cython.cdivision(True)  # Use C division/modulo semantics for integer division.
-cdef uint32_t _buzhash_update(uint32_t sum, unsigned char remove, unsigned char add, size_t len, const uint32_t* h):
+cdef uint32_t _buzhash_update(uint32_t sum, unsigned char remove, unsigned char add, size_t len, const uint32_t* h) noexcept nogil:
     """Update the buzhash with a new byte."""
     cdef uint32_t lenmod = len & 0x1f
     return BARREL_SHIFT(sum, 1) ^ BARREL_SHIFT(h[remove], lenmod) ^ h[add]
@@ -275,6 +275,57 @@ cdef class Chunker:
         # Return a memory view of the chunk
         return memoryview((self.data + old_last)[:n])
 
+    @cython.boundscheck(False)  # Deactivate bounds checking
+    @cython.wraparound(False)  # Deactivate negative indexing.
+    def cut_candidates(self, const uint8_t[::1] data):
+        """
+        Return the offsets of all cut candidates within data.
+
+        A cut candidate is the start offset of a hash window that is fully inside data and
+        has a rolling hash with the last n bits being 0. Candidates only depend on the data
+        inside the window, not on where the current chunk started, thus they can be computed
+        for different regions of a file in parallel (the GIL is released while hashing).
+        See ChunkerParallel for how chunks are cut from them.
+        """
+        cdef size_t n = data.shape[0], window_size = self.window_size
+        cdef size_t i = 0, count = 0, capacity = 1024
+        cdef uint32_t sum, chunk_mask = self.chunk_mask
+        cdef const uint32_t* table = self.table
+        cdef const uint8_t* p
+        cdef size_t* found
+        cdef size_t* grown
+        cdef bint failed = 0
+
+        if n < window_size:
+            return []
+        p = &data[0]
+        found = <size_t*>malloc(capacity * sizeof(size_t))
+        if found == NULL:
+            raise MemoryError
+        try:
+            with nogil:
+                sum = _buzhash(p, window_size, table)
+                while True:
+                    if not (sum & chunk_mask):
+                        if count == capacity:
+                            grown = <size_t*>realloc(found, 2 * capacity * sizeof(size_t))
+                            if grown == NULL:
+                                failed = 1
+                                break
+                            found = grown
+                            capacity *= 2
+                        found[count] = i
+                        count += 1
+                    if i + window_size >= n:
+                        break
+                    sum = _buzhash_update(sum, p[i], p[i + window_size], window_size, table)
+                    i += 1
+            if failed:
+                raise MemoryError
+            return [found[i] for i in range(count)]
+        finally:
+            free(found)
+
     def chunkify(self, fd, fh=-1, fmap=None):
         """
         Cut a file into chunks.
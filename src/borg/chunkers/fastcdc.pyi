@@ -0,0 +1,13 @@
+from typing import List, Iterator, BinaryIO
+
+from .reader import fmap_entry
+
+API_VERSION: str
+
+def fastcdc_get_table(key: bytes) -> List[int]: ...
+
+class ChunkerFastCDC:
+    def __init__(
+        self, key: bytes, chunk_min_exp: int, chunk_max_exp: int, hash_mask_bits: int, sparse: bool = False
+    ) -> None: ...
+    def chunkify(self, fd: BinaryIO = None, fh: int = -1, fmap: List[fmap_entry] = None) -> Iterator: ...
@@ -0,0 +1,266 @@
+# cython: language_level=3
+
+API_VERSION = '1.2_01'
+
+import cython
+import time
+
+from cpython.bytes cimport PyBytes_AsString
+from libc.stdint cimport uint8_t, uint64_t
+from libc.stdlib cimport malloc, free
+from libc.string cimport memcpy, memmove
+
+from ..crypto.low_level import CSPRNG
+
+from ..constants import CH_DATA, CH_ALLOC, CH_HOLE, zeros
+from .reader import FileReader, Chunk
+
+# Gear hash / FastCDC
+#
+# https://www.usenix.org/conference/atc16/technical-sessions/presentation/xia (FastCDC paper)
+#
+# Some properties of gear hash / of this implementation:
+#
+# (1) the gear hash is updated by shifting the previous hash value 1 bit to the left and adding a
+#     table value for the new byte, thus a byte's influence has left the 64bit hash value after
+#     64 more bytes: the window size is implicitly 64 bytes.
+# (2) the most significant bits are influenced by the most bytes, thus the cut condition is checked
+#     on the top bits of the hash value.
+# (3) to make the cut points purely content-defined, the hash is "warmed up" over the 64 bytes
+#     before the minimum chunk size, so the hash at a potential cut place never depends on the
+#     position where the chunk started.
+# (4) normalized chunking: before the normal (target) chunk size, a stricter mask (more bits) is
+#     used, after it, a looser mask (less bits) is used. This makes the chunk size distribution
+#     tighter around the target chunk size.
+
+cdef enum:
+    GEAR_WINDOW_SIZE = 64  # window size of the gear hash, see (1)
+    NORMALIZATION_BITS = 2  # normalization level, see (4)
+
+
+@cython.boundscheck(False)  # Deactivate bounds checking
+@cython.wraparound(False)  # Deactivate negative indexing.
+cdef uint64_t* gear_init_table(bytes key):
+    """Generate a pseudo-random gear table deterministically from a 256-bit key."""
+    rng = CSPRNG(key)
+    cdef int i
+    cdef bytes random_data = rng.random_bytes(2048)  # 256 * sizeof(uint64_t)
+    cdef const uint8_t* p = <const uint8_t*>PyBytes_AsString(random_data)
+    cdef uint64_t* table = <uint64_t*>malloc(2048)
+    for i in range(256):
+        # independent of the machine's endianness
+        table[i] = (
+            (<uint64_t>p[0] << 56) | (<uint64_t>p[1] << 48) | (<uint64_t>p[2] << 40) | (<uint64_t>p[3] << 32) |
+            (<uint64_t>p[4] << 24) | (<uint64_t>p[5] << 16) | (<uint64_t>p[6] << 8) | <uint64_t>p[7]
+        )
+        p += 8
+    return table
+
+
+cdef inline uint64_t top_bits_mask(int bits):
+    """Return a mask selecting the <bits> most significant bits of a 64bit value."""
+    if bits <= 0:
+        return 0
+    return ((1ULL << bits) - 1) << (64 - bits)
+
+
+cdef class ChunkerFastCDC:
+    """
+    Content-Defined Chunker, variable chunk sizes.
+
+    This chunker uses the gear rolling hash (as used by FastCDC) to identify the chunk
+    cutting places. The gear hash is much cheaper to compute than buzhash (1 shift, 1 add
+    and 1 table lookup per byte) and normalized chunking gives a tighter chunk size
+    distribution around the target chunk size.
+    The gear table is derived from secret key material to avoid some chunk length
+    fingerprinting attacks.
+    """
+    cdef uint64_t mask_s, mask_l
+    cdef uint64_t* table
+    cdef uint8_t* data
+    cdef object _fd  # Python object for file descriptor
+    cdef int fh
+    cdef int done, eof
+    cdef size_t min_size, normal_size, buf_size, remaining, position, last
+    cdef long long bytes_read, bytes_yielded  # off_t in C, using long long for compatibility
+    cdef readonly float chunking_time
+    cdef object file_reader  # FileReader instance
+    cdef size_t reader_block_size
+    cdef bint sparse
+
+    def __cinit__(self, bytes key, int chunk_min_exp, int chunk_max_exp, int hash_mask_bits, bint sparse=False):
+        min_size = 1 << chunk_min_exp
+        max_size = 1 << chunk_max_exp
+        assert max_size <= len(zeros)
+        assert GEAR_WINDOW_SIZE <= min_size < max_size, "required: 64 <= min_size < max_size"
+        assert chunk_min_exp <= hash_mask_bits <= chunk_max_exp, "required: chunk_min <= chunk_mask <= chunk_max"
+
+        self.mask_s = top_bits_mask(hash_mask_bits + NORMALIZATION_BITS)
+        self.mask_l = top_bits_mask(hash_mask_bits - NORMALIZATION_BITS)
+        self.min_size = min_size
+        self.normal_size = 1 << hash_mask_bits
+        self.table = gear_init_table(key)
+        self.buf_size = max_size
+        self.data = <uint8_t*>malloc(self.buf_size)
+        self.fh = -1
+        self.done = 0
+        self.eof = 0
+        self.remaining = 0
+        self.position = 0
+        self.last = 0
+        self.bytes_read = 0
+        self.bytes_yielded = 0
+        self._fd = None
+        self.chunking_time = 0.0
+        self.reader_block_size = 1024 * 1024
+        self.sparse = sparse
+
+    def __dealloc__(self):
+        """Free the chunker's resources."""
+        if self.table != NULL:
+            free(self.table)
+            self.table = NULL
+        if self.data != NULL:
+            free(self.data)
+            self.data = NULL
+
+    cdef int fill(self) except 0:
+        """Fill the chunker's buffer with more data."""
+        cdef ssize_t n
+        cdef object chunk
+
+        # Move remaining data to the beginning of the buffer
+        memmove(self.data, self.data + self.last, self.position + self.remaining - self.last)
+        self.position -= self.last
+        self.last = 0
+        n = self.buf_size - self.position - self.remaining
+
+        if self.eof or n == 0:
+            return 1
+
+        # Use FileReader to read data
+        chunk = self.file_reader.read(n)
+        n = chunk.meta["size"]
+
+        if n > 0:
+            # Only copy data if it's not a hole
+            if chunk.meta["allocation"] == CH_DATA:
+                # Copy data from chunk to our buffer
+                memcpy(self.data + self.position + self.remaining, <const unsigned char*>PyBytes_AsString(chunk.data), n)
+            else:
+                # For holes, fill with zeros
+                memcpy(self.data + self.position + self.remaining, <const unsigned char*>PyBytes_AsString(zeros[:n]), n)
+
+            self.remaining += n
+            self.bytes_read += n
+        else:
+            self.eof = 1
+
+        return 1
+
+    @cython.boundscheck(False)  # Deactivate bounds checking
+    @cython.wraparound(False)  # Deactivate negative indexing.
+    cdef size_t cut(self, const uint8_t* p, size_t n):
+        """Return the length of the next chunk found within the n bytes at p."""
+        cdef uint64_t h = 0
+        cdef uint64_t mask_s = self.mask_s, mask_l = self.mask_l
+        cdef const uint64_t* table = self.table
+        cdef size_t i, normal_size = self.normal_size
+
+        if n <= self.min_size:
+            return n
+        if normal_size > n:
+            normal_size = n
+        # warm up the hash over the window before the first possible cut place, see (3)
+        for i in range(self.min_size - GEAR_WINDOW_SIZE, self.min_size):
+            h = (h << 1) + table[p[i]]
+        for i in range(self.min_size, normal_size):
+            h = (h << 1) + table[p[i]]
+            if not (h & mask_s):
+                return i + 1
+        for i in range(normal_size, n):
+            h = (h << 1) + table[p[i]]
+            if not (h & mask_l):
+                return i + 1
+        return n
+
+    cdef object process(self) except *:
+        """Process the chunker's buffer and return the next chunk."""
+        cdef size_t n
+
+        if self.done:
+            if self.bytes_read == self.bytes_yielded:
+                raise StopIteration
+            else:
+                raise Exception("chunkifier byte count mismatch")
+
+        # we need either a full buffer (max_size bytes) or eof, so we can cut at max_size.
+        while self.remaining < self.buf_size and not self.eof:
+            if not self.fill():
+                return None
+
+        if self.remaining == 0:
+            self.done = 1
+            if self.bytes_read == self.bytes_yielded:
+                raise StopIteration
+            else:
+                raise Exception("chunkifier byte count mismatch")
+
+        n = self.cut(self.data + self.position, self.remaining)
+        self.position += n
+        self.remaining -= n
+        self.last = self.position
+        self.bytes_yielded += n
+
+        # Return a memory view of the chunk
+        return memoryview((self.data + self.position - n)[:n])
+
+    def chunkify(self, fd, fh=-1, fmap=None):
+        """
+        Cut a file into chunks.
+
+        :param fd: Python file object
+        :param fh: OS-level file handle (if available),
+                   defaults to -1 which means not to use OS-level fd.
+        :param fmap: a file map, same format as generated by sparsemap
+        """
+        self._fd = fd
+        self.fh = fh
+        self.file_reader = FileReader(fd=fd, fh=fh, read_size=self.reader_block_size, sparse=self.sparse, fmap=fmap)
+        self.done = 0
+        self.remaining = 0
+        self.bytes_read = 0
+        self.bytes_yielded = 0
+        self.position = 0
+        self.last = 0
+        self.eof = 0
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started_chunking = time.monotonic()
+        data = self.process()
+        got = len(data)
+        # we do not have SEEK_DATA/SEEK_HOLE support in chunker_process C code,
+        # but we can just check if data was all-zero (and either came from a hole
+        # or from stored zeros - we can not detect that here).
+        if zeros.startswith(data):
+            data = None
+            allocation = CH_ALLOC
+        else:
+            allocation = CH_DATA
+        self.chunking_time += time.monotonic() - started_chunking
+        return Chunk(data, size=got, allocation=allocation)
+
+
+def fastcdc_get_table(bytes key):
+    """Get the gear table generated from <key>."""
+    cdef uint64_t *table
+    cdef int i
+    table = gear_init_table(key)
+    try:
+        return [table[i] for i in range(256)]
+    finally:
+        free(table)
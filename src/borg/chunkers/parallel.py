@@ -0,0 +1,140 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Iterator, BinaryIO
+import os
+import stat
+
+API_VERSION = "1.2_01"
+
+import time
+
+from ..constants import CH_DATA, CH_ALLOC, zeros
+from .buzhash import Chunker
+from .reader import FileReader, Chunk
+
+
+class ChunkerParallel:
+    """
+    Content-Defined Chunker (buzhash), cutting big files using multiple threads.
+
+    The file is read in regions and the cut candidates of all regions (see Chunker.cut_candidates)
+    are computed in parallel by multiple threads. As the candidates only depend on the data inside
+    the hash window, the chunks are then cut sequentially from them using the same rules as the
+    sequential buzhash Chunker:
+
+    - a chunk starting at offset S may only be cut at a candidate C with C >= S + min_size and
+      C + window_size < min(S + max_size, file_size),
+    - the first such candidate is used, if there is none, the chunk ends at S + max_size (or at the
+      end of the file).
+
+    Thus, the resulting chunks are identical to the ones of a sequential run.
+
+    Small regular files are just given to the sequential Chunker.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        chunk_min_exp: int,
+        chunk_max_exp: int,
+        hash_mask_bits: int,
+        hash_window_size: int,
+        sparse: bool = False,
+        threads: int = 2,
+        region_size: int = 8 * 1024 * 1024,
+    ) -> None:
+        self.chunker = Chunker(seed, chunk_min_exp, chunk_max_exp, hash_mask_bits, hash_window_size, sparse=sparse)
+        self.min_size = 1 << chunk_min_exp
+        self.max_size = 1 << chunk_max_exp
+        self.window_size = hash_window_size
+        self.sparse = sparse
+        self.threads = threads
+        self.region_size = region_size
+        # regular files smaller than this are chunked sequentially
+        self.parallel_min_size = 2 * region_size
+        self._chunking_time = 0.0
+
+    @property
+    def chunking_time(self) -> float:
+        return self.chunker.chunking_time + self._chunking_time
+
+    def chunkify(self, fd: BinaryIO = None, fh: int = -1, fmap: List = None) -> Iterator:
+        """
+        Cut a file into chunks.
+
+        :param fd: Python file object
+        :param fh: OS-level file handle (if available),
+                   defaults to -1 which means not to use OS-level fd.
+        :param fmap: a file map, same format as generated by sparsemap
+        """
+        if fh >= 0:
+            st = os.fstat(fh)
+            if stat.S_ISREG(st.st_mode) and st.st_size < self.parallel_min_size:
+                return self.chunker.chunkify(fd, fh, fmap)
+        reader = FileReader(fd=fd, fh=fh, read_size=self.region_size, sparse=self.sparse, fmap=fmap)
+        return self._chunkify(reader)
+
+    def _chunkify(self, reader: FileReader) -> Iterator:
+        min_size, max_size, window_size = self.min_size, self.max_size, self.window_size
+        # (offset, data) of regions read from the file, but not yet fully yielded:
+        regions: deque[tuple[int, memoryview]] = deque()
+        # (scan_offset, scan_end, future) of the regions being scanned for cut candidates:
+        scans: deque[tuple[int, int, Future]] = deque()
+        # offsets of known cut candidates, all candidates < scanned are known:
+        candidates: deque[int] = deque()
+        scanned = 0
+        read_end = 0
+        eof = False
+        tail = b""  # the last window_size - 1 bytes read, windows starting there end in the next region
+        start = 0  # offset of the next chunk
+        executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="chunker")
+        try:
+            started_chunking = time.monotonic()
+            while True:
+                # read ahead, so that all threads have a region to scan
+                while not eof and len(scans) <= self.threads:
+                    chunk = reader.read(self.region_size)
+                    size = chunk.meta["size"]
+                    if size == 0:
+                        eof = True
+                        break
+                    data = chunk.data if chunk.meta["allocation"] == CH_DATA else bytes(size)
+                    scan = tail + data
+                    scan_offset = read_end - len(tail)
+                    regions.append((read_end, memoryview(scan)[len(tail) :]))
+                    read_end += size
+                    scans.append(
+                        (scan_offset, read_end - window_size + 1, executor.submit(self.chunker.cut_candidates, scan))
+                    )
+                    tail = scan[max(len(scan) - window_size + 1, 0) :]
+                if eof and start == read_end:
+                    break
+                # the last offset a chunk starting at <start> may be cut at
+                end = min(start + max_size, read_end) if eof else start + max_size
+                limit = end - window_size - 1
+                while candidates and candidates[0] < start + min_size:
+                    candidates.popleft()
+                if candidates and candidates[0] <= limit:
+                    end = candidates.popleft()
+                elif not ((candidates or scanned > limit) and read_end >= end):
+                    # we need the cut candidates of the next region to decide
+                    scan_offset, scan_end, future = scans.popleft()
+                    candidates.extend(scan_offset + offset for offset in future.result())
+                    scanned = max(scanned, scan_end)
+                    continue
+                while regions[0][0] + len(regions[0][1]) <= start:
+                    regions.popleft()
+                pieces = [region[max(start - offset, 0) : end - offset] for offset, region in regions if offset < end]
+                chunk_data = pieces[0] if len(pieces) == 1 else b"".join(pieces)
+                size = end - start
+                start = end
+                self._chunking_time += time.monotonic() - started_chunking
+                # we do not have SEEK_DATA/SEEK_HOLE support here,
+                # but we can just check if data was all-zero.
+                if zeros.startswith(chunk_data):
+                    yield Chunk(None, size=size, allocation=CH_ALLOC)
+                else:
+                    yield Chunk(chunk_data, size=size, allocation=CH_DATA)
+                started_chunking = time.monotonic()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -1,4 +1,4 @@
-from typing import NamedTuple, Tuple, Dict, List, Any, Type, BinaryIO, Iterator
+from typing import NamedTuple, Tuple, Dict, List, Any, Type, BinaryIO, Iterator, Union
 
 API_VERSION: str
 
@@ -8,7 +8,7 @@ class _Chunk(NamedTuple):
     data: bytes
     meta: Dict[str, Any]
 
-def Chunk(data: bytes, **meta) -> Type[_Chunk]: ...
+def Chunk(data: Union[bytes, memoryview], **meta) -> Type[_Chunk]: ...
 
 fmap_entry = Tuple[int, int, bool]
 
@@ -19,6 +19,7 @@ from argparse import ArgumentTypeError
 import math
 import random
 from struct import Struct
+import threading
 import zlib
 
 try:
@@ -48,7 +49,19 @@ cdef extern from "zstd.h":
     const char* ZSTD_getErrorName(size_t code) nogil
 
 
-buffer = Buffer(bytearray, size=0)
+class ThreadLocalBuffer(threading.local):
+    """
+    A Buffer per thread: the compressors release the GIL while writing into the buffer,
+    so compression in multiple threads (e.g. borg create --jobs) must not share it.
+    """
+    def __init__(self):
+        self.buffer = Buffer(bytearray, size=0)
+
+    def get(self, size=None, init=False):
+        return self.buffer.get(size, init)
+
+
+buffer = ThreadLocalBuffer()
 
 
 cdef class CompressorBase:
@@ -306,9 +319,7 @@ class LZMA(DecidingCompressor):
 
 class ZSTD(DecidingCompressor):
     """zstd compression / decompression (pypi: zstandard, gh: python-zstandard)"""
-    # This is a NOT THREAD SAFE implementation.
-    # Only ONE python context must be created at a time.
-    # It should work flawlessly as long as borg will call ONLY ONE compression job at time.
+    # The output buffer is per thread (see ThreadLocalBuffer), so multiple threads can compress at the same time.
     ID = 0x03
     name = 'zstd'
 
@@ -356,6 +367,8 @@ class ZSTD(DecidingCompressor):
             raise DecompressionError('zstd get size failed: data was not compressed by zstd')
         if osize == ZSTD_CONTENTSIZE_UNKNOWN:
             raise DecompressionError('zstd get size failed: original size unknown')
+        if "size" in meta and osize != meta["size"]:
+            raise DecompressionError('zstd get size failed: size mismatch')  # do not allocate a bogus size
         try:
             buf = buffer.get(osize)
         except MemoryError:
@@ -40,6 +40,7 @@
 ROBJ_ARCHIVE_CHUNKIDS = "C"  # objects with a list of archive metadata stream chunkids
 ROBJ_ARCHIVE_STREAM = "S"  # archive metadata stream chunk (containing items)
 ROBJ_FILE_STREAM = "F"  # file content stream chunk (containing user data)
+ROBJ_ARCHIVES_INDEX = "I"  # cached index of the archives metadata (see manifest.Archives)
 ROBJ_DONTCARE = "*"  # used to parse without type assertion (= accept any type)
 
 # in borg < 1.3, this has been defined like this:
@@ -82,6 +83,12 @@
 # repo.list() result count limit the borg client uses
 LIST_SCAN_LIMIT = 100000
 
+# default count of threads a local repository uses to list data/ directories in parallel
+LIST_THREADS = 16
+
+# default count of threads a local repository uses for parallel object reads and async writes / deletes
+IO_THREADS = 8
+
 FD_MAX_AGE = 4 * 60  # 4 minutes
 
 # Some bounds on segment / segment_dir indexes
@@ -93,6 +100,7 @@
 # chunker algorithms
 CH_BUZHASH = "buzhash"
 CH_BUZHASH64 = "buzhash64"
+CH_FASTCDC = "fastcdc"
 CH_FIXED = "fixed"
 CH_FAIL = "fail"
 
@@ -2,6 +2,7 @@
 import hmac
 import os
 import textwrap
+import threading
 from hashlib import sha256, pbkdf2_hmac
 from pathlib import Path
 from typing import Literal, ClassVar
@@ -22,6 +23,7 @@
 from ..helpers.passphrase import Passphrase, PasswordRetriesExceeded, PassphraseWrong
 from ..helpers import msgpack
 from ..helpers import workarounds
+from ..helpers.lrucache import LRUCache
 from ..item import Key, EncryptedKey
 from ..manifest import Manifest
 from ..platform import SaveFile
@@ -846,6 +848,11 @@ class AEADKeyBase(KeyBase):
 
     MAX_IV = 2**48 - 1
 
+    # max. count of ciphers (one per sessionid) kept for decrypting existing data, see _get_decrypt_cipher
+    DECRYPT_CIPHERS_MAX = 256
+
+    _decrypt_ciphers = None  # threading.local, .ciphers is a per-thread LRUCache: sessionid -> cipher
+
     def assert_id(self, id, data):
         # Comparing the id hash here would not be needed any more for the new AEAD crypto **IF** we
         # could be sure that chunks were created by normal (not tampered, not evil) borg code:
@@ -881,7 +888,7 @@ def decrypt(self, id, data):
         iv_48bit = data[2:8]
         sessionid = bytes(data[8:32])
         iv = int.from_bytes(iv_48bit, "big")
-        cipher = self._get_cipher(sessionid, iv)
+        cipher = self._get_decrypt_cipher(sessionid, iv)
         try:
             return cipher.decrypt(data, aad=id)
         except IntegrityError as e:
@@ -894,6 +901,7 @@ def init_from_given_data(self, *, crypt_key, id_key, chunk_seed):
         self.crypt_key = crypt_key
         self.id_key = id_key
         self.chunk_seed = chunk_seed
+        self._decrypt_ciphers = None  # session keys depend on crypt_key
 
     def init_from_random_data(self):
         data = os.urandom(100)
@@ -911,8 +919,9 @@ def _get_session_key(self, sessionid, domain=None):
         per cipher suite).
         """
         # Performance note:
-        # While this is only invoked once per session to generate a new key for encrypting new data, it is invoked
-        # frequently (per encrypted repo object) to compute the corresponding key for decrypting existing data.
+        # While this is only invoked once per session to generate a new key for encrypting new data, it would be
+        # invoked frequently (per encrypted repo object) to compute the corresponding key for decrypting existing
+        # data, thus _get_decrypt_cipher caches the ciphers (with their session keys) per sessionid.
         assert len(sessionid) == 24  # 192bit
         if domain is None:
             domain = b"borg-session-key-" + self.CIPHERSUITE.__name__.encode()
@@ -924,10 +933,31 @@ def _get_cipher(self, sessionid, iv):
         cipher = self.CIPHERSUITE(key=key, iv=iv, header_len=1 + 1 + 6 + 24, aad_offset=0)
         return cipher
 
+    def _get_decrypt_cipher(self, sessionid, iv):
+        # all objects written in one borg session share the sessionid, so we usually decrypt many objects
+        # with the same session key. avoid a key derivation and cipher context setup per object by reusing
+        # the cipher for a sessionid, we only need to set the iv from the object header.
+        # note: these ciphers are only used for decryption, self.cipher is used for encryption.
+        # setting the iv and decrypting is not atomic, so every thread needs its own ciphers.
+        local = self._decrypt_ciphers
+        if local is None:
+            local = self._decrypt_ciphers = threading.local()
+        ciphers = getattr(local, "ciphers", None)
+        if ciphers is None:
+            ciphers = local.ciphers = LRUCache(capacity=self.DECRYPT_CIPHERS_MAX)
+        try:
+            cipher = ciphers[sessionid]
+        except KeyError:
+            cipher = ciphers[sessionid] = self._get_cipher(sessionid, iv)
+        else:
+            cipher.set_iv(iv)
+        return cipher
+
     def init_ciphers(self, manifest_data=None, iv=0):
         # in every new session we start with a fresh sessionid and at iv == 0, manifest_data and iv params are ignored
         self.sessionid = os.urandom(24)
         self.cipher = self._get_cipher(self.sessionid, iv=0)
+        self._decrypt_ciphers = None  # key material might have changed (e.g. key loaded)
 
 
 class AESOCBKeyfileKey(ID_HMAC_SHA_256, AEADKeyBase, FlexiKey):
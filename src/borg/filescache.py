@@ -0,0 +1,317 @@
+"""
+A memory-mapped, on-disk files cache table.
+
+The table file has this layout (all integers little-endian):
+
+- header (HEADER_SIZE bytes): magic, generation, slot count, used slot count, heap end, heap garbage
+  and a checksum over all of that.
+- slots (slot count * RECORD_SIZE bytes): a hash table (open addressing, linear probing) of
+  fixed-size records, keyed by path_hash. A record has path_hash, generation, inode, size,
+  ctime_ns, mtime_ns, the offset and count of its chunk list in the heap, a checksum of the
+  chunk list and a checksum of the record itself.
+- heap: chunk lists, each chunk list entry is (id, size).
+
+An all-zero record is an empty slot, a record with generation 0 is a deleted slot.
+
+The generation is incremented each time the table is opened, the age of a record is the
+difference between the current generation and the record's generation.
+
+The table is updated in place, without reading or writing the whole file. Every record and
+every chunk list is protected by a checksum, records or chunk lists failing the check
+(e.g. due to a crash while updating the table) are treated as not existing.
+"""
+
+import mmap
+import struct
+
+from .checksums import xxh64
+from .logger import create_logger
+from .platform import SaveFile
+
+logger = create_logger()
+
+MAGIC = b"BORG_FCT"
+
+HEADER = struct.Struct("<8sQQQQQ")  # magic, generation, slots, used, heap_end, garbage
+HEADER_SIZE = 64  # HEADER + checksum, padded
+
+RECORD = struct.Struct("<32sQQQqqQQ8s")  # path_hash, generation, inode, size, ctime, mtime, offset, count, checksum
+RECORD_SIZE = RECORD.size + 8  # RECORD + checksum
+
+CHUNK = struct.Struct("<32sI")  # id, size
+
+EMPTY = bytes(32)
+
+MIN_SLOTS = 1024
+MAX_LOAD_FACTOR = 0.75
+MIN_HEAP_SIZE = 1024 * 1024
+
+
+class FilesCacheTable:
+    """
+    Files cache table, mapping path_hash -> (age, inode, size, ctime_ns, mtime_ns, chunks).
+
+    Entries older than ttl generations are not returned and their slots are reused.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = str(path)
+        self.ttl = ttl
+        self.created = False
+        self.fd = None
+        self.mm = None
+        # newest ctime/mtime of entries put in this session and the path_hashes having it:
+        self.newest_cmtime = 0
+        self.newest_path_hashes = set()
+        self.recent_path_hashes = {}  # path_hash -> cmtime, for entries put with cmtime >= recent_after
+        self.recent_after = 2**63 - 1
+        try:
+            self._open()
+        except (OSError, ValueError) as exc:
+            logger.debug(f"The files cache table can't be used, creating a new one. [{exc}]")
+            self._close()
+            self._create(MIN_SLOTS, MIN_HEAP_SIZE)
+            self._open()
+            self.created = True
+        self.generation += 1
+        self._write_header()
+
+    def _create(self, slots, heap_size):
+        with SaveFile(self.path, binary=True) as fd:
+            fd.write(self._pack_header(generation=0, slots=slots, used=0, heap_end=0, garbage=0))
+            fd.f.truncate(HEADER_SIZE + slots * RECORD_SIZE + heap_size)  # sparse, all slots empty
+
+    def _open(self):
+        self.fd = open(self.path, "r+b")
+        self.mm = mmap.mmap(self.fd.fileno(), 0)
+        header = self.mm[:HEADER_SIZE]
+        magic, self.generation, self.slots, self.used, self.heap_end, self.garbage = HEADER.unpack_from(header)
+        if magic != MAGIC or header[HEADER.size : HEADER.size + 8] != xxh64(header[: HEADER.size]):
+            raise ValueError("invalid header")
+        if self.slots < MIN_SLOTS or self.slots & (self.slots - 1):
+            raise ValueError("invalid slot count")
+        self.heap_start = HEADER_SIZE + self.slots * RECORD_SIZE
+        if self.heap_start + self.heap_end > len(self.mm):
+            raise ValueError("invalid heap end")
+
+    def _close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+
+    @staticmethod
+    def _pack_header(generation, slots, used, heap_end, garbage):
+        header = HEADER.pack(MAGIC, generation, slots, used, heap_end, garbage)
+        return (header + xxh64(header)).ljust(HEADER_SIZE, b"\0")
+
+    def _write_header(self):
+        self.mm[:HEADER_SIZE] = self._pack_header(self.generation, self.slots, self.used, self.heap_end, self.garbage)
+
+    def _empty(self, slot):
+        offset = HEADER_SIZE + slot * RECORD_SIZE
+        return self.mm[offset : offset + 32] == EMPTY
+
+    def _read_record(self, slot):
+        """return the record in this slot (or None if the slot is empty or the record is corrupted)"""
+        offset = HEADER_SIZE + slot * RECORD_SIZE
+        data = self.mm[offset : offset + RECORD_SIZE]
+        if data[:32] == EMPTY:
+            return None
+        if data[RECORD.size :] != xxh64(data[: RECORD.size]):
+            return None
+        return RECORD.unpack_from(data)
+
+    def _write_record(self, slot, *record):
+        offset = HEADER_SIZE + slot * RECORD_SIZE
+        data = RECORD.pack(*record)
+        self.mm[offset : offset + RECORD_SIZE] = data + xxh64(data)
+
+    def _live(self, record):
+        """is the record valid and not yet expired?"""
+        return record is not None and record[1] != 0 and self.generation - record[1] <= self.ttl
+
+    def _read_chunks(self, record):
+        """return the chunk list of the record (or None if it is corrupted)"""
+        offset, count, checksum = record[6:9]
+        if offset + count * CHUNK.size > self.heap_end:
+            return None
+        start = self.heap_start + offset
+        data = self.mm[start : start + count * CHUNK.size]
+        if xxh64(data) != checksum:
+            return None
+        return data
+
+    def _find(self, path_hash):
+        """
+        find the slot for path_hash.
+
+        :return: (slot, record) - record is the live record for path_hash (or None if there is none),
+                 slot is the slot of that record (or the first free slot if there is none, None if the
+                 table is full).
+        """
+        mask = self.slots - 1
+        slot = int.from_bytes(path_hash[:8], "little") & mask
+        free_slot = None
+        for _ in range(self.slots):
+            record = self._read_record(slot)
+            if record is None and self._empty(slot):
+                # end of the probe sequence, path_hash is not in the table
+                return (slot if free_slot is None else free_slot), None
+            if self._live(record):
+                if record[0] == path_hash:
+                    return slot, record
+            elif free_slot is None:
+                # deleted, expired or corrupted: we can reuse this slot
+                free_slot = slot
+            slot = (slot + 1) & mask
+        return free_slot, None
+
+    def get(self, path_hash):
+        """
+        Return (age, inode, size, ctime_ns, mtime_ns, chunks) for path_hash or None if we do not have it.
+
+        chunks is a list of (id, size) tuples.
+        """
+        slot, record = self._find(path_hash)
+        if record is None:
+            return None
+        data = self._read_chunks(record)
+        if data is None:
+            return None
+        chunks = list(CHUNK.iter_unpack(data))
+        _, generation, inode, size, ctime_ns, mtime_ns = record[:6]
+        return self.generation - generation, inode, size, ctime_ns, mtime_ns, chunks
+
+    def put(self, path_hash, inode, size, ctime_ns, mtime_ns, chunks):
+        """Put an entry for path_hash (age 0), chunks is a list of (id, size) tuples."""
+        assert len(path_hash) == 32 and path_hash != EMPTY
+        data = b"".join(CHUNK.pack(id, size) for id, size in chunks)
+        slot, record = self._find(path_hash)
+        if record is None:
+            if slot is None or (self.used + 1) > self.slots * MAX_LOAD_FACTOR:
+                self._rebuild()
+                slot, record = self._find(path_hash)
+            if self._empty(slot):
+                self.used += 1
+            else:
+                # we reuse the slot of a dead record, its chunk list is garbage now
+                self.garbage += self._chunks_size(slot)
+        if record is not None and self._read_chunks(record) == data:
+            # unchanged chunk list (e.g. for an unchanged file), no need to store it again
+            offset = record[6]
+        else:
+            if record is not None:
+                self.garbage += record[7] * CHUNK.size
+            offset = self._append_chunks(data)
+        count = len(data) // CHUNK.size
+        self._write_record(
+            slot, path_hash, self.generation, inode, size, ctime_ns, mtime_ns, offset, count, xxh64(data)
+        )
+        cmtime = max(ctime_ns, mtime_ns)
+        if cmtime > self.newest_cmtime:
+            self.newest_cmtime = cmtime
+            self.newest_path_hashes = {path_hash}
+        elif cmtime == self.newest_cmtime:
+            self.newest_path_hashes.add(path_hash)
+        if cmtime >= self.recent_after:
+            self.recent_path_hashes[path_hash] = cmtime
+
+    def delete(self, path_hash):
+        slot, record = self._find(path_hash)
+        if record is not None:
+            self.garbage += record[7] * CHUNK.size
+            # generation 0 marks the slot as deleted, the chunk list is accounted as garbage already
+            self._write_record(slot, path_hash, 0, *record[2:6], 0, 0, bytes(8))
+
+    def stat_items(self):
+        """
+        Yield (path_hash, inode, size, mtime_ns, chunks_checksum) for all live entries.
+
+        This does not read the chunk lists, use .get(path_hash) to get the full entry.
+        """
+        for slot in range(self.slots):
+            record = self._read_record(slot)
+            if self._live(record):
+                path_hash, _, inode, size, _, mtime_ns = record[:6]
+                yield path_hash, inode, size, mtime_ns, record[8]
+
+    def _chunks_size(self, slot):
+        # the chunk list size of a dead record (if we can tell)
+        record = self._read_record(slot)
+        return record[7] * CHUNK.size if record is not None else 0
+
+    def _append_chunks(self, data):
+        offset = self.heap_end
+        if self.heap_start + offset + len(data) > len(self.mm):
+            # grow the heap
+            new_size = self.heap_start + max(2 * (len(self.mm) - self.heap_start), offset + len(data))
+            self.mm.close()
+            self.fd.truncate(new_size)
+            self.mm = mmap.mmap(self.fd.fileno(), 0)
+        start = self.heap_start + offset
+        self.mm[start : start + len(data)] = data
+        self.heap_end += len(data)
+        return offset
+
+    def _live_records(self):
+        for slot in range(self.slots):
+            record = self._read_record(slot)
+            if self._live(record):
+                data = self._read_chunks(record)
+                if data is not None:
+                    yield record, data
+
+    def _rebuild(self):
+        """rebuild the table: drop dead records and chunk lists, resize the hash table as needed"""
+        live = sum(1 for _ in self._live_records())
+        slots = MIN_SLOTS
+        while (live + 1) > slots * MAX_LOAD_FACTOR / 2:
+            slots *= 2
+        logger.debug(f"Rebuilding files cache table: {live} live entries, {self.slots} -> {slots} slots.")
+        heap_size = max(MIN_HEAP_SIZE, 2 * (self.heap_end - self.garbage))
+        with SaveFile(self.path, binary=True) as fd:
+            fd.f.truncate(HEADER_SIZE + slots * RECORD_SIZE + heap_size)
+            table = FilesCacheTable.__new__(FilesCacheTable)
+            table.fd = fd.f
+            table.mm = mmap.mmap(fd.fd, 0)
+            table.slots, table.used, table.heap_end, table.garbage = slots, 0, 0, 0
+            table.heap_start = HEADER_SIZE + slots * RECORD_SIZE
+            table.generation, table.ttl = self.generation, self.ttl
+            try:
+                for record, data in self._live_records():
+                    slot, _ = table._find(record[0])
+                    offset = table._append_chunks(data)
+                    table._write_record(slot, *record[:6], offset, *record[7:9])
+                    table.used += 1
+                table._write_header()
+                table.mm.flush()
+                self.used, self.heap_end, self.garbage = table.used, table.heap_end, table.garbage
+            finally:
+                table.mm.close()
+        self._close()
+        self._open()
+
+    def close(self, discard_after):
+        """
+        Close the table, discarding entries put in this session with a ctime/mtime >= discard_after.
+
+        Entries of files with recent timestamps might suffer from race conditions related to
+        filesystem snapshots and ctime/mtime granularity, so we do not want to persist them.
+
+        :return: count of discarded entries
+        """
+        discarded = set()
+        if self.newest_cmtime >= discard_after:
+            discarded |= self.newest_path_hashes
+        discarded |= {path_hash for path_hash, cmtime in self.recent_path_hashes.items() if cmtime >= discard_after}
+        for path_hash in discarded:
+            self.delete(path_hash)
+        if self.heap_end > MIN_HEAP_SIZE and self.garbage > self.heap_end // 2:
+            self._rebuild()
+        self._write_header()
+        self.mm.flush()
+        self._close()
+        return len(discarded)
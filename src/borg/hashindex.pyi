@@ -1,4 +1,4 @@
-from typing import NamedTuple, Tuple, Type, Union, IO, Iterator, Any
+from typing import NamedTuple, Tuple, Type, Union, IO, Iterator, Any, Optional
 
 API_VERSION: str
 
@@ -10,6 +10,12 @@ class ChunkIndexEntry(NamedTuple):
 
 CIE = Union[Tuple[int, int], Type[ChunkIndexEntry]]
 
+class MmapHashTable:
+    capacity: int
+    used: int
+    def __init__(self, path: Union[str, Any], capacity: int = ...) -> None: ...
+    def close(self) -> None: ...
+
 class ChunkIndex:
     F_NONE: int
     F_USED: int
@@ -17,9 +23,21 @@ class ChunkIndex:
     F_NEW: int
     M_USER: int
     M_SYSTEM: int
+    def __init__(
+        self, capacity: int = ..., path: PATH_OR_FILE = ..., usable: int = ..., mmap_dir: Union[str, Any] = ...
+    ) -> None: ...
+    @property
+    def is_mmap(self) -> bool: ...
     def add(self, key: bytes, size: int) -> None: ...
     def iteritems(self, *, only_new: bool = ...) -> Iterator: ...
-    def clear_new(self) -> None: ...
+    def clear_new(self, mask: int = ..., value: Optional[int] = ...) -> None: ...
+    def clear_flags(self, flags: int, mask: int = ..., value: Optional[int] = ...) -> None: ...
+    def count_flags(self, mask: int, value: int = ...) -> int: ...
+    def sum_sizes(self, mask: int = ..., value: int = ...) -> int: ...
+    def extract(self, mask: int, value: int = ..., *, keys_only: bool = ...) -> "ChunkIndex": ...
+    def merge(self, other: "ChunkIndex") -> None: ...
+    def write_keys(self, fd: IO, mask: int = ..., value: int = ...) -> int: ...
+    def merge_serialized(self, data: bytes) -> int: ...
     def __contains__(self, key: bytes) -> bool: ...
     def __getitem__(self, key: bytes) -> Type[ChunkIndexEntry]: ...
     def __setitem__(self, key: bytes, value: CIE) -> None: ...
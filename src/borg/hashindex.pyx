@@ -1,7 +1,13 @@
 from collections.abc import MutableMapping
 from collections import namedtuple
+import io
+import mmap
 import os
 import struct
+import tempfile
+
+from libc.stdint cimport uint8_t, uint32_t
+from libc.string cimport memcmp, memcpy, memset
 
 from borghash import HashTableNT
 
@@ -9,6 +15,10 @@ API_VERSION = '1.2_01'
 
 cdef _NoDefault = object()
 
+# special kv index values of the MmapHashTable's table buckets:
+cdef uint32_t FREE_BUCKET = 0xFFFFFFFF
+cdef uint32_t TOMBSTONE_BUCKET = 0xFFFFFFFE
+
 
 class HTProxyMixin:
     def __setitem__(self, key, value):
@@ -39,6 +49,231 @@ ChunkIndexEntryFormatT = namedtuple('ChunkIndexEntryFormatT', 'flags size')
 ChunkIndexEntryFormat = ChunkIndexEntryFormatT(flags="I", size="I")
 
 
+cdef class MmapHashTable:
+    """
+    A hash table for ChunkIndexEntry values, like borghash's HashTableNT, but memory-mapped.
+
+    It is a table of kv indexes, using linear probing, and append-only keys and values arrays,
+    so kv indexes are stable (see k_to_idx). The arrays are in memory-mapped, anonymous temporary
+    files in directory <path>. Thus, the OS can page them in and out on demand and the table is not limited by the RAM.
+    """
+    cdef object path
+    cdef object table_file, keys_file, values_file
+    cdef object table_mm, keys_mm, values_mm
+    cdef uint8_t[::1] table_view, keys_view, values_view  # keep the buffers exported while we use the pointers
+    cdef uint32_t* table
+    cdef uint8_t* keys
+    cdef uint8_t* values
+    cdef readonly size_t capacity, used
+    cdef size_t initial_capacity, tombstones
+    cdef size_t kv_capacity, kv_used
+    cdef int ksize, vsize
+    cdef object value_struct
+
+    MAX_LOAD_FACTOR = 0.5
+    KV_GROW_FACTOR = 1.3
+
+    def __init__(self, path, capacity=1000):
+        self.path = os.fspath(path)
+        self.ksize = 32
+        self.vsize = 8
+        self.value_struct = struct.Struct("<II")
+        self.initial_capacity = max(capacity, 1000)
+        self.table_file = tempfile.TemporaryFile(prefix="chunkindex.table.", dir=self.path)
+        self.keys_file = tempfile.TemporaryFile(prefix="chunkindex.keys.", dir=self.path)
+        self.values_file = tempfile.TemporaryFile(prefix="chunkindex.values.", dir=self.path)
+        self._init(self.initial_capacity)
+
+    def close(self):
+        """unmap and delete the temporary files"""
+        self._unmap()
+        for f in self.table_file, self.keys_file, self.values_file:
+            if f is not None:
+                f.close()
+        self.table_file = self.keys_file = self.values_file = None
+
+    cdef _unmap(self):
+        self.table_view = self.keys_view = self.values_view = None
+        self.table = NULL
+        self.keys = self.values = NULL
+        for mm in self.table_mm, self.keys_mm, self.values_mm:
+            if mm is not None:
+                mm.close()
+        self.table_mm = self.keys_mm = self.values_mm = None
+
+    cdef _init(self, size_t capacity):
+        self._unmap()
+        self.capacity = capacity
+        self.used = self.tombstones = 0
+        self.kv_capacity = int(capacity * self.MAX_LOAD_FACTOR) + 1
+        self.kv_used = 0
+        for f in self.table_file, self.keys_file, self.values_file:
+            f.truncate(0)  # drop all the old data
+        self._map_table(self.table_file, capacity)
+        self._map_kv()
+
+    cdef _map_table(self, f, size_t capacity):
+        f.truncate(capacity * sizeof(uint32_t))
+        self.table_mm = mmap.mmap(f.fileno(), capacity * sizeof(uint32_t))
+        self.table_view = self.table_mm
+        self.table = <uint32_t*>&self.table_view[0]
+        memset(self.table, 0xff, capacity * sizeof(uint32_t))  # all buckets are FREE_BUCKET
+
+    cdef _map_kv(self):
+        # the files are sparse, new parts are zero-filled
+        self.keys_view = self.values_view = None
+        for mm in self.keys_mm, self.values_mm:
+            if mm is not None:
+                mm.close()
+        self.keys_file.truncate(self.kv_capacity * self.ksize)
+        self.values_file.truncate(self.kv_capacity * self.vsize)
+        self.keys_mm = mmap.mmap(self.keys_file.fileno(), self.kv_capacity * self.ksize)
+        self.values_mm = mmap.mmap(self.values_file.fileno(), self.kv_capacity * self.vsize)
+        self.keys_view = self.keys_mm
+        self.values_view = self.values_mm
+        self.keys = &self.keys_view[0]
+        self.values = &self.values_view[0]
+
+    cdef int _lookup_index(self, const uint8_t* key, size_t* index_ptr):
+        """find the bucket of key: return 1 if found, else 0 and the bucket where key can be inserted"""
+        cdef uint32_t key32 = (key[0] << 24) | (key[1] << 16) | (key[2] << 8) | key[3]
+        cdef size_t index = key32 % self.capacity
+        cdef size_t free_index = self.capacity
+        cdef uint32_t kv_index
+        while (kv_index := self.table[index]) != FREE_BUCKET:
+            if kv_index == TOMBSTONE_BUCKET:
+                if free_index == self.capacity:
+                    free_index = index
+            elif memcmp(self.keys + kv_index * self.ksize, key, self.ksize) == 0:
+                index_ptr[0] = index
+                return 1
+            index = (index + 1) % self.capacity
+        index_ptr[0] = index if free_index == self.capacity else free_index
+        return 0
+
+    cdef _resize_table(self, size_t capacity):
+        """rehash all items into a new table with <capacity> buckets, this also drops all tombstones"""
+        cdef size_t i, index
+        cdef uint32_t kv_index
+        old_file, old_mm, old_view = self.table_file, self.table_mm, self.table_view
+        cdef uint32_t* old_table = self.table
+        cdef size_t old_capacity = self.capacity
+        self.table_file = tempfile.TemporaryFile(prefix="chunkindex.table.", dir=self.path)
+        self._map_table(self.table_file, capacity)
+        self.capacity = capacity
+        self.tombstones = 0
+        for i in range(old_capacity):
+            kv_index = old_table[i]
+            if kv_index != FREE_BUCKET and kv_index != TOMBSTONE_BUCKET:
+                self._lookup_index(self.keys + kv_index * self.ksize, &index)
+                self.table[index] = kv_index
+        old_view = None
+        old_mm.close()
+        old_file.close()
+
+    cdef uint32_t _insert(self, const uint8_t* key, const uint8_t* value) except? 0xFFFFFFFF:
+        """insert a new key (not in the table yet), return its kv index"""
+        cdef size_t index
+        cdef uint32_t kv_index
+        if self.used + self.tombstones + 1 > self.capacity * self.MAX_LOAD_FACTOR:
+            self._resize_table(self.capacity * 2 if self.used + 1 > self.capacity * self.MAX_LOAD_FACTOR / 2
+                               else self.capacity)
+        if self.kv_used >= self.kv_capacity:
+            self.kv_capacity = int(self.kv_capacity * self.KV_GROW_FACTOR) + 1
+            if self.kv_capacity >= TOMBSTONE_BUCKET:
+                raise RuntimeError("MmapHashTable is full.")
+            self._map_kv()
+        self._lookup_index(key, &index)
+        if self.table[index] == TOMBSTONE_BUCKET:
+            self.tombstones -= 1
+        kv_index = self.kv_used
+        self.kv_used += 1
+        memcpy(self.keys + kv_index * self.ksize, key, self.ksize)
+        memcpy(self.values + kv_index * self.vsize, value, self.vsize)
+        self.table[index] = kv_index
+        self.used += 1
+        return kv_index
+
+    cdef uint8_t* _value_ptr(self, key) except NULL:
+        """return a pointer to the value of key, raise KeyError if not found"""
+        cdef size_t index
+        if len(key) != self.ksize:
+            raise ValueError("Key size does not match the defined size")
+        if not self._lookup_index(<const uint8_t*><bytes>key, &index):
+            raise KeyError("Key not found")
+        return self.values + self.table[index] * self.vsize
+
+    def __getitem__(self, key):
+        cdef uint8_t* value = self._value_ptr(key)
+        return ChunkIndexEntry(*self.value_struct.unpack((<char*>value)[:self.vsize]))
+
+    def __setitem__(self, key, value):
+        cdef size_t index
+        if len(key) != self.ksize:
+            raise ValueError("Key size does not match the defined size")
+        cdef bytes value_bytes = self.value_struct.pack(*value)
+        if self._lookup_index(<const uint8_t*><bytes>key, &index):
+            memcpy(self.values + self.table[index] * self.vsize, <const uint8_t*>value_bytes, self.vsize)
+        else:
+            self._insert(<const uint8_t*><bytes>key, <const uint8_t*>value_bytes)
+
+    def __delitem__(self, key):
+        cdef size_t index
+        if len(key) != self.ksize:
+            raise ValueError("Key size does not match the defined size")
+        if not self._lookup_index(<const uint8_t*><bytes>key, &index):
+            raise KeyError("Key not found")
+        self.table[index] = TOMBSTONE_BUCKET
+        self.used -= 1
+        self.tombstones += 1
+
+    def __contains__(self, key):
+        cdef size_t index
+        return len(key) == self.ksize and self._lookup_index(<const uint8_t*><bytes>key, &index) == 1
+
+    def __len__(self):
+        return self.used
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        cdef size_t i
+        cdef uint32_t kv_index
+        for i in range(self.capacity):
+            kv_index = self.table[i]
+            if kv_index != FREE_BUCKET and kv_index != TOMBSTONE_BUCKET:
+                key = (<char*>self.keys)[kv_index * self.ksize:(kv_index + 1) * self.ksize]
+                value = (<char*>self.values)[kv_index * self.vsize:(kv_index + 1) * self.vsize]
+                yield key, ChunkIndexEntry(*self.value_struct.unpack(value))
+
+    def clear(self):
+        self._init(self.initial_capacity)
+
+    def k_to_idx(self, key):
+        cdef size_t index
+        if len(key) != self.ksize:
+            raise ValueError("Key size does not match the defined size")
+        if not self._lookup_index(<const uint8_t*><bytes>key, &index):
+            raise KeyError("Key not found")
+        return self.table[index]
+
+    def idx_to_k(self, idx):
+        cdef uint32_t kv_index = <uint32_t>idx
+        return (<char*>self.keys)[kv_index * self.ksize:(kv_index + 1) * self.ksize]
+
+    def size(self):
+        return self.used * (self.ksize + self.vsize) + 4096  # like HashTableNT.size: serialized size estimate
+
+    @property
+    def stats(self):
+        return {"capacity": self.capacity, "used": self.used, "tombstones": self.tombstones,
+                "kv_capacity": self.kv_capacity, "kv_used": self.kv_used}
+
+
 class ChunkIndex(HTProxyMixin, MutableMapping):
     """
     Mapping from key256 to (flags32, size32) to track chunks in the repository.
@@ -53,14 +288,28 @@ class ChunkIndex(HTProxyMixin, MutableMapping):
     # system flags (internal use, always 0 to user, not changeable by user):
     F_NEW = 2 ** 24  # a new chunk that is not present in repo/cache/chunks.* yet.
 
-    def __init__(self, capacity=1000, path=None, usable=None):
+    def __init__(self, capacity=1000, path=None, usable=None, mmap_dir=None):
+        """
+        create a new ChunkIndex or read it from path.
+
+        if mmap_dir is given, the new ChunkIndex is a MmapHashTable with its files in that directory,
+        otherwise it is a borghash HashTableNT in memory.
+        """
         if path:
             self.ht = HashTableNT.read(path)
         else:
             if usable is not None:
-                capacity = usable * 2  # load factor 0.5
-            self.ht = HashTableNT(key_size=32, value_type=ChunkIndexEntry, value_format=ChunkIndexEntryFormat,
-                                  capacity=capacity)
+                # load factor 0.5, but a table with capacity 0 could not grow, so use some minimum capacity.
+                capacity = max(usable * 2, 1000)
+            if mmap_dir is not None:
+                self.ht = MmapHashTable(mmap_dir, capacity=capacity)
+            else:
+                self.ht = HashTableNT(key_size=32, value_type=ChunkIndexEntry, value_format=ChunkIndexEntryFormat,
+                                      capacity=capacity)
+
+    @property
+    def is_mmap(self):
+        return type(self.ht) is MmapHashTable
 
     def hide_system_flags(self, value):
         user_flags = value.flags & self.M_USER
@@ -104,19 +353,106 @@ class ChunkIndex(HTProxyMixin, MutableMapping):
         user_flags = value.flags & self.M_USER
         self.ht[key] = value._replace(flags=system_flags | user_flags)
 
-    def clear_new(self):
-        """clear F_NEW flag of all items"""
-        for key, value in self.ht.items():
-            if value.flags & self.F_NEW:
-                flags = value.flags & ~self.F_NEW
-                self.ht[key] = value._replace(flags=flags)
+    def clear_new(self, mask=F_NONE, value=None):
+        """clear F_NEW flag of the items matching mask / value (default: all items)"""
+        self.clear_flags(self.F_NEW, mask, value)
+
+    # Bulk operations, using only the mapping API of the hash table (borghash's HashTableNT or MmapHashTable).
+    # mask / value: an item matches if (flags & mask) == value, value defaults to mask.
+    # Note: these work on self.ht, so they can also match or change system flags.
+
+    def clear_flags(self, flags, mask=F_NONE, value=None):
+        """clear the flags of the items matching mask / value (default: all items)"""
+        value = mask if value is None else value
+        for key, entry in self.ht.items():
+            if entry.flags & mask == value:
+                # like with a dict, updating existing keys while iterating is fine (no items are added or removed).
+                self.ht[key] = entry._replace(flags=entry.flags & ~flags)
+
+    def count_flags(self, mask, value=None):
+        """return the count of items matching mask / value"""
+        return self._count(mask, mask if value is None else value)[0]
+
+    def sum_sizes(self, mask=F_NONE, value=None):
+        """return the sum of the sizes of the items matching mask / value (default: all items)"""
+        return self._count(mask, mask if value is None else value)[1]
+
+    def _count(self, mask, value):
+        count = size_sum = 0
+        for key, entry in self.ht.items():
+            if entry.flags & mask == value:
+                count += 1
+                size_sum += entry.size
+        return count, size_sum
+
+    def extract(self, mask, value=None, *, keys_only=False):
+        """
+        return a new ChunkIndex (in memory) with the items matching mask / value.
+
+        with keys_only=True, the values of the new items are (F_NONE, 0).
+        """
+        value = mask if value is None else value
+        extracted = ChunkIndex(usable=self.count_flags(mask, value))
+        empty_entry = ChunkIndexEntry(flags=self.F_NONE, size=0)
+        for key, entry in self.ht.items():
+            if entry.flags & mask == value:
+                extracted.ht[key] = empty_entry if keys_only else entry
+        return extracted
+
+    def merge(self, other):
+        """
+        merge the items of other ChunkIndex into this one.
+
+        this is the same as: for key, value in other.items(): self[key] = value
+        """
+        assert other is not self
+        self._merge_ht(other.ht)
+
+    def _merge_ht(self, other_ht):
+        for key, other_entry in other_ht.items():
+            flags = other_entry.flags & self.M_USER
+            entry = self.ht.get(key)
+            if entry is not None:
+                # keep the system flags (including F_NEW, if set), update user flags and size
+                self.ht[key] = ChunkIndexEntry(flags=(entry.flags & self.M_SYSTEM) | flags, size=other_entry.size)
+            else:
+                self.ht[key] = ChunkIndexEntry(flags=self.F_NEW | flags, size=other_entry.size)
+
+    def write_keys(self, fd, mask=F_NONE, value=None):
+        """
+        write the keys of the items matching mask / value to file-like fd, return their count.
+
+        this is the same as extract(mask, value, keys_only=True).write(fd).
+        """
+        extracted = self.extract(mask, value, keys_only=True)
+        extracted.write(fd)
+        return len(extracted)
+
+    def merge_serialized(self, data):
+        """
+        merge the items of a serialized ChunkIndex (as produced by write or write_keys) into this one.
+
+        this is the same as merge(ChunkIndex.read(io.BytesIO(data))), return the count of merged items.
+
+        raises ValueError if data is not a valid serialized ChunkIndex.
+        """
+        with io.BytesIO(data) as fd:
+            other_ht = HashTableNT.read(fd)
+            if fd.read(1):
+                raise ValueError("Invalid data, size does not match.")
+        self._merge_ht(other_ht)
+        return len(other_ht)
 
     @classmethod
     def read(cls, path):
         return cls(path=path)
 
     def write(self, path):
-        self.ht.write(path)
+        if self.is_mmap:
+            # MmapHashTable has no serialization of its own, write it in the format of borghash's HashTableNT.
+            self.extract(self.F_NONE).write(path)
+        else:
+            self.ht.write(path)
 
     def size(self):
         return self.ht.size()
@@ -1,3 +1,4 @@
+import copy
 import errno
 import hashlib
 import os
@@ -7,6 +8,8 @@
 import subprocess
 import sys
 import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import platformdirs
@@ -407,6 +410,74 @@ def scandir_inorder(*, path, fd=None):
     return sorted(os.scandir(arg), key=scandir_keyfunc)
 
 
+def fetch_dir(path, *, match=None, exclude_caches=False, exclude_if_present=None):
+    """
+    Open directory *path*, return (st, entries): the stat result of the directory and a list of
+    (name, st) tuples of its entries (in scandir_inorder order, st is the lstat result or None on errors).
+
+    Entries are only stat-ed if *match(entry_path)* is true (if given). If the directory is tagged
+    (see dir_is_tagged), it is not listed and entries is None.
+    """
+    fd = os.open(path, flags_dir)
+    try:
+        st = os.fstat(fd)
+        if dir_is_tagged(path, exclude_caches, exclude_if_present, dir_fd=fd):
+            return st, None
+        entries = []
+        for dirent in scandir_inorder(path=path, fd=fd):
+            entry_st = None  # the traversal will stat again and deal with errors or excluded entries
+            if match is None or match(os.path.normpath(os.path.join(path, dirent.name))):
+                try:
+                    entry_st = os.stat(dirent.name, dir_fd=fd, follow_symlinks=False)
+                except OSError:
+                    pass
+            entries.append((dirent.name, entry_st))
+        return st, entries
+    finally:
+        os.close(fd)
+
+
+class DirPrefetcher:
+    """
+    Prefetch directory listings and the stat results of the directory entries using a thread pool.
+
+    The depth-first directory traversal of borg create waits for each scandir and stat syscall,
+    which is slow if their latency is high (e.g. on network filesystems). While the traversal
+    processes the entries of a directory, the next subdirectories get fetched by fetch_dir.
+    The traversal order does not change, it only uses the prefetched results.
+
+    Entries excluded by *matcher* are not stat-ed and tagged directories are not listed (see
+    fetch_dir), like the traversal does. As PatternMatcher.match is not thread-safe, each thread
+    uses its own copy of the matcher.
+    """
+
+    def __init__(self, threads, window=64, *, matcher=None, exclude_caches=False, exclude_if_present=None):
+        self.window = window  # count of directory entries to look ahead for subdirectories to prefetch
+        self.matcher = matcher
+        self.exclude_caches = exclude_caches
+        self.exclude_if_present = exclude_if_present
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="borg-prefetch")
+
+    def prefetch(self, path):
+        """start fetching directory *path*, return a future for the result of fetch_dir"""
+        return self._executor.submit(self._fetch, path)
+
+    def _fetch(self, path):
+        match = None
+        if self.matcher is not None:
+            matcher = getattr(self._local, "matcher", None)
+            if matcher is None:
+                matcher = self._local.matcher = copy.deepcopy(self.matcher)
+            match = matcher.match
+        return fetch_dir(
+            path, match=match, exclude_caches=self.exclude_caches, exclude_if_present=self.exclude_if_present
+        )
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+
 def secure_erase(path, *, avoid_collateral_damage):
     """Attempt to erase a file securely by writing random data over it before deleting it.
 
@@ -203,6 +203,22 @@ def ChunkerParams(s):
             )
         # note that for buzhash64, there is no problem with even window_size.
         return CH_BUZHASH64, chunk_min, chunk_max, chunk_mask, window_size
+    if algo == CH_FASTCDC and count == 4:  # fastcdc, chunk_min, chunk_max, chunk_mask
+        chunk_min, chunk_max, chunk_mask = (int(p) for p in params[1:])
+        if not (chunk_min <= chunk_mask <= chunk_max):
+            raise argparse.ArgumentTypeError("required: chunk_min <= chunk_mask <= chunk_max")
+        if chunk_min < 6:
+            # see comment in 'fixed' algo check, also the gear hash window is 64B.
+            raise argparse.ArgumentTypeError(
+                "min. chunk size exponent must not be less than 6 (2^6 = 64B min. chunk size)"
+            )
+        if chunk_max > 23:
+            raise argparse.ArgumentTypeError(
+                "max. chunk size exponent must not be more than 23 (2^23 = 8MiB max. chunk size)"
+            )
+        if chunk_min == chunk_max:
+            raise argparse.ArgumentTypeError("required: chunk_min < chunk_max")
+        return CH_FASTCDC, chunk_min, chunk_max, chunk_mask
     # this must stay last as it deals with old-style compat mode (no algorithm, 4 params, buzhash):
     if algo == CH_BUZHASH and count == 5 or count == 4:  # [buzhash, ]chunk_min, chunk_max, chunk_mask, window_size
         chunk_min, chunk_max, chunk_mask, window_size = (int(p) for p in params[count - 4 :])
@@ -224,8 +240,8 @@ def ChunkerParams(s):
 
 
 def FilesCacheMode(s):
-    ENTRIES_MAP = dict(ctime="c", mtime="m", size="s", inode="i", rechunk="r", disabled="d")
-    VALID_MODES = ("cis", "ims", "cs", "ms", "cr", "mr", "d", "s")  # letters in alpha order
+    ENTRIES_MAP = dict(ctime="c", mtime="m", size="s", inode="i", moved="v", rechunk="r", disabled="d")
+    VALID_MODES = ("cis", "ims", "cisv", "imsv", "cs", "ms", "cr", "mr", "d", "s")  # letters in alpha order
     entries = set(s.strip().split(","))
     if not entries <= set(ENTRIES_MAP):
         raise argparse.ArgumentTypeError(
@@ -351,6 +367,12 @@ def format_file_size(v, precision=2, sign=False, iec=False):
     return fn(v, suffix="B", sep=" ", precision=precision, sign=sign)
 
 
+def format_io_rate(nbytes, nobjs, elapsed, iec=False):
+    """Format the throughput of <nbytes> in <nobjs> objects during <elapsed> seconds"""
+    elapsed = max(elapsed, 1e-6)
+    return f"{format_file_size(nbytes / elapsed, precision=1, iec=iec)}/s, {nobjs / elapsed:.0f} objects/s"
+
+
 class FileSize(int):
     def __new__(cls, value, iec=False):
         obj = int.__new__(cls, value)
@@ -4,20 +4,26 @@
 from datetime import datetime, timedelta, timezone
 from operator import attrgetter
 from collections.abc import Sequence
+from pathlib import Path
 
 from borgstore.store import ObjectNotFound, ItemInfo
+from borgstore.backends.errors import PermissionDenied as StorePermissionDenied
 
 from .logger import create_logger
 
 logger = create_logger()
 
 from .constants import *  # NOQA
+from .crypto.low_level import IntegrityError as IntegrityErrorBase
+from .helpers import msgpack
 from .helpers.datastruct import StableDict
+from .helpers.fs import get_cache_dir
 from .helpers.parseformat import bin_to_hex, hex_to_bin
 from .helpers.time import parse_timestamp, calculate_relative_offset, archive_ts_now
 from .helpers.errors import Error, CommandError
 from .item import ArchiveItem
 from .patterns import get_regex_from_pattern
+from .platform import SaveFile
 from .repoobj import RepoObj
 
 
@@ -76,8 +82,18 @@ class Archives:
     We still need to support the borg 1.x manifest-with-list-of-archives,
     so borg transfer can work.
     borg2 has separate items archives/* in the borgstore.
+
+    To avoid fetching all archive metadata items from the repo for each listing, we keep an archives index
+    (archive id -> archive metadata). The index objects are stored like other repo objects (encrypted and
+    authenticated) and are referenced by cache/archives.<index_id> entries. Index objects read from the repo
+    are also copied to the local cache directory. As the archive metadata never changes for an archive id,
+    index objects can simply be merged. If the index lacks an archive of the archives/ directory, its metadata
+    is fetched from the repo and added.
     """
 
+    INDEX_PREFIX = "archives."  # cache/archives.<index_id> references the index object
+    INDEX_VERSION = 1
+
     def __init__(self, repository, manifest):
         from .repository import Repository
         from .remote import RemoteRepository
@@ -87,6 +103,9 @@ def __init__(self, repository, manifest):
         # key: str archive name, value: dict('id': bytes_id, 'time': str_iso_ts)
         self._archives = {}
         self.manifest = manifest
+        self._index = None  # archives index: id -> archive metadata (see _get_archive_meta), None: not loaded
+        self._index_ids = []  # ids of the index objects found in the repo (merged into _index)
+        self._index_new = {}  # entries added by us and not stored yet
 
     def prepare(self, manifest, m):
         if not self.legacy:
@@ -96,6 +115,9 @@ def prepare(self, manifest, m):
 
     def finish(self, manifest):
         if not self.legacy:
+            if self._index_new or (self._index is not None and len(self._index_ids) > 1):
+                # archives index is incomplete or consists of multiple objects, store an updated one.
+                self._store_index()
             manifest_archives = {}
         else:
             manifest_archives = StableDict(self._get_raw_dict())
@@ -139,27 +161,206 @@ def _get_archive_meta(self, id: bytes) -> dict:
             archive_item = ArchiveItem(internal_dict=archive_dict)
             if archive_item.version not in (1, 2):  # legacy: still need to read v1 archives
                 raise Exception("Unknown archive metadata version")
-            # callers expect a dict with dict["key"] access, not ArchiveItem.key access.
-            # also, we need to put the id in there.
-            metadata = dict(
-                id=id,
-                name=archive_item.name,
-                time=archive_item.time,
-                # new:
-                exists=True,  # repo has a valid archive item
-                username=archive_item.username,
-                hostname=archive_item.hostname,
-                size=archive_item.get("size", 0),
-                nfiles=archive_item.get("nfiles", 0),
-                comment=archive_item.comment,  # not always present?
-                tags=tuple(sorted(getattr(archive_item, "tags", []))),  # must be hashable
-            )
+            metadata = self._archive_item_meta(id, archive_item)
         return metadata
 
+    @staticmethod
+    def _archive_item_meta(id: bytes, archive_item: ArchiveItem) -> dict:
+        # callers expect a dict with dict["key"] access, not ArchiveItem.key access.
+        # also, we need to put the id in there.
+        return dict(
+            id=id,
+            name=archive_item.name,
+            time=archive_item.time,
+            # new:
+            exists=True,  # repo has a valid archive item
+            username=archive_item.username,
+            hostname=archive_item.hostname,
+            size=archive_item.get("size", 0),
+            nfiles=archive_item.get("nfiles", 0),
+            comment=archive_item.comment,  # not always present?
+            tags=tuple(sorted(getattr(archive_item, "tags", []))),  # must be hashable
+        )
+
+    def index_ids(self):
+        """return the ids of the archives index objects (see cache/archives.<index_id>)"""
+        ids = []
+        for info in self.repository.store_list("cache"):
+            info = ItemInfo(*info)  # RPC does not give namedtuple
+            if info.name.startswith(self.INDEX_PREFIX):
+                try:
+                    ids.append(hex_to_bin(info.name.removeprefix(self.INDEX_PREFIX), length=32))
+                except ValueError:
+                    pass
+        return sorted(ids)
+
+    def _local_index_dir(self):
+        # we only use the local cache directory if it already exists. it must be created by
+        # the Cache (which does the security checks for a never seen before repository).
+        path = Path(get_cache_dir(create=False)) / self.repository.id_str
+        return path if path.is_dir() else None
+
+    def _read_index(self, id, local_dir):
+        """read the archives index object <id> (locally cached or from the repo), return its entries or None"""
+        from .repository import Repository
+
+        local_path = local_dir / (self.INDEX_PREFIX + bin_to_hex(id)) if local_dir is not None else None
+        try:
+            cdata = local_path.read_bytes() if local_path is not None else None
+        except OSError:
+            cdata = None
+        is_local = cdata is not None
+        if cdata is None:
+            try:
+                cdata = self.repository.get(id)
+            except Repository.ObjectNotFound:
+                return None
+        try:
+            # parsing decrypts, authenticates and checks that the data matches the id.
+            _, data = self.manifest.repo_objs.parse(id, cdata, ro_type=ROBJ_ARCHIVES_INDEX)
+            index = msgpack.unpackb(data)
+            if index["version"] != self.INDEX_VERSION:
+                return None
+        except (IntegrityErrorBase, msgpack.UnpackException, ValueError, KeyError, AssertionError) as err:
+            logger.debug(f"archives index {bin_to_hex(id)} is invalid: {err!r}")
+            return None
+        if not is_local and local_dir is not None:
+            with SaveFile(local_path, binary=True) as fd:
+                fd.write(cdata)
+        entries = {}
+        for archive_id, (name, time, username, hostname, size, nfiles, comment, tags) in index["archives"].items():
+            entries[archive_id] = dict(
+                id=archive_id,
+                name=name,
+                time=time,
+                exists=True,
+                username=username,
+                hostname=hostname,
+                size=size,
+                nfiles=nfiles,
+                comment=comment,
+                tags=tuple(tags),
+            )
+        return entries
+
+    def _load_index(self):
+        """merge all archives index objects from the repository into self._index"""
+        if self._index is not None:
+            return
+        self._index = {}
+        self._index_ids = self.index_ids()
+        local_dir = self._local_index_dir()
+        for id in self._index_ids:
+            entries = self._read_index(id, local_dir)
+            if entries is not None:
+                self._index.update(entries)
+        self._index.update(self._index_new)
+        if local_dir is not None:
+            # remove local copies of index objects that are gone from the repo.
+            wanted = {self.INDEX_PREFIX + bin_to_hex(id) for id in self._index_ids}
+            for path in local_dir.glob(self.INDEX_PREFIX + "*"):
+                if path.name not in wanted:
+                    path.unlink(missing_ok=True)
+
+    def _store_index(self):
+        """store the archives index into the repository"""
+        from .repository import Repository
+        from .remote import RemoteRepository
+
+        if self._index is not None:
+            # we know the complete index: store it (without entries for archives that are gone)
+            # and replace all the index objects we have merged.
+            existing = set(self.ids()) | set(self.ids(deleted=True))
+            entries = {id: meta for id, meta in self._index.items() if id in existing}
+            replaced_ids = self._index_ids
+        else:
+            # incremental: only store the new entries, all index objects get merged when loading.
+            entries = self._index_new
+            replaced_ids = []
+        index = dict(
+            version=self.INDEX_VERSION,
+            archives={
+                id: (
+                    meta["name"],
+                    meta["time"],
+                    meta["username"],
+                    meta["hostname"],
+                    meta["size"],
+                    meta["nfiles"],
+                    meta["comment"],
+                    list(meta["tags"]),
+                )
+                for id, meta in entries.items()
+            },
+        )
+        data = msgpack.packb(index)
+        index_id = self.manifest.repo_objs.id_hash(data) if entries else None
+        try:
+            if index_id is not None:
+                # the index object itself is stored into data/, so it has the same access permissions as the
+                # archive metadata. it is not in the chunks index, so we must delete replaced index objects.
+                cdata = self.manifest.repo_objs.format(index_id, {}, data, ro_type=ROBJ_ARCHIVES_INDEX)
+                self.repository.put(index_id, cdata)
+                self.repository.store_store(f"cache/{self.INDEX_PREFIX}{bin_to_hex(index_id)}", b"")
+            for id in set(replaced_ids) - {index_id}:
+                try:
+                    self.repository.store_delete(f"cache/{self.INDEX_PREFIX}{bin_to_hex(id)}")
+                except (Repository.ObjectNotFound, ObjectNotFound):
+                    pass
+                try:
+                    self.repository.delete(id)
+                except Repository.ObjectNotFound:
+                    pass
+        except (StorePermissionDenied, RemoteRepository.RPCError) as err:
+            # the index is just a cache, we can live without storing it, e.g. in a read-only repository.
+            if isinstance(err, RemoteRepository.RPCError) and err.exception_class != "PermissionDenied":
+                raise
+            logger.debug("could not store the archives index into the repository (permission denied).")
+            return
+        if self._index is not None:
+            self._index_ids = [index_id] if index_id is not None else []
+        self._index_new = {}
+
+    def update_index(self):
+        """store an up-to-date archives index, return the ids of the archives index objects"""
+        assert not self.legacy
+        # make sure that the index has all archives (also the soft-deleted ones):
+        for _ in self._infos(deleted=False):
+            pass
+        for _ in self._infos(deleted=True):
+            pass
+        self._store_index()
+        return list(self._index_ids)
+
+    def _add_to_index(self, meta):
+        if meta["exists"]:  # do not remember archives without metadata, maybe they get repaired later.
+            self._index_new[meta["id"]] = meta
+            if self._index is not None:
+                self._index[meta["id"]] = meta
+
+    def _lookup_archive_meta(self, id):
+        # get the archive metadata from the index (if we have loaded it) or from the repo.
+        meta = self._index.get(id) if self._index is not None else None
+        return meta if meta is not None else self._get_archive_meta(id)
+
     def _infos(self, *, deleted=False):
         # yield the infos of all archives
-        for id in self.ids(deleted=deleted):
-            yield self._get_archive_meta(id)
+        if self.legacy:
+            for id in self.ids(deleted=deleted):
+                yield self._get_archive_meta(id)
+            return
+        ids = list(self.ids(deleted=deleted))
+        self._load_index()
+        infos = []
+        for id in ids:
+            meta = self._index.get(id)
+            if meta is None:
+                meta = self._get_archive_meta(id)
+                self._add_to_index(meta)
+            infos.append(meta)
+        # note: read-only commands must not write to the repository, the completed archives index
+        # gets stored by finish() when a command writes the manifest.
+        yield from infos
 
     def _info_tuples(self, *, deleted=False):
         for info in self._infos(deleted=deleted):
@@ -293,7 +494,7 @@ def get_by_id(self, id, raw=False, *, deleted=False):
             if id in self.ids(deleted=deleted):  # check directory
                 # looks like this archive id is in the archives directory, thus it is NOT deleted.
                 # OR we have explicitly requested a soft-deleted archive via deleted=True.
-                archive_info = self._get_archive_meta(id)
+                archive_info = self._lookup_archive_meta(id) if not self.legacy else self._get_archive_meta(id)
                 if archive_info["exists"]:  # True means we have found Archive metadata in the repo.
                     if not raw:
                         ts = parse_timestamp(archive_info["time"])
@@ -318,7 +519,8 @@ def get_by_id(self, id, raw=False, *, deleted=False):
             else:
                 return dict(name=name, id=values["id"], time=values["time"])
 
-    def create(self, name, id, ts, *, overwrite=False):
+    def create(self, name, id, ts, *, overwrite=False, metadata=None):
+        # metadata: the ArchiveItem, if given, the archive is also added to the archives index.
         assert isinstance(name, str)
         assert isinstance(id, bytes)
         if isinstance(ts, datetime):
@@ -327,11 +529,17 @@ def create(self, name, id, ts, *, overwrite=False):
         if not self.legacy:
             # we only create a directory entry, its name points to the archive item:
             self.repository.store_store(f"archives/{bin_to_hex(id)}", b"")
+            if metadata is not None:
+                # the archives index gets stored by finish (when the manifest is written).
+                self._add_to_index(self._archive_item_meta(id, metadata))
         else:
             if self.exists(name) and not overwrite:
                 raise KeyError("archive already exists")
             self._archives[name] = {"id": id, "time": ts}
 
+    # note: the archives index does not need updating for soft-deleting / undeleting, it
+    # has entries for all archives and the archives/ directory is listed with deleted=True/False.
+
     def delete_by_id(self, id):
         # soft-delete an archive
         assert isinstance(id, bytes)
@@ -349,6 +557,8 @@ def nuke_by_id(self, id):
         assert isinstance(id, bytes)
         assert not self.legacy
         self.repository.store_delete(f"archives/{bin_to_hex(id)}", deleted=True)
+        # the entry gets removed from the archives index when storing it the next time.
+        self._index_new.pop(id, None)
 
     def list(
         self,
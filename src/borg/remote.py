@@ -19,7 +19,7 @@
 
 import borg.logger
 from . import __version__
-from .compress import Compressor
+from .compress import Compressor, ZSTD
 from .constants import *  # NOQA
 from .helpers import Error, ErrorWithTraceback, IntegrityError
 from .helpers import bin_to_hex
@@ -44,8 +44,29 @@
 
 BORG_VERSION = parse_version(__version__)
 MSGID, MSG, ARGS, RESULT, LOG = "i", "m", "a", "r", "l"
-
-MAX_INFLIGHT = 100
+FRAME, FRAME_SIZE = "z", "s"  # a compressed frame of messages and its uncompressed size, see RPCCompression
+
+BATCH_RPC_VERSION = 1  # version of the get_batch / put_batch / delete_batch RPCs, see RepositoryServer.batch
+BATCH_RPC_METHODS = ("get_batch", "put_batch", "delete_batch")
+BATCH_MAX_CALLS = 100  # max. count of calls in a batch message
+BATCH_MAX_BYTES = 4 * 1024 * 1024  # max. put data in a batch message, max. get results in a batch response message
+
+RPC_COMPRESSION_VERSION = 1  # version of the compressed message frames, see RPCCompression
+RPC_COMPRESSION_LEVEL = 3
+RPC_COMPRESSION_MIN_SIZE = 4096  # smaller messages are not worth compressing
+RPC_COMPRESSION_MAX_SIZE = 3 * max(BUFSIZE, MAX_OBJECT_SIZE)  # bigger messages are not compressed (and not accepted)
+# methods with repo objects (already compressed and encrypted) in their requests / responses:
+RPC_PAYLOAD_METHODS = ("get", "put", "get_batch", "put_batch", "get_manifest", "put_manifest")
+
+# calls of these methods are spread over all connections by object id (see RemoteRepository.connection_for):
+RPC_SPREAD_METHODS = ("get", "put", "delete")
+# calls of these methods do not need the async puts / deletes via other connections to be done:
+RPC_UNSYNCED_METHODS = RPC_SPREAD_METHODS + ("has_many", "async_response")
+
+INFLIGHT_INITIAL = 100  # initial window of in-flight requests, adapted at runtime (see InflightWindow)
+INFLIGHT_MIN = 4
+INFLIGHT_MAX = 2000
+INFLIGHT_MAX_BYTES = 64 * 1024 * 1024  # requests and (estimated) responses in flight
 
 RATELIMIT_PERIOD = 0.1
 
@@ -115,6 +136,87 @@ class ConnectionBrokenWithHint(Error):
 # to be added.
 # When parameters are removed, they need to be preserved as defaulted parameters on the client stubs so that older
 # servers still get compatible input.
+#
+# The batch RPCs (get_batch, put_batch, delete_batch) have no api stubs, the client only uses them (internally, in
+# call_many) if the server announced a batch_rpc_version in its negotiate response.
+#
+# Compressed message frames (see RPCCompression) are only sent by the server if the client asked for them in its
+# negotiate call, and only by the client if the server announced an rpc_compression version in its response.
+#
+# With --remote-connections N, the client talks to N borg serve processes. The first connection holds the repository
+# lock and is used for all calls except get / put / delete, which are spread over all connections by object id.
+# Before other calls, the client uses async_response calls to wait until the async puts / deletes it sent via the
+# other connections are done (on the server, only calls via the same connection wait for them).
+
+
+class RPCCompression:
+    """
+    zstd compression of RPC messages.
+
+    A compressed message is sent as a {FRAME: zstd data, FRAME_SIZE: size} message, the zstd data is
+    one or more msgpacked messages of that size. Messages with repo objects (see RPC_PAYLOAD_METHODS),
+    which are compressed and encrypted already, and small or big messages are sent uncompressed.
+    If the messages of a method do not compress well (e.g. listings of random chunk IDs), the next
+    SKIP messages of that method are sent uncompressed without trying.
+
+    Received frames are only accepted if accept is set, i.e. if we asked the peer for them (client)
+    or the peer asked for them (server), and only up to RPC_COMPRESSION_MAX_SIZE, so that a peer can
+    not make us allocate huge amounts of memory with a tiny frame.
+    """
+
+    SKIP = 16
+    MIN_SAVINGS = 0.1
+
+    def __init__(self, kind, level=RPC_COMPRESSION_LEVEL):
+        self.kind = kind  # for get_limited_unpacker
+        self.enabled = False  # compress messages we send
+        self.accept = False  # accept compressed frames we receive
+        self.compressor = ZSTD(level=level)
+        self.skip = {}  # method -> count of messages we send uncompressed before trying again
+        self.size = self.compressed_size = 0  # sum of message sizes before / after compression
+
+    def compress(self, method, msg):
+        """return the msgpacked message msg (a request or response of method), compressed if worthwhile"""
+        if not self.enabled or method in RPC_PAYLOAD_METHODS:
+            return msg
+        if not RPC_COMPRESSION_MIN_SIZE <= len(msg) <= RPC_COMPRESSION_MAX_SIZE:
+            return msg
+        if self.skip.get(method, 0) > 0:
+            self.skip[method] -= 1
+            return msg
+        meta, data = self.compressor.compress({}, msg)
+        if meta["ctype"] != ZSTD.ID:
+            self.skip[method] = self.SKIP
+            return msg
+        if len(data) > len(msg) * (1 - self.MIN_SAVINGS):
+            self.skip[method] = self.SKIP
+        self.size += len(msg)
+        self.compressed_size += len(data)
+        return msgpack.packb({FRAME: data, FRAME_SIZE: len(msg)})
+
+    def unframe(self, unpacked):
+        """return the messages in unpacked (a single message or a frame)"""
+        if not isinstance(unpacked, dict) or FRAME not in unpacked:
+            return [unpacked]
+        size = unpacked.get(FRAME_SIZE)
+        if not self.accept:
+            self.invalid_frame("compressed frame received, but compression was not negotiated")
+        if not isinstance(size, int) or not 0 <= size <= RPC_COMPRESSION_MAX_SIZE:
+            self.invalid_frame(f"invalid compressed frame size: {size!r}")
+        # ZSTD.decompress checks the size declared in the zstd frame header against meta["size"] before allocating.
+        _, data = self.compressor.decompress({"ctype": ZSTD.ID, "clevel": 255, "size": size}, unpacked[FRAME])
+        unpacker = get_limited_unpacker(self.kind)
+        unpacker.feed(data)
+        return list(unpacker)
+
+    def invalid_frame(self, reason):
+        if self.kind == "server":
+            raise UnexpectedRPCDataFormatFromClient(__version__)
+        raise UnexpectedRPCDataFormatFromServer(reason.encode())
+
+    def summary(self):
+        ratio = 100.0 * self.compressed_size / self.size if self.size else 100.0
+        return f"{format_file_size(self.size)} compressed to {format_file_size(self.compressed_size)} ({ratio:.1f}%)"
 
 
 class RepositoryServer:  # pragma: no cover
@@ -150,7 +252,10 @@ class RepositoryServer:  # pragma: no cover
         "open",
         "close",
         "info",
+        "list_prefix",
+        "has_many",
         "put",
+        "async_response",
         "save_key",
         "load_key",
         "break_lock",
@@ -162,7 +267,7 @@ class RepositoryServer:  # pragma: no cover
         "store_store",
         "store_delete",
         "store_move",
-    )
+    ) + BATCH_RPC_METHODS
 
     def __init__(self, restrict_to_paths, restrict_to_repositories, use_socket, permissions=None):
         self.repository = None
@@ -188,7 +293,83 @@ def filter_args(self, f, kwargs):
         known = set(inspect.signature(f).parameters)
         return {name: kwargs[name] for name in kwargs if name in known}
 
+    def exception_response(self, e):
+        """return the response for exception e (call this while handling e)"""
+        # These exceptions are reconstructed on the client end in RemoteRepository.call_many(),
+        # and will be handled just like locally raised exceptions. Suppress the remote traceback
+        # for these, except ErrorWithTraceback, which should always display a traceback.
+        reconstructed_exceptions = (
+            Repository.InvalidRepository,
+            Repository.InvalidRepositoryConfig,
+            Repository.DoesNotExist,
+            Repository.AlreadyExists,
+            Repository.PathAlreadyExists,
+            PathNotAllowed,
+            Repository.InsufficientFreeSpaceError,
+        )
+        # logger.exception(e)
+        ex_short = traceback.format_exception_only(e.__class__, e)
+        ex_full = traceback.format_exception(*sys.exc_info())
+        ex_trace = True
+        if isinstance(e, Error):
+            ex_short = [e.get_message()]
+            ex_trace = e.traceback
+        if not isinstance(e, reconstructed_exceptions):
+            logging.debug("\n".join(ex_full))
+
+        response = {
+            "exception_class": e.__class__.__name__,
+            "exception_args": e.args,
+            "exception_full": ex_full,
+            "exception_short": ex_short,
+            "exception_trace": ex_trace,
+            "sysinfo": sysinfo(),
+        }
+        try:
+            msgpack.packb(e.args)
+        except (TypeError, msgpack.PackException):
+            response["exception_args"] = [x if isinstance(x, (str, bytes, int)) else None for x in e.args]
+        return response
+
+    def batch(self, msgid, method, calls):
+        """
+        process a batch of calls of the repository method, send their results
+
+        The response(s) have a list of per-call results as result: {RESULT: result} or the exception
+        response of a failed call. The results are sent in multiple responses (in call order) if they
+        are bigger than BATCH_MAX_BYTES.
+        """
+        f = getattr(self.repository, method)
+        results, size = [], 0
+        for args in calls:
+            try:
+                res = f(**self.filter_args(f, args))
+            except Exception as e:
+                results.append(self.exception_response(e))
+            else:
+                results.append({RESULT: res})
+                size += len(res) if isinstance(res, bytes) else 0
+            if size >= BATCH_MAX_BYTES:
+                self.send(f"{method}_batch", msgpack.packb({MSGID: msgid, RESULT: results}))
+                results, size = [], 0
+        if results or not calls:
+            self.send(f"{method}_batch", msgpack.packb({MSGID: msgid, RESULT: results}))
+
+    def unframe(self, frame):
+        """return the messages in frame (see RPCCompression.unframe)"""
+        try:
+            return self.compression.unframe(frame)
+        except UnexpectedRPCDataFormatFromClient:
+            if self.repository is not None:
+                self.repository.close()
+            raise
+
+    def send(self, method, msg):
+        """send the msgpacked message msg (a response of method)"""
+        os.write(self.stdout_fd, self.compression.compress(method, msg))
+
     def send_queued_log(self):
+        msgs = []
         while True:
             try:
                 # lr_dict contents see BorgQueueHandler
@@ -196,8 +377,9 @@ def send_queued_log(self):
             except queue.Empty:
                 break
             else:
-                msg = msgpack.packb({LOG: lr_dict})
-                os.write(self.stdout_fd, msg)
+                msgs.append(msgpack.packb({LOG: lr_dict}))
+        if msgs:
+            self.send(LOG, b"".join(msgs))
 
     def serve(self):
         def inner_serve():
@@ -207,6 +389,7 @@ def inner_serve():
             assert os.get_blocking(self.stdout_fd)
 
             unpacker = get_limited_unpacker("server")
+            self.compression = RPCCompression("server")
             shutdown_serve = False
             while True:
                 # before processing any new RPCs, send out all pending log output
@@ -225,7 +408,7 @@ def inner_serve():
                         shutdown_serve = True
                         continue
                     unpacker.feed(data)
-                    for unpacked in unpacker:
+                    for unpacked in (msg for frame in unpacker for msg in self.unframe(frame)):
                         if isinstance(unpacked, dict):
                             msgid = unpacked[MSGID]
                             method = unpacked[MSG]
@@ -238,6 +421,9 @@ def inner_serve():
                             # logger.debug(f"{type(self)} method: {type(self.repository)}.{method}")
                             if method not in self.rpc_methods:
                                 raise InvalidRPCMethod(method)
+                            if method in BATCH_RPC_METHODS:
+                                self.batch(msgid, method.removesuffix("_batch"), **args)
+                                continue
                             try:
                                 f = getattr(self, method)
                             except AttributeError:
@@ -245,58 +431,9 @@ def inner_serve():
                             args = self.filter_args(f, args)
                             res = f(**args)
                         except BaseException as e:
-                            # These exceptions are reconstructed on the client end in RemoteRepository.call_many(),
-                            # and will be handled just like locally raised exceptions. Suppress the remote traceback
-                            # for these, except ErrorWithTraceback, which should always display a traceback.
-                            reconstructed_exceptions = (
-                                Repository.InvalidRepository,
-                                Repository.InvalidRepositoryConfig,
-                                Repository.DoesNotExist,
-                                Repository.AlreadyExists,
-                                Repository.PathAlreadyExists,
-                                PathNotAllowed,
-                                Repository.InsufficientFreeSpaceError,
-                            )
-                            # logger.exception(e)
-                            ex_short = traceback.format_exception_only(e.__class__, e)
-                            ex_full = traceback.format_exception(*sys.exc_info())
-                            ex_trace = True
-                            if isinstance(e, Error):
-                                ex_short = [e.get_message()]
-                                ex_trace = e.traceback
-                            if not isinstance(e, reconstructed_exceptions):
-                                logging.debug("\n".join(ex_full))
-
-                            sys_info = sysinfo()
-                            try:
-                                msg = msgpack.packb(
-                                    {
-                                        MSGID: msgid,
-                                        "exception_class": e.__class__.__name__,
-                                        "exception_args": e.args,
-                                        "exception_full": ex_full,
-                                        "exception_short": ex_short,
-                                        "exception_trace": ex_trace,
-                                        "sysinfo": sys_info,
-                                    }
-                                )
-                            except TypeError:
-                                msg = msgpack.packb(
-                                    {
-                                        MSGID: msgid,
-                                        "exception_class": e.__class__.__name__,
-                                        "exception_args": [
-                                            x if isinstance(x, (str, bytes, int)) else None for x in e.args
-                                        ],
-                                        "exception_full": ex_full,
-                                        "exception_short": ex_short,
-                                        "exception_trace": ex_trace,
-                                        "sysinfo": sys_info,
-                                    }
-                                )
-                            os.write(self.stdout_fd, msg)
+                            self.send(method, msgpack.packb({MSGID: msgid, **self.exception_response(e)}))
                         else:
-                            os.write(self.stdout_fd, msgpack.packb({MSGID: msgid, RESULT: res}))
+                            self.send(method, msgpack.packb({MSGID: msgid, RESULT: res}))
                 if es:
                     shutdown_serve = True
                     continue
@@ -340,11 +477,17 @@ def inner_serve():
     def negotiate(self, client_data):
         if isinstance(client_data, dict):
             self.client_version = client_data["client_version"]
+            # the client wants compressed frames (and can decompress them):
+            self.compression.enabled = self.compression.accept = client_data.get("rpc_compression", 0) >= 1
         else:
             self.client_version = BORG_VERSION  # seems to be newer than current version (no known old format)
 
         # not a known old format, send newest negotiate this version knows
-        return {"server_version": BORG_VERSION}
+        return {
+            "server_version": BORG_VERSION,
+            "batch_rpc_version": BATCH_RPC_VERSION,
+            "rpc_compression": RPC_COMPRESSION_VERSION,
+        }
 
     def _resolve_path(self, path):
         if isinstance(path, bytes):
@@ -352,7 +495,17 @@ def _resolve_path(self, path):
         path = os.path.realpath(path)
         return path
 
-    def open(self, path, create=False, lock_wait=None, lock=True, exclusive=None, v1_or_v2=False):
+    def open(
+        self,
+        path,
+        create=False,
+        lock_wait=None,
+        lock=True,
+        exclusive=None,
+        v1_or_v2=False,
+        max_read_rate=0,
+        max_ops_rate=0,
+    ):
         self.RepoCls = LegacyRepository if v1_or_v2 else Repository
         self.rpc_methods = self._legacy_rpc_methods if v1_or_v2 else self._rpc_methods
         logging.debug("Resolving repository path %r", path)
@@ -379,6 +532,8 @@ def open(self, path, create=False, lock_wait=None, lock=True, exclusive=None, v1
         kwargs = dict(lock_wait=lock_wait, lock=lock, exclusive=exclusive, send_log_cb=self.send_queued_log)
         if not v1_or_v2:
             kwargs["permissions"] = self.permissions
+            kwargs["max_read_rate"] = max_read_rate * 1024  # kiB/s -> B/s
+            kwargs["max_ops_rate"] = max_ops_rate
         self.repository = self.RepoCls(path, create, **kwargs)
         self.repository.__enter__()  # clean exit handled by serve() method
         return self.repository.id
@@ -444,6 +599,108 @@ def write(self, fd, to_send):
         return written
 
 
+class InflightWindow:
+    """
+    Adaptive window of in-flight RPC requests, bounded by request count and outstanding bytes.
+
+    Similar to TCP Vegas, we compare the measured round trip time (RTT) of the requests with the
+    minimum (base) RTT: in_flight * (1 - base_rtt / rtt) is the count of requests queued up at the
+    server or in the buffers along the way instead of being "on the wire". If only a few requests
+    are queued, more requests in flight fill the pipe better, so the window grows. If many requests
+    are queued, more requests in flight only add latency and memory usage, so the window shrinks.
+    Initially, the window grows by one per response (doubling per RTT, "slow start").
+
+    The outstanding bytes are the sizes of the requests in flight plus the estimated sizes of their
+    responses (the average response size seen so far), so big objects do not balloon memory usage.
+    """
+
+    ALPHA = 2  # grow the window if less requests are queued
+    BETA = 8  # shrink the window if more requests are queued
+    HISTORY_INTERVAL = 1.0  # seconds between window history samples
+    HISTORY_SIZE = 3600
+
+    def __init__(
+        self, initial=INFLIGHT_INITIAL, minimum=INFLIGHT_MIN, maximum=INFLIGHT_MAX, max_bytes=INFLIGHT_MAX_BYTES
+    ):
+        self.window = float(initial)
+        self.minimum, self.maximum, self.max_bytes = minimum, maximum, max_bytes
+        self.slow_start = True
+        self.inflight = {}  # msgid -> (send time, request size, requests in flight at send time)
+        self.limited = False  # did the window limit us since we were idle?
+        self.inflight_bytes = 0  # sum of request sizes in flight
+        self.base_rtt = None  # minimum RTT seen
+        self.rtt = None  # smoothed RTT
+        self.responses = 0
+        self.response_bytes = 0
+        self.window_min = self.window_max = initial
+        self.started = time.monotonic()
+        self.history = [(0.0, initial)]  # (seconds since start, window)
+
+    def __len__(self):
+        return len(self.inflight)
+
+    @property
+    def outstanding_bytes(self):
+        response_size = self.response_bytes // self.responses if self.responses else 0
+        return self.inflight_bytes + len(self.inflight) * response_size
+
+    def can_send(self):
+        """may we send another request?"""
+        if not self.inflight:
+            return True  # always allow one request, even if it is huge
+        if len(self.inflight) >= int(self.window):
+            self.limited = True
+            return False
+        return self.outstanding_bytes < self.max_bytes
+
+    def sent(self, msgid, size):
+        """a request with this msgid and size was queued for sending"""
+        self.inflight[msgid] = (time.monotonic(), size, len(self.inflight) + 1)
+        self.inflight_bytes += size
+
+    def received(self, msgid, size):
+        """a response with this msgid and size was received"""
+        try:
+            sent, request_size, in_flight = self.inflight.pop(msgid)
+        except KeyError:
+            return
+        now = time.monotonic()
+        self.inflight_bytes -= request_size
+        self.responses += 1
+        self.response_bytes += size
+        rtt = max(now - sent, 1e-6)
+        self.base_rtt = rtt if self.base_rtt is None else min(self.base_rtt, rtt)
+        self.rtt = rtt if self.rtt is None else 0.875 * self.rtt + 0.125 * rtt
+        queued = in_flight * (1 - self.base_rtt / self.rtt)
+        if queued > self.BETA:
+            if self.slow_start:
+                self.slow_start = False
+                logger.debug(f"RPC in-flight window: slow start ended at {int(self.window)} requests.")
+            self.window -= 1 / self.window
+        elif queued < self.ALPHA and self.limited:
+            # only grow the window if it limits us (and not if we just have less requests to send).
+            self.window += 1 if self.slow_start else 1 / self.window
+        if not self.inflight:
+            self.limited = False
+        self.window = min(max(self.window, self.minimum), self.maximum)
+        window = int(self.window)
+        self.window_min, self.window_max = min(self.window_min, window), max(self.window_max, window)
+        if now - self.started >= self.history[-1][0] + self.HISTORY_INTERVAL and window != self.history[-1][1]:
+            self.history.append((now - self.started, window))
+            del self.history[: -self.HISTORY_SIZE]
+
+    def summary(self):
+        rtt = "n/a" if self.rtt is None else f"{self.rtt * 1000:.1f} ms"
+        base_rtt = "n/a" if self.base_rtt is None else f"{self.base_rtt * 1000:.1f} ms"
+        return (
+            f"{int(self.window)} requests (min {self.window_min}, max {self.window_max}), "
+            f"RTT {rtt} (base {base_rtt}), {self.responses} responses"
+        )
+
+    def history_str(self):
+        return " ".join(f"{t:.0f}s:{window}" for t, window in self.history)
+
+
 def api(*, since, **kwargs_decorator):
     """Check version requirements and use self.call to do the remote method call.
 
@@ -506,6 +763,50 @@ def do_rpc(self, *args, **kwargs):
     return decorator
 
 
+class RemoteConnection:
+    """
+    A connection to a borg serve process, with the state of its message stream.
+
+    The requests / responses are tracked by msgid in RemoteRepository, msgids are unique over all connections.
+    """
+
+    def __init__(self):
+        self.p = self.sock = None
+        self.stdin_fd = self.stdout_fd = self.stderr_fd = None
+        self.r_fds = self.x_fds = []
+        self.stderr_received = b""  # incomplete stderr line bytes received (no \n yet)
+        self.to_send = EfficientCollectionQueue(1024 * 1024, bytes)
+        self.unpacker = get_limited_unpacker("client")
+        self.compression = RPCCompression("client")
+        self.window = InflightWindow()
+        self.preload_ids = []
+        self.async_batch = []  # async put / delete calls not sent yet
+        self.async_batch_cmd = None
+        self.async_batch_bytes = 0
+        self.dirty = False  # async puts / deletes were sent since the last async_response call
+
+    def set_non_blocking(self):
+        for fd in self.stdin_fd, self.stdout_fd, self.stderr_fd:
+            if fd is not None:
+                os.set_blocking(fd, False)
+                assert not os.get_blocking(fd)
+
+    def close(self):
+        if self.p:
+            self.p.stdin.close()
+            self.p.stdout.close()
+            self.p.wait()
+            self.p = None
+        if self.sock:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError as e:
+                if e.errno != errno.ENOTCONN:
+                    raise
+            self.sock.close()
+            self.sock = None
+
+
 class RemoteRepository:
     extra_test_args = []  # type: ignore
 
@@ -548,88 +849,69 @@ def required_version(self):
 
     def __init__(self, location, create=False, exclusive=False, lock_wait=1.0, lock=True, args=None):
         self.location = self._location = location
-        self.preload_ids = []
         self.msgid = 0
         self.rx_bytes = 0
         self.tx_bytes = 0
-        self.to_send = EfficientCollectionQueue(1024 * 1024, bytes)
-        self.stdin_fd = self.stdout_fd = self.stderr_fd = None
-        self.stderr_received = b""  # incomplete stderr line bytes received (no \n yet)
         self.chunkid_to_msgids = {}
         self.ignore_responses = set()
         self.responses = {}
         self.async_responses = {}
         self.shutdown_time = None
+        self.batch_rpc_version = 0  # we update this after server sends its version
+        self.batches = {}  # batch msgid -> [msgids of the calls in the batch without response yet, response size]
         self.ratelimit = SleepingBandwidthLimiter(args.upload_ratelimit * 1024 if args and args.upload_ratelimit else 0)
         self.upload_buffer_size_limit = args.upload_buffer * 1024 * 1024 if args and args.upload_buffer else 0
-        self.unpacker = get_limited_unpacker("client")
         self.server_version = None  # we update this after server sends its version
-        self.p = self.sock = None
+        self.connections = []  # the first connection holds the lock, see RPC_SPREAD_METHODS for the others
+        self.fd_connections = {}  # fd -> connection
+        self.r_fds = []
+        self.x_fds = []
         self._args = args
-        if self.location.proto == "ssh":
-            testing = location.host == "__testsuite__"
-            # when testing, we invoke and talk to a borg process directly (no ssh).
-            # when not testing, we invoke the system-installed ssh binary to talk to a remote borg.
-            env = prepare_subprocess_env(system=not testing)
-            borg_cmd = self.borg_cmd(args, testing)
-            if not testing:
-                borg_cmd = self.ssh_cmd(location) + borg_cmd
-            logger.debug("SSH command line: %s", borg_cmd)
-            # we do not want the ssh getting killed by Ctrl-C/SIGINT because it is needed for clean shutdown of borg.
-            self.p = Popen(
-                borg_cmd, bufsize=0, stdin=PIPE, stdout=PIPE, stderr=PIPE, env=env, preexec_fn=ignore_sigint
-            )  # nosec B603
-            self.stdin_fd = self.p.stdin.fileno()
-            self.stdout_fd = self.p.stdout.fileno()
-            self.stderr_fd = self.p.stderr.fileno()
-            self.r_fds = [self.stdout_fd, self.stderr_fd]
-            self.x_fds = [self.stdin_fd, self.stdout_fd, self.stderr_fd]
-        elif self.location.proto == "socket":
-            if args.use_socket is False or args.use_socket is True:  # nothing or --socket
-                socket_path = get_socket_filename()
-            else:  # --socket=/some/path
-                socket_path = args.use_socket
-            self.sock = socket.socket(family=socket.AF_UNIX, type=socket.SOCK_STREAM)
-            try:
-                self.sock.connect(socket_path)  # note: socket_path length is rather limited.
-            except FileNotFoundError:
-                self.sock = None
-                raise Error(f"The socket file {socket_path} does not exist.")
-            except ConnectionRefusedError:
-                self.sock = None
-                raise Error(f"There is no borg serve running for the socket file {socket_path}.")
-            self.stdin_fd = self.sock.makefile("wb").fileno()
-            self.stdout_fd = self.sock.makefile("rb").fileno()
-            self.stderr_fd = None
-            self.r_fds = [self.stdout_fd]
-            self.x_fds = [self.stdin_fd, self.stdout_fd]
-        else:
-            raise Error(f"Unsupported protocol {location.proto}")
-
-        os.set_blocking(self.stdin_fd, False)
-        assert not os.get_blocking(self.stdin_fd)
-        os.set_blocking(self.stdout_fd, False)
-        assert not os.get_blocking(self.stdout_fd)
-        if self.stderr_fd is not None:
-            os.set_blocking(self.stderr_fd, False)
-            assert not os.get_blocking(self.stderr_fd)
+        remote_connections = getattr(args, "remote_connections", None) or 1
+        if remote_connections > 1 and self.location.proto != "ssh":
+            logger.warning("--remote-connections is only supported for ssh:// repositories, using 1 connection.")
+            remote_connections = 1
+        self._connect()
 
         try:
             try:
-                version = self.call("negotiate", {"client_data": {"client_version": BORG_VERSION}})
+                client_data = {"client_version": BORG_VERSION}
+                rpc_compression = os.environ.get("BORG_RPC_COMPRESSION", "none")
+                if rpc_compression not in ("none", "zstd"):
+                    raise Error(f"Invalid BORG_RPC_COMPRESSION: {rpc_compression!r} (use none or zstd).")
+                if rpc_compression == "zstd":
+                    client_data["rpc_compression"] = RPC_COMPRESSION_VERSION
+                    # the server only sends compressed frames if we ask for them
+                    self.connections[0].compression.accept = True
+                version = self.call("negotiate", {"client_data": client_data})
             except ConnectionClosed:
                 raise ConnectionClosedWithHint("Is borg working on the server?") from None
             if isinstance(version, dict):
                 self.server_version = version["server_version"]
+                self.batch_rpc_version = min(version.get("batch_rpc_version", 0), BATCH_RPC_VERSION)
+                self._enable_compression(self.connections[0], client_data, version)
             else:
                 raise Exception("Server insisted on using unsupported protocol version %s" % version)
 
-            self.id = self.open(
-                path=self.location.path, create=create, lock_wait=lock_wait, lock=lock, exclusive=exclusive
+            open_args = dict(
+                path=self.location.path,
+                create=create,
+                lock_wait=lock_wait,
+                lock=lock,
+                exclusive=exclusive,
+                max_read_rate=getattr(args, "max_read_rate", None) or 0,
+                max_ops_rate=getattr(args, "max_ops_rate", None) or 0,
             )
+            self.id = self.open(**open_args)
             info = self.info()
             self.version = info["version"]
 
+            if remote_connections > 1:
+                if self.server_version < parse_version("2.0.0b19"):
+                    raise self.RPCServerOutdated("--remote-connections", format_version(parse_version("2.0.0b19")))
+                # the other connections do not lock, they just access the repository locked via the first one.
+                open_args.update(create=False, lock=False, exclusive=False, v1_or_v2=False)
+                self._open_connections(remote_connections - 1, client_data, open_args)
         except Exception:
             self.close()
             raise
@@ -637,7 +919,7 @@ def __init__(self, location, create=False, exclusive=False, lock_wait=1.0, lock=
     def __del__(self):
         if len(self.responses):
             logging.debug("still %d cached responses left in RemoteRepository" % (len(self.responses),))
-        if self.p or self.sock:
+        if self.connections:
             self.close()
             assert False, "cleanup happened in RemoteRepository.__del__"
 
@@ -659,8 +941,27 @@ def __exit__(self, exc_type, exc_val, exc_tb):
                 format_file_size(self.rx_bytes),
                 self.msgid,
             )
+            for i, conn in enumerate(self.connections):
+                logger.debug("RemoteRepository: connection %d: in-flight window: %s", i, conn.window.summary())
+                logger.debug(
+                    "RemoteRepository: connection %d: in-flight window history: %s", i, conn.window.history_str()
+                )
+                if conn.compression.enabled:
+                    logger.debug("RemoteRepository: connection %d: rpc compression: %s", i, conn.compression.summary())
             self.close()
 
+    def rpc_window_summary(self):
+        """return a summary of the in-flight window of each connection"""
+        if len(self.connections) == 1:
+            return self.connections[0].window.summary()
+        return "; ".join(f"connection {i}: {conn.window.summary()}" for i, conn in enumerate(self.connections))
+
+    def rpc_window_history(self):
+        """return the in-flight window history of each connection"""
+        if len(self.connections) == 1:
+            return self.connections[0].window.history_str()
+        return "; ".join(f"connection {i}: {conn.window.history_str()}" for i, conn in enumerate(self.connections))
+
     @property
     def id_str(self):
         return bin_to_hex(self.id)
@@ -720,22 +1021,181 @@ def ssh_cmd(self, location):
             args.append("%s" % location.host)
         return args
 
-    def call(self, cmd, args, **kw):
-        for resp in self.call_many(cmd, [args], **kw):
+    def _connect(self):
+        """start a borg serve process (or connect to its socket), add the connection"""
+        conn = RemoteConnection()
+        if self.location.proto == "ssh":
+            testing = self.location.host == "__testsuite__"
+            # when testing, we invoke and talk to a borg process directly (no ssh).
+            # when not testing, we invoke the system-installed ssh binary to talk to a remote borg.
+            env = prepare_subprocess_env(system=not testing)
+            borg_cmd = self.borg_cmd(self._args, testing)
+            if not testing:
+                borg_cmd = self.ssh_cmd(self.location) + borg_cmd
+            logger.debug("SSH command line: %s", borg_cmd)
+            # we do not want the ssh getting killed by Ctrl-C/SIGINT because it is needed for clean shutdown of borg.
+            conn.p = Popen(
+                borg_cmd, bufsize=0, stdin=PIPE, stdout=PIPE, stderr=PIPE, env=env, preexec_fn=ignore_sigint
+            )  # nosec B603
+            conn.stdin_fd = conn.p.stdin.fileno()
+            conn.stdout_fd = conn.p.stdout.fileno()
+            conn.stderr_fd = conn.p.stderr.fileno()
+            conn.r_fds = [conn.stdout_fd, conn.stderr_fd]
+            conn.x_fds = [conn.stdin_fd, conn.stdout_fd, conn.stderr_fd]
+        elif self.location.proto == "socket":
+            args = self._args
+            if args.use_socket is False or args.use_socket is True:  # nothing or --socket
+                socket_path = get_socket_filename()
+            else:  # --socket=/some/path
+                socket_path = args.use_socket
+            sock = socket.socket(family=socket.AF_UNIX, type=socket.SOCK_STREAM)
+            try:
+                sock.connect(socket_path)  # note: socket_path length is rather limited.
+            except FileNotFoundError:
+                raise Error(f"The socket file {socket_path} does not exist.")
+            except ConnectionRefusedError:
+                raise Error(f"There is no borg serve running for the socket file {socket_path}.")
+            conn.sock = sock
+            conn.stdin_fd = conn.sock.makefile("wb").fileno()
+            conn.stdout_fd = conn.sock.makefile("rb").fileno()
+            conn.stderr_fd = None
+            conn.r_fds = [conn.stdout_fd]
+            conn.x_fds = [conn.stdin_fd, conn.stdout_fd]
+        else:
+            raise Error(f"Unsupported protocol {self.location.proto}")
+        conn.set_non_blocking()
+        self.connections.append(conn)
+        self.r_fds += conn.r_fds
+        self.x_fds += conn.x_fds
+        for fd in conn.x_fds:
+            self.fd_connections[fd] = conn
+        return conn
+
+    def _enable_compression(self, conn, client_data, version):
+        conn.compression.enabled = "rpc_compression" in client_data and version.get("rpc_compression", 0) >= 1
+
+    def _open_connections(self, count, client_data, open_args):
+        """add count connections, negotiate and open the repository (in parallel)"""
+        connections = [self._connect() for _ in range(count)]
+        for conn in connections:
+            conn.compression.accept = "rpc_compression" in client_data
+        versions = self.call_many("negotiate", [{"client_data": client_data}] * count, connections=connections)
+        for conn, version in zip(connections, versions):
+            self._enable_compression(conn, client_data, version)
+        for _ in self.call_many("open", [open_args] * count, connections=connections):
+            pass
+        logger.debug("RemoteRepository: using %d connections.", len(self.connections))
+
+    def connection_for(self, id):
+        """return the connection for calls regarding the object with this id (see RPC_SPREAD_METHODS)"""
+        return self.connections[int.from_bytes(id[:4], "little") % len(self.connections)]
+
+    def sync_connections(self):
+        """wait until the async puts / deletes sent via the other connections are done"""
+        dirty = [conn for conn in self.connections[1:] if conn.dirty]
+        if dirty:
+            for conn in dirty:
+                conn.dirty = False
+            # an exception of a failed async operation is raised here.
+            for _ in self._call_many("async_response", [{"wait": True}] * len(dirty), connections=dirty):
+                pass
+
+    def call(self, cmd, args, connection=None, **kw):
+        for resp in self.call_many(cmd, [args], connections=connection and [connection], **kw):
             return resp
 
-    def call_many(self, cmd, calls, wait=True, is_preloaded=False, async_wait=True):
+    def call_many(self, cmd, calls, wait=True, is_preloaded=False, async_wait=True, connections=None):
+        """
+        call cmd for all calls, yield the results (in the order of the calls).
+
+        The calls are sent via the given connections (one per call) or, if not given, via the connection for
+        the object id (get, put, delete) or via the first connection (all other methods).
+        """
         if not calls and cmd != "async_responses":
             return
 
+        if self.batch_rpc_version and not wait and cmd in ("put", "delete") and connections is None:
+            # collect async puts / deletes, so we can send them in batch messages.
+            full = []
+            for args in calls:
+                conn = self.connection_for(args["id"])
+                if conn.async_batch_cmd != cmd:
+                    self.flush_async_batch(conn)
+                    conn.async_batch_cmd = cmd
+                conn.async_batch.append(args)
+                conn.async_batch_bytes += len(args.get("data", b""))
+                if len(conn.async_batch) >= BATCH_MAX_CALLS or conn.async_batch_bytes >= BATCH_MAX_BYTES:
+                    full.append(conn)
+            if not full:
+                return
+            calls, connections = [], []
+            for conn in dict.fromkeys(full):
+                calls += conn.async_batch
+                connections += [conn] * len(conn.async_batch)
+                conn.async_batch, conn.async_batch_cmd, conn.async_batch_bytes = [], None, 0
+        elif cmd != "async_responses" or async_wait:
+            # the collected async calls must be sent before other calls and before we wait for their responses.
+            # has_many does not need them (see Repository.has_many), we rather keep on collecting.
+            if cmd != "has_many":
+                self.flush_async_batch()
+            if cmd not in RPC_UNSYNCED_METHODS and connections is None:
+                self.sync_connections()
+
+        yield from self._call_many(
+            cmd, calls, wait=wait, is_preloaded=is_preloaded, async_wait=async_wait, connections=connections
+        )
+
+    def flush_async_batch(self, connection=None):
+        """send the collected async puts / deletes (of this connection or of all connections)"""
+        for conn in [connection] if connection else self.connections:
+            if conn.async_batch:
+                cmd, calls = conn.async_batch_cmd, conn.async_batch
+                conn.async_batch, conn.async_batch_cmd, conn.async_batch_bytes = [], None, 0
+                for _ in self._call_many(cmd, calls, wait=False, connections=[conn] * len(calls)):
+                    pass
+
+    def _send_calls(self, conn, cmd, calls):
+        """queue a request for the calls (a batch request if there are multiple calls), return their msgids"""
+        msgids = list(range(self.msgid + 1, self.msgid + 1 + len(calls)))
+        self.msgid += len(calls)
+        if len(calls) == 1:
+            request = msgpack.packb({MSGID: self.msgid, MSG: cmd, ARGS: calls[0]})
+        else:
+            self.msgid += 1
+            self.batches[self.msgid] = [msgids, 0]
+            request = msgpack.packb({MSGID: self.msgid, MSG: f"{cmd}_batch", ARGS: {"calls": calls}})
+        if cmd in ("put", "delete") and conn is not self.connections[0]:
+            conn.dirty = True
+        request = conn.compression.compress(cmd if len(calls) == 1 else f"{cmd}_batch", request)
+        conn.window.sent(self.msgid, len(request))
+        conn.to_send.push_back(request)
+        return msgids
+
+    def _unbatch(self, conn, msgid, unpacked, size):
+        """split a (partial) response for a batch request into (msgid, unpacked) responses for its calls"""
+        msgids, batch_size = self.batches[msgid]
+        if "exception_class" in unpacked:
+            results = [unpacked] * len(msgids)  # the batch failed as a whole
+        else:
+            results = unpacked[RESULT]
+        msgids, remaining = msgids[: len(results)], msgids[len(results) :]
+        if remaining:
+            self.batches[msgid] = [remaining, batch_size + size]
+        else:
+            del self.batches[msgid]
+            conn.window.received(msgid, batch_size + size)
+        return [(id, {**result, MSGID: id}) for id, result in zip(msgids, results)]
+
+    def _call_many(self, cmd, calls, wait=True, is_preloaded=False, async_wait=True, connections=None):
+
         assert not is_preloaded or cmd == "get", "is_preloaded is only supported for 'get'"
 
-        def send_buffer():
-            if self.to_send:
+        def send_buffer(conn):
+            if conn.to_send:
                 try:
-                    written = self.ratelimit.write(self.stdin_fd, self.to_send.peek_front())
+                    written = self.ratelimit.write(conn.stdin_fd, conn.to_send.peek_front())
                     self.tx_bytes += written
-                    self.to_send.pop_front(written)
+                    conn.to_send.pop_front(written)
                 except OSError as e:
                     # io.write might raise EAGAIN even though select indicates
                     # that the fd should be writable.
@@ -743,6 +1203,20 @@ def send_buffer():
                     if e.errno not in [errno.EAGAIN, errno.EWOULDBLOCK]:
                         raise
 
+        def batch_len(calls):
+            """return how many of the calls we send in the next request"""
+            if not self.batch_rpc_version or cmd not in ("get", "put", "delete"):
+                return 1
+            count = size = 0
+            for _, args in calls[:BATCH_MAX_CALLS]:
+                if cmd == "get" and args["id"] in self.chunkid_to_msgids:
+                    break  # we already sent a preload request for this chunkid
+                size += len(args.get("data", b""))
+                if count and size > BATCH_MAX_BYTES:
+                    break
+                count += 1
+            return count
+
         def pop_preload_msgid(chunkid):
             msgid = self.chunkid_to_msgids[chunkid].pop(0)
             if not self.chunkid_to_msgids[chunkid]:
@@ -800,12 +1274,22 @@ def handle_error(unpacked):
                 raise self.RPCError(unpacked)
 
         calls = list(calls)
-        waiting_for = []
+        if connections is None:
+            spread = cmd in RPC_SPREAD_METHODS
+            connections = [self.connection_for(args["id"]) if spread else self.connections[0] for args in calls]
+        pending = {}  # connection -> [(index, args), ...] of the calls not sent yet
+        for index, (conn, args) in enumerate(zip(connections, calls)):
+            pending.setdefault(conn, []).append((index, args))
+        waiting_for = list(range(len(calls)))  # indexes of the calls we did not yield the result for yet
+        msgids = {}  # index -> msgid of the calls sent already
         maximum_to_send = 0 if wait else self.upload_buffer_size_limit
-        send_buffer()  # Try to send data, as some cases (async_response) will never try to send data otherwise.
-        while wait or calls:
+        for conn in self.connections:
+            send_buffer(conn)  # Try to send data, as some cases (async_response) will never try to send data otherwise.
+        while wait or pending:
             logger.debug(
-                f"call_many: calls: {len(calls)} waiting_for: {len(waiting_for)} responses: {len(self.responses)}"
+                f"call_many: calls: {len(calls)} waiting_for: {len(waiting_for)} responses: {len(self.responses)} "
+                f"in_flight: {sum(len(conn.window) for conn in self.connections)} "
+                f"window: {sum(int(conn.window.window) for conn in self.connections)}"
             )
             if self.shutdown_time and time.monotonic() > self.shutdown_time:
                 # we are shutting this RemoteRepository down already, make sure we do not waste
@@ -818,11 +1302,11 @@ def handle_error(unpacked):
                 return
             while waiting_for:
                 try:
-                    unpacked = self.responses.pop(waiting_for[0])
+                    unpacked = self.responses.pop(msgids[waiting_for[0]])
                     waiting_for.pop(0)
                     handle_error(unpacked)
                     yield unpacked[RESULT]
-                    if not waiting_for and not calls:
+                    if not waiting_for and not pending:
                         return
                 except KeyError:
                     break
@@ -840,58 +1324,69 @@ def handle_error(unpacked):
                     else:
                         handle_error(unpacked)
                         yield unpacked[RESULT]
-            if self.to_send or ((calls or self.preload_ids) and len(waiting_for) < MAX_INFLIGHT):
-                w_fds = [self.stdin_fd]
-            else:
-                w_fds = []
+            w_fds = [
+                conn.stdin_fd
+                for conn in self.connections
+                if conn.to_send or ((conn in pending or conn.preload_ids) and conn.window.can_send())
+            ]
             r, w, x = select.select(self.r_fds, w_fds, self.x_fds, 1)
             if x:
                 raise Exception("FD exception occurred")
             for fd in r:
-                if fd is self.stdout_fd:
+                conn = self.fd_connections[fd]
+                if fd == conn.stdout_fd:
                     data = os.read(fd, BUFSIZE)
                     if not data:
                         raise ConnectionClosed()
                     self.rx_bytes += len(data)
-                    self.unpacker.feed(data)
-                    for unpacked in self.unpacker:
-                        if not isinstance(unpacked, dict):
-                            raise UnexpectedRPCDataFormatFromServer(data)
-
-                        lr_dict = unpacked.get(LOG)
-                        if lr_dict is not None:
-                            # Re-emit remote log messages locally.
-                            _logger = logging.getLogger(lr_dict["name"])
-                            if _logger.isEnabledFor(lr_dict["level"]):
-                                _logger.handle(logging.LogRecord(**lr_dict))
-                            continue
-
-                        msgid = unpacked[MSGID]
-                        if msgid in self.ignore_responses:
-                            self.ignore_responses.remove(msgid)
-                            # async methods never return values, but may raise exceptions.
-                            if "exception_class" in unpacked:
-                                self.async_responses[msgid] = unpacked
+                    conn.unpacker.feed(data)
+                    offset = conn.unpacker.tell()
+                    for frame in conn.unpacker:
+                        size, offset = conn.unpacker.tell() - offset, conn.unpacker.tell()
+                        for unpacked in conn.compression.unframe(frame):
+                            if not isinstance(unpacked, dict):
+                                raise UnexpectedRPCDataFormatFromServer(data)
+
+                            lr_dict = unpacked.get(LOG)
+                            if lr_dict is not None:
+                                # Re-emit remote log messages locally.
+                                _logger = logging.getLogger(lr_dict["name"])
+                                if _logger.isEnabledFor(lr_dict["level"]):
+                                    _logger.handle(logging.LogRecord(**lr_dict))
+                                continue
+
+                            msgid = unpacked[MSGID]
+                            if msgid in self.batches:
+                                responses = self._unbatch(conn, msgid, unpacked, size)
                             else:
-                                # we currently do not have async result values except "None",
-                                # so we do not add them into async_responses.
-                                if unpacked[RESULT] is not None:
-                                    self.async_responses[msgid] = unpacked
-                        else:
-                            self.responses[msgid] = unpacked
-                elif fd is self.stderr_fd:
+                                conn.window.received(msgid, size)
+                                responses = [(msgid, unpacked)]
+                            for msgid, unpacked in responses:
+                                if msgid in self.ignore_responses:
+                                    self.ignore_responses.remove(msgid)
+                                    # async methods never return values, but may raise exceptions.
+                                    if "exception_class" in unpacked:
+                                        self.async_responses[msgid] = unpacked
+                                    else:
+                                        # we currently do not have async result values except "None",
+                                        # so we do not add them into async_responses.
+                                        if unpacked[RESULT] is not None:
+                                            self.async_responses[msgid] = unpacked
+                                else:
+                                    self.responses[msgid] = unpacked
+                elif fd == conn.stderr_fd:
                     data = os.read(fd, 32768)
                     if not data:
                         raise ConnectionClosed()
                     self.rx_bytes += len(data)
                     # deal with incomplete lines (may appear due to block buffering)
-                    if self.stderr_received:
-                        data = self.stderr_received + data
-                        self.stderr_received = b""
+                    if conn.stderr_received:
+                        data = conn.stderr_received + data
+                        conn.stderr_received = b""
                     lines = data.splitlines(keepends=True)
                     if lines and not lines[-1].endswith((b"\r", b"\n")):
-                        self.stderr_received = lines.pop()
-                    # now we have complete lines in <lines> and any partial line in self.stderr_received.
+                        conn.stderr_received = lines.pop()
+                    # now we have complete lines in <lines> and any partial line in conn.stderr_received.
                     _logger = logging.getLogger()
                     for line in lines:
                         # borg serve (remote/server side) should not emit stuff on stderr,
@@ -900,47 +1395,72 @@ def handle_error(unpacked):
                         # something came in on stderr, log it to not lose it.
                         # decode late, avoid partial utf-8 sequences.
                         _logger.warning("stderr: " + line.decode().strip())
-            if w:
-                while (
-                    (len(self.to_send) <= maximum_to_send)
-                    and (calls or self.preload_ids)
-                    and len(waiting_for) < MAX_INFLIGHT
-                ):
-                    if calls:
-                        args = calls[0]
+            for fd in w:
+                conn = self.fd_connections[fd]
+                queue = pending.get(conn, [])
+                while (len(conn.to_send) <= maximum_to_send) and (queue or conn.preload_ids) and conn.window.can_send():
+                    if queue:
+                        index, args = queue[0]
                         if cmd == "get" and args["id"] in self.chunkid_to_msgids:
                             # we have a get command and have already sent a request for this chunkid when
                             # doing preloading, so we know the msgid of the response we are waiting for:
-                            waiting_for.append(pop_preload_msgid(args["id"]))
-                            del calls[0]
+                            msgids[index] = pop_preload_msgid(args["id"])
+                            del queue[0]
                         elif not is_preloaded:
                             # make and send a request (already done if we are using preloading)
-                            self.msgid += 1
-                            waiting_for.append(self.msgid)
-                            del calls[0]
-                            self.to_send.push_back(msgpack.packb({MSGID: self.msgid, MSG: cmd, ARGS: args}))
-                    if not self.to_send and self.preload_ids:
-                        chunk_id = self.preload_ids.pop(0)
+                            count = batch_len(queue)
+                            sent = self._send_calls(conn, cmd, [args for _, args in queue[:count]])
+                            msgids.update(zip([index for index, _ in queue[:count]], sent))
+                            del queue[:count]
+                        if not queue:
+                            del pending[conn]
+                    if not conn.to_send and conn.preload_ids:
+                        chunk_ids = conn.preload_ids[: BATCH_MAX_CALLS if self.batch_rpc_version else 1]
+                        del conn.preload_ids[: len(chunk_ids)]
                         # for preloading chunks, the raise_missing behaviour is defined HERE,
                         # not in the get_many / fetch_many call that later fetches the preloaded chunks.
-                        args = {"id": chunk_id, "raise_missing": False}
-                        self.msgid += 1
-                        self.chunkid_to_msgids.setdefault(chunk_id, []).append(self.msgid)
-                        self.to_send.push_back(msgpack.packb({MSGID: self.msgid, MSG: "get", ARGS: args}))
+                        preload_calls = [{"id": chunk_id, "raise_missing": False} for chunk_id in chunk_ids]
+                        for chunk_id, msgid in zip(chunk_ids, self._send_calls(conn, "get", preload_calls)):
+                            self.chunkid_to_msgids.setdefault(chunk_id, []).append(msgid)
+
+                send_buffer(conn)
+        for msgid in (msgids[index] for index in waiting_for):  # we lose order here
+            unpacked = self.responses.pop(msgid, None)
+            if unpacked is None:
+                self.ignore_responses.add(msgid)
+            elif "exception_class" in unpacked or unpacked[RESULT] is not None:
+                # the response arrived while we were still sending, treat it like a later async response.
+                self.async_responses[msgid] = unpacked
 
-                send_buffer()
-        self.ignore_responses |= set(waiting_for)  # we lose order here
-
-    @api(since=parse_version("1.0.0"), v1_or_v2={"since": parse_version("2.0.0b9"), "previously": True})
-    def open(self, path, create=False, lock_wait=None, lock=True, exclusive=False, v1_or_v2=False):
+    @api(
+        since=parse_version("1.0.0"),
+        v1_or_v2={"since": parse_version("2.0.0b9"), "previously": True},
+        max_read_rate={"since": parse_version("2.0.0b19"), "previously": 0, "dontcare": True},
+        max_ops_rate={"since": parse_version("2.0.0b19"), "previously": 0, "dontcare": True},
+    )
+    def open(
+        self,
+        path,
+        create=False,
+        lock_wait=None,
+        lock=True,
+        exclusive=False,
+        v1_or_v2=False,
+        max_read_rate=0,
+        max_ops_rate=0,
+    ):
         """actual remoting is done via self.call in the @api decorator"""
 
     @api(since=parse_version("2.0.0a3"))
     def info(self):
         """actual remoting is done via self.call in the @api decorator"""
 
-    @api(since=parse_version("1.0.0"), max_duration={"since": parse_version("1.2.0a4"), "previously": 0})
-    def check(self, repair=False, max_duration=0):
+    @api(
+        since=parse_version("1.0.0"),
+        max_duration={"since": parse_version("1.2.0a4"), "previously": 0},
+        jobs={"since": parse_version("2.0.0b19"), "previously": 1, "dontcare": True},
+    )
+    def check(self, repair=False, max_duration=0, jobs=1):
         """actual remoting is done via self.call in the @api decorator"""
 
     @api(
@@ -967,10 +1487,18 @@ def __len__(self):
     def list(self, limit=None, marker=None):
         """actual remoting is done via self.call in the @api decorator"""
 
+    @api(since=parse_version("2.0.0b19"))
+    def list_prefix(self, prefix):
+        """actual remoting is done via self.call in the @api decorator"""
+
     def get(self, id, read_data=True, raise_missing=True):
         for resp in self.get_many([id], read_data=read_data, raise_missing=raise_missing):
             return resp
 
+    @api(since=parse_version("2.0.0b19"))
+    def has_many(self, ids):
+        """actual remoting is done via self.call in the @api decorator"""
+
     def get_many(self, ids, read_data=True, is_preloaded=False, raise_missing=True):
         yield from self.call_many(
             "get",
@@ -999,28 +1527,31 @@ def break_lock(self):
         """actual remoting is done via self.call in the @api decorator"""
 
     def close(self):
-        if self.p or self.sock:
-            self.call("close", {}, wait=True)
-        if self.p:
-            self.p.stdin.close()
-            self.p.stdout.close()
-            self.p.wait()
-            self.p = None
-        if self.sock:
+        if self.connections:
             try:
-                self.sock.shutdown(socket.SHUT_RDWR)
-            except OSError as e:
-                if e.errno != errno.ENOTCONN:
-                    raise
-            self.sock.close()
-            self.sock = None
+                others = self.connections[1:]
+                if others:
+                    # the other connections finish their async operations before we release the lock.
+                    for conn in others:
+                        conn.dirty = False
+                    for _ in self.call_many("close", [{}] * len(others), connections=others):
+                        pass
+                self.call("close", {}, wait=True)
+            finally:
+                for conn in self.connections:
+                    conn.close()
+                self.connections = []
+                self.fd_connections = {}
+                self.r_fds = []
+                self.x_fds = []
 
     def async_response(self, wait=True):
         for resp in self.call_many("async_responses", calls=[], wait=True, async_wait=wait):
             return resp
 
     def preload(self, ids):
-        self.preload_ids += ids
+        for id in ids:
+            self.connection_for(id).preload_ids.append(id)
 
     @api(since=parse_version("2.0.0b8"))
     def get_manifest(self):
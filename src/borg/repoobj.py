@@ -63,6 +63,31 @@ def format(
             meta["clevel"] = clevel
             data_compressed = data  # is already compressed, is NOT prefixed by type/level bytes
             meta["csize"] = len(data_compressed)
+        return self.format_compressed(id, meta, data_compressed)
+
+    def compress(self, meta: dict, data: bytes, ro_type: str = None) -> tuple[dict, bytes]:
+        """
+        Compress data, return (meta, data_compressed) to be given to format_compressed.
+
+        This is the CPU intensive first half of format, it does not use the key and is safe to be called
+        from multiple threads (the compressors release the GIL).
+        """
+        assert isinstance(ro_type, str)
+        assert ro_type != ROBJ_DONTCARE
+        assert isinstance(meta, dict)
+        assert isinstance(data, (bytes, memoryview))
+        meta["type"] = ro_type
+        return self.compressor.compress(meta, data)
+
+    def format_compressed(self, id: bytes, meta: dict, data_compressed: bytes) -> bytes:
+        """
+        Encrypt compressed data and its metadata (see compress), return the repo object.
+
+        This is the second half of format, it must be called from one thread only (the cipher is
+        not thread-safe and the IVs need to be used sequentially).
+        """
+        assert isinstance(id, bytes)
+        assert "type" in meta and "csize" in meta
         data_encrypted = self.key.encrypt(id, data_compressed)
         meta_packed = msgpack.packb(meta)
         meta_encrypted = self.key.encrypt(id, meta_packed)
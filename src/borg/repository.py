@@ -1,5 +1,11 @@
+import itertools
+import logging
+import multiprocessing
 import os
+import threading
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait as futures_wait
 
 from borgstore.store import Store
 from borgstore.store import ObjectNotFound as StoreObjectNotFound
@@ -12,7 +18,8 @@
 from .hashindex import ChunkIndex, ChunkIndexEntry
 from .helpers import Error, ErrorWithTraceback, IntegrityError
 from .helpers import Location
-from .helpers import bin_to_hex, hex_to_bin
+from .helpers import bin_to_hex, hex_to_bin, format_io_rate
+from .helpers import ProgressIndicatorMessage
 from .storelocking import Lock
 from .logger import create_logger
 from .manifest import NoManifestError
@@ -32,6 +39,92 @@ def repo_lister(repository, *, limit=None):
         yield from result
 
 
+def repo_sharded_lister(repository):
+    """
+    yield (id, stored_size) of all objects in the repository, like repo_lister.
+
+    The listing is done in 256 shards (all ids with the same first byte), the repository
+    lists the nested data/ directories of each shard in parallel (see Repository.list_prefix).
+    """
+    for i in range(256):
+        yield from repository.list_prefix(f"{i:02x}")
+
+
+LAST_KEY_CHECKED = "last-key-checked"  # name of the repository check checkpoint in cache/
+
+
+def check_repo_object(obj):
+    """Check if obj looks valid, return a list of the problems found."""
+    problems = []
+    hdr_size = RepoObj.obj_header.size
+    obj_size = len(obj)
+    if obj_size >= hdr_size:
+        hdr = RepoObj.ObjHeader(*RepoObj.obj_header.unpack(obj[:hdr_size]))
+        meta = obj[hdr_size : hdr_size + hdr.meta_size]
+        if hdr.meta_size != len(meta):
+            problems.append("metadata size incorrect.")
+        elif hdr.meta_hash != xxh64(meta):
+            problems.append("metadata does not match checksum.")
+        data = obj[hdr_size + hdr.meta_size : hdr_size + hdr.meta_size + hdr.data_size]
+        if hdr.data_size != len(data):
+            problems.append("data size incorrect.")
+        elif hdr.data_hash != xxh64(data):
+            problems.append("data does not match checksum.")
+    else:
+        problems.append("too small.")
+    return problems
+
+
+def check_shard(location, permissions, shard, *, repair, deadline, max_read_rate=0, max_ops_rate=0):
+    """Check a shard of the repository, runs in a worker process of Repository.check."""
+    ids = []
+    log = []
+    # the parent process holds the repository lock.
+    with Repository(
+        location, lock=False, permissions=permissions, max_read_rate=max_read_rate, max_ops_rate=max_ops_rate
+    ) as repository:
+        result = repository._check_shard(
+            shard, repair=repair, deadline=deadline, add_id=ids.append, log=lambda *args: log.append(args)
+        )
+    result.update(ids=b"".join(ids), log=log)
+    return result
+
+
+class IORateLimiter:
+    """
+    Token bucket limiting the repository I/O to <max_bytes> bytes/s and <max_ops> objects/s (0 = unlimited).
+
+    throttle() is called after each object read (or delete) and sleeps as long as the caller used
+    more than its share. Up to 1s worth of I/O may be done in a burst. Thread-safe.
+    """
+
+    def __init__(self, max_bytes=0, max_ops=0):
+        self.max_bytes = max_bytes
+        self.max_ops = max_ops
+        self.lock = threading.Lock()
+        self.last = time.monotonic()
+        self.bytes_tokens = max_bytes
+        self.ops_tokens = max_ops
+
+    def throttle(self, nbytes=0, nops=1):
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self.last = now - self.last, now
+            delay = 0.0
+            if self.max_bytes:
+                self.bytes_tokens = min(self.max_bytes, self.bytes_tokens + elapsed * self.max_bytes) - nbytes
+                if self.bytes_tokens < 0:
+                    delay = -self.bytes_tokens / self.max_bytes
+            if self.max_ops:
+                self.ops_tokens = min(self.max_ops, self.ops_tokens + elapsed * self.max_ops) - nops
+                if self.ops_tokens < 0:
+                    delay = max(delay, -self.ops_tokens / self.max_ops)
+        if delay > 0:
+            # note: the tokens we are in debt are refilled while we sleep, so concurrent
+            # callers will also sleep (at least) until the debt is paid off.
+            time.sleep(delay)
+
+
 class Repository:
     """borgstore based key value store"""
 
@@ -101,6 +194,8 @@ def __init__(
         lock=True,
         send_log_cb=None,
         permissions=None,
+        max_read_rate=0,
+        max_ops_rate=0,
     ):
         if isinstance(path_or_location, Location):
             location = path_or_location
@@ -114,15 +209,16 @@ def __init__(
         self._location = location
         self.url = url
         # lots of stuff in data: use 2 levels by default (data/00/00/ .. data/ff/ff/ dirs)!
-        data_levels = int(os.environ.get("BORG_STORE_DATA_LEVELS", "2"))
+        self.data_levels = int(os.environ.get("BORG_STORE_DATA_LEVELS", "2"))
         levels_config = {
             "archives/": [0],
             "cache/": [0],
             "config/": [0],
-            "data/": [data_levels],
+            "data/": [self.data_levels],
             "keys/": [0],
             "locks/": [0],
         }
+        self._permissions = permissions  # as given, for other Repository instances (see check)
         # Get permissions from parameter or environment variable
         permissions = permissions if permissions is not None else os.environ.get("BORG_REPO_PERMISSIONS", "all")
 
@@ -175,6 +271,17 @@ def __init__(
         self.do_lock = lock
         self.lock_wait = lock_wait
         self.exclusive = exclusive
+        # server-side listing cursor: (last id returned by .list, iterator to continue from there)
+        self._list_cursor = None
+        # I/O thread pool (if used): parallel get_many / preload, async put / delete.
+        self._executor = None
+        self.io_window = 1  # max. count of objects fetched ahead or stored / deleted asynchronously
+        self._async_pending = deque()  # (id, future) of async put / delete operations
+        self._preload = deque()  # [id, future] of preloaded objects, future is None if not submitted yet
+        # read throttling (bytes/s, objects/s) for maintenance operations like check and compact.
+        self.max_read_rate = max_read_rate
+        self.max_ops_rate = max_ops_rate
+        self.io_limiter = IORateLimiter(max_read_rate, max_ops_rate)
 
     def __repr__(self):
         return f"<{self.__class__.__name__} {self._location}>"
@@ -192,7 +299,7 @@ def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+        self.close(raise_async_errors=exc_type is None)
 
     @property
     def id_str(self):
@@ -270,9 +377,18 @@ def open(self, *, exclusive, lock_wait=None, lock=True):
         # important: lock *after* making sure that there actually is an existing, supported repository.
         if lock:
             self.lock = Lock(self.store, exclusive, timeout=lock_wait).acquire()
+        self._start_io_threads()
         self.opened = True
 
-    def close(self):
+    def close(self, raise_async_errors=True):
+        self._list_cursor = None
+        self._stop_io_threads()  # finish all outstanding async operations before we release the lock.
+        # failed async operations that were not collected via async_response() must not get lost silently.
+        errors = [future.exception() for _, future in self._async_pending if future.exception() is not None]
+        self._async_pending.clear()
+        for error in errors:
+            logger.error(f"Uncollected error of an async repository operation: {error!r}")
+        self._preload.clear()
         if self.lock:
             self.lock.release()
             self.lock = None
@@ -280,6 +396,21 @@ def close(self):
             self.store.close()
             self.store_opened = False
         self.opened = False
+        if errors and raise_async_errors:
+            raise errors[0]
+
+    def _start_io_threads(self):
+        io_threads = int(os.environ.get("BORG_IO_THREADS", IO_THREADS))
+        if io_threads > 1 and self.url.startswith("file://"):
+            # other borgstore backends might not be safe to use from multiple threads.
+            self._executor = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix="borg-repo-io")
+            self.io_window = 2 * io_threads
+
+    def _stop_io_threads(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self.io_window = 1
 
     def info(self):
         """return some infos about the repo (must be opened first)"""
@@ -288,82 +419,203 @@ def info(self):
         info = dict(id=self.id, version=self.version)
         return info
 
-    def check(self, repair=False, max_duration=0):
+    def check(self, repair=False, max_duration=0, jobs=1):
         """Check repository consistency"""
-
-        def log_error(msg):
-            nonlocal obj_corrupted
-            obj_corrupted = True
-            logger.error(f"Repo object {info.name} is corrupted: {msg}")
-
-        def check_object(obj):
-            """Check if obj looks valid."""
-            hdr_size = RepoObj.obj_header.size
-            obj_size = len(obj)
-            if obj_size >= hdr_size:
-                hdr = RepoObj.ObjHeader(*RepoObj.obj_header.unpack(obj[:hdr_size]))
-                meta = obj[hdr_size : hdr_size + hdr.meta_size]
-                if hdr.meta_size != len(meta):
-                    log_error("metadata size incorrect.")
-                elif hdr.meta_hash != xxh64(meta):
-                    log_error("metadata does not match checksum.")
-                data = obj[hdr_size + hdr.meta_size : hdr_size + hdr.meta_size + hdr.data_size]
-                if hdr.data_size != len(data):
-                    log_error("data size incorrect.")
-                elif hdr.data_hash != xxh64(data):
-                    log_error("data does not match checksum.")
-            else:
-                log_error("too small.")
-
         # TODO: progress indicator, ...
+        self._wait_async()
         partial = bool(max_duration)
         assert not (repair and partial)
         mode = "partial" if partial else "full"
-        LAST_KEY_CHECKED = "cache/last-key-checked"
         logger.info(f"Starting {mode} repository check")
-        if partial:
-            # continue a past partial check (if any) or from a checkpoint or start one from beginning
-            try:
-                last_key_checked = self.store.load(LAST_KEY_CHECKED).decode()
-            except StoreObjectNotFound:
-                last_key_checked = ""
-        else:
+        # the key space is split into 16 shards (by the first hex digit of the id), each shard has its own
+        # checkpoint. with jobs > 1, the shards are checked in parallel by worker processes, otherwise one
+        # after the other, so a partial check can be continued no matter whether it was parallel or not.
+        parallel = jobs > 1 and "fork" in multiprocessing.get_all_start_methods()
+        shards = [f"{i:x}" for i in range(16)]
+        if not partial:
             # start from the beginning and also forget about any potential past partial checks
-            last_key_checked = ""
-            try:
-                self.store.delete(LAST_KEY_CHECKED)
-            except StoreObjectNotFound:
-                pass
-        if last_key_checked:
-            logger.info(f"Skipping to keys after {last_key_checked}.")
+            self._delete_check_checkpoints()
         else:
-            logger.info("Starting from beginning.")
+            self._convert_check_checkpoint()
+        deadline = time.monotonic() + max_duration if partial else None
+        objs_checked = objs_errors = bytes_read = 0
+        finished = True
         t_start = time.monotonic()
-        t_last_checkpoint = t_start
-        objs_checked = objs_errors = 0
         chunks = ChunkIndex()
         # we don't do refcounting anymore, neither we can know here whether any archive
         # is using this object, but we assume that this is the case.
         # As we don't do garbage collection here, this is not a problem.
         # We also don't know the plaintext size, so we set it to 0.
         init_entry = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=0)
-        infos = self.store.list("data")
+        pi = ProgressIndicatorMessage(msgid="repository.check")
+
+        def show_progress(objs_checked, bytes_read, info=""):
+            rate = format_io_rate(bytes_read, objs_checked, time.monotonic() - t_start)
+            pi.output(f"Checked {objs_checked} repository objects{info} ({rate})")
+
+        if parallel:
+            workers = min(jobs, len(shards))
+            logger.info(f"Checking {len(shards)} shards with {workers} worker processes.")
+            # do not fork while we have I/O threads, we do not need them here anyway.
+            self._stop_io_threads()
+            shards_done = 0
+            try:
+                mp_context = multiprocessing.get_context("fork")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+                    pending = {
+                        executor.submit(
+                            check_shard,
+                            self._location,
+                            self._permissions,
+                            shard,
+                            repair=repair,
+                            deadline=deadline,
+                            # the workers share the read rate limits.
+                            max_read_rate=self.max_read_rate / workers,
+                            max_ops_rate=self.max_ops_rate / workers,
+                        )
+                        for shard in shards
+                    }
+                    while pending:
+                        done, pending = futures_wait(pending, timeout=10, return_when=FIRST_COMPLETED)
+                        self._lock_refresh()
+                        for future in done:
+                            result = future.result()
+                            for level, msg in result["log"]:
+                                logger.log(level, msg)
+                            ids = result["ids"]
+                            for i in range(0, len(ids), 32):
+                                chunks[ids[i : i + 32]] = init_entry
+                            objs_checked += result["objs_checked"]
+                            objs_errors += result["objs_errors"]
+                            bytes_read += result["bytes_read"]
+                            finished = finished and result["finished"]
+                            shards_done += 1
+                            show_progress(objs_checked, bytes_read, f", {shards_done}/{len(shards)} shards")
+                        self._send_log()
+            finally:
+                self._start_io_threads()
+        else:
+            for shard in shards:
+                result = self._check_shard(
+                    shard,
+                    repair=repair,
+                    deadline=deadline,
+                    add_id=lambda id: chunks.__setitem__(id, init_entry),
+                    log=logger.log,
+                    progress=lambda result: show_progress(
+                        objs_checked + result["objs_checked"], bytes_read + result["bytes_read"]
+                    ),
+                )
+                objs_checked += result["objs_checked"]
+                objs_errors += result["objs_errors"]
+                bytes_read += result["bytes_read"]
+                if not result["finished"]:
+                    finished = False
+                    break  # deadline reached, the next partial check continues from the checkpoint.
+        pi.finish()
+        if finished:
+            logger.info("Finished repository check.")
+            self._delete_check_checkpoints()
+            if not partial:
+                # if we did a full pass in one go, we built a complete, uptodate ChunkIndex, cache it!
+                from .cache import write_chunkindex_to_repo_cache
+
+                write_chunkindex_to_repo_cache(
+                    self, chunks, incremental=False, clear=True, force_write=True, delete_other=True
+                )
+        rate = format_io_rate(bytes_read, objs_checked, time.monotonic() - t_start)
+        logger.info(f"Checked {objs_checked} repository objects, {objs_errors} errors ({rate}).")
+        if objs_errors == 0:
+            logger.info(f"Finished {mode} repository check, no problems found.")
+        else:
+            if repair:
+                logger.info(f"Finished {mode} repository check, errors found and repaired.")
+            else:
+                logger.error(f"Finished {mode} repository check, errors found.")
+        return objs_errors == 0 or repair
+
+    def _delete_check_checkpoints(self):
+        for info in self.store_list("cache"):
+            if info.name == LAST_KEY_CHECKED or info.name.startswith(LAST_KEY_CHECKED + "."):
+                self.store.delete("cache/" + info.name)
+
+    def _convert_check_checkpoint(self):
+        """convert the checkpoint of a partial check by an older borg version into shard checkpoints"""
+        try:
+            last_key_checked = self.store.load(f"cache/{LAST_KEY_CHECKED}").decode()
+        except StoreObjectNotFound:
+            return
+        if last_key_checked == "done":
+            current = "g"  # all shards are done
+        else:
+            current = last_key_checked.removeprefix("data/")[0]
+        for i in range(16):
+            shard = f"{i:x}"
+            if shard < current:
+                self.store.store(f"cache/{LAST_KEY_CHECKED}.{shard}", b"done")
+            elif shard == current:
+                self.store.store(f"cache/{LAST_KEY_CHECKED}.{shard}", last_key_checked.encode())
+        self.store.delete(f"cache/{LAST_KEY_CHECKED}")
+
+    def _check_shard(self, shard, *, repair, deadline, add_id, log, progress=None):
+        """
+        Check the objects with hex ids starting with <shard>, continuing after the shard's checkpoint.
+
+        add_id(id) is called for all objects that shall get into the ChunkIndex,
+        log(level, msg) is called for all log output,
+        progress(result) is called about once per second (if given).
+        """
+
+        def log_error(msg):
+            nonlocal obj_corrupted
+            obj_corrupted = True
+            log(logging.ERROR, f"Repo object {info.name} is corrupted: {msg}")
+
+        def check_object(obj):
+            for msg in check_repo_object(obj):
+                log_error(msg)
+
+        checkpoint = f"cache/{LAST_KEY_CHECKED}.{shard}"
+        try:
+            # continue a past partial check (if any) or from a checkpoint or start one from beginning.
+            # note: a full check deletes all checkpoints before it starts.
+            last_key_checked = self.store.load(checkpoint).decode()
+        except StoreObjectNotFound:
+            last_key_checked = ""
+        result = dict(objs_checked=0, objs_errors=0, bytes_read=0, finished=True)
+        if last_key_checked == "done":
+            return result  # this shard was already completely checked by a previous partial check
+        # per shard information is only interesting for debugging.
+        if last_key_checked:
+            log(logging.DEBUG, f"Skipping to keys after {last_key_checked} in shard {shard}.")
+            after = hex_to_bin(last_key_checked.removeprefix("data/"))
+        else:
+            log(logging.DEBUG, f"Starting from beginning in shard {shard}.")
+            # start right before the first possible key of the shard
+            after = (int(shard, 16) << 4 * (64 - len(shard))) - 1
+            after = after.to_bytes(32, "big") if after >= 0 else None
+        t_start = t_last_checkpoint = t_last_progress = time.monotonic()
+        # resume listing directly after the last key checked (if any), see _list_data.
+        infos = self._list_data(after=after)
         try:
             for info in infos:
+                if not info.name.startswith(shard):
+                    break  # sorted keys, we are beyond this shard now.
                 self._lock_refresh()
                 key = "data/%s" % info.name
-                if key <= last_key_checked:  # needs sorted keys
-                    continue
                 try:
                     obj = self.store.load(key)
                 except StoreObjectNotFound:
                     # looks like object vanished since store.list(), ignore that.
                     continue
+                self.io_limiter.throttle(len(obj))
+                result["bytes_read"] += len(obj)
                 obj_corrupted = False
                 check_object(obj)
-                objs_checked += 1
+                result["objs_checked"] += 1
                 if obj_corrupted:
-                    objs_errors += 1
+                    result["objs_errors"] += 1
                     if repair:
                         # if it is corrupted, we can't do much except getting rid of it.
                         # but let's just retry loading it, in case the error goes away.
@@ -383,51 +635,75 @@ def check_object(obj):
                     # add all existing objects to the index.
                     # borg check: the index may have corrupted objects (we did not delete them)
                     # borg check --repair: the index will only have non-corrupted objects.
-                    id = hex_to_bin(info.name)
-                    chunks[id] = init_entry
+                    add_id(hex_to_bin(info.name))
                 now = time.monotonic()
+                if progress is not None and now > t_last_progress + 1:
+                    t_last_progress = now
+                    progress(result)
                 if now > t_last_checkpoint + 300:  # checkpoint every 5 mins
                     t_last_checkpoint = now
-                    logger.info(f"Checkpointing at key {key}.")
-                    self.store.store(LAST_KEY_CHECKED, key.encode())
-                if partial and now > t_start + max_duration:
-                    logger.info(f"Finished partial repository check, last key checked is {key}.")
-                    self.store.store(LAST_KEY_CHECKED, key.encode())
-                    break
-            else:
-                logger.info("Finished repository check.")
-                try:
-                    self.store.delete(LAST_KEY_CHECKED)
-                except StoreObjectNotFound:
-                    pass
-                if not partial:
-                    # if we did a full pass in one go, we built a complete, uptodate ChunkIndex, cache it!
-                    from .cache import write_chunkindex_to_repo_cache
-
-                    write_chunkindex_to_repo_cache(
-                        self, chunks, incremental=False, clear=True, force_write=True, delete_other=True
-                    )
+                    rate = format_io_rate(result["bytes_read"], result["objs_checked"], now - t_start)
+                    log(logging.INFO, f"Checkpointing at key {key} in shard {shard} ({rate}).")
+                    self.store.store(checkpoint, key.encode())
+                if deadline is not None and now > deadline:
+                    log(logging.INFO, f"Finished partial repository check, last key checked is {key}.")
+                    self.store.store(checkpoint, key.encode())
+                    result["finished"] = False
+                    return result
         except StoreObjectNotFound:
             # it can be that there is no "data/" at all, then it crashes when iterating infos.
             pass
-        logger.info(f"Checked {objs_checked} repository objects, {objs_errors} errors.")
-        if objs_errors == 0:
-            logger.info(f"Finished {mode} repository check, no problems found.")
-        else:
-            if repair:
-                logger.info(f"Finished {mode} repository check, errors found and repaired.")
-            else:
-                logger.error(f"Finished {mode} repository check, errors found.")
-        return objs_errors == 0 or repair
+        if deadline is not None:
+            # partial check: remember that this shard is completely checked.
+            self.store.store(checkpoint, b"done")
+        return result
+
+    def _list_data(self, after=None):
+        """
+        yield infos of all objects in data/ (sorted by key), starting after id <after>.
+
+        As the nested directory of an object is determined by its id, we can directly
+        resume listing from the directory containing <after>, instead of listing (and
+        skipping) everything sorting before it.
+        """
+        if after is None:
+            yield from self.store.list("data")
+            return
+
+        def list_dir(name):
+            try:
+                yield from self.store.list(name)
+            except StoreObjectNotFound:
+                pass  # missing directory, nothing in there
+
+        after_hex = bin_to_hex(after)
+        parts = [after_hex[2 * level : 2 * level + 2] for level in range(self.data_levels)]
+        # first the rest of the directory containing <after>, ...
+        for info in list_dir("/".join(["data"] + parts)):
+            if info.name > after_hex:
+                yield info
+        # ... then all the following directories, going up one level at a time.
+        for level in reversed(range(self.data_levels)):
+            parent = "/".join(["data"] + parts[:level])
+            for i in range(int(parts[level], 16) + 1, 256):
+                yield from list_dir(f"{parent}/{i:02x}")
 
     def list(self, limit=None, marker=None):
         """
         list <limit> infos starting from after id <marker>.
         each info is a tuple (id, storage_size).
+
+        if <marker> is the last id returned by the previous call, listing continues
+        directly where that call stopped, so paging through the repository with
+        repo_lister is a single linear pass over data/.
         """
-        collect = True if marker is None else False
+        self._wait_async()
+        if marker is not None and self._list_cursor is not None and self._list_cursor[0] == marker:
+            infos = self._list_cursor[1]
+        else:
+            infos = self._list_data(after=marker)  # generator yielding ItemInfos
+        self._list_cursor = None
         result = []
-        infos = self.store.list("data")  # generator yielding ItemInfos
         while True:
             self._lock_refresh()
             try:
@@ -437,24 +713,65 @@ def list(self, limit=None, marker=None):
             except StopIteration:
                 break
             else:
-                id = hex_to_bin(info.name)
-                if collect:
-                    result.append((id, info.size))
-                    if len(result) == limit:
-                        break
-                elif id == marker:
-                    collect = True
-                    # note: do not collect the marker id
+                result.append((hex_to_bin(info.name), info.size))
+                if len(result) == limit:
+                    self._list_cursor = (result[-1][0], infos)
+                    break
+        return result
+
+    def list_prefix(self, prefix):
+        """
+        list infos of all objects with a hex id starting with <prefix>, sorted by id.
+        each info is a tuple (id, storage_size).
+
+        The nested data/ directories containing these objects are listed in parallel by
+        a bounded pool of BORG_LIST_THREADS threads, if the store is a local filesystem
+        (e.g. also NFS), where listing is dominated by per-directory latency.
+        """
+        self._lock_refresh()
+        self._wait_async()
+
+        def list_dir(name):
+            try:
+                infos = self.store.list(name)
+                return [(hex_to_bin(info.name), info.size) for info in infos if info.name.startswith(prefix)]
+            except StoreObjectNotFound:
+                return []  # missing directory, nothing in there
+
+        prefix_levels = min(len(prefix) // 2, self.data_levels)
+        parts = [prefix[2 * level : 2 * level + 2] for level in range(prefix_levels)]
+        top = "/".join(["data"] + parts)
+        # all directories below <top> at the deepest nesting level:
+        names = [
+            "/".join([top] + [f"{i:02x}" for i in sub])
+            for sub in itertools.product(range(256), repeat=self.data_levels - prefix_levels)
+        ]
+        threads = int(os.environ.get("BORG_LIST_THREADS", LIST_THREADS))
+        if threads <= 1 or len(names) == 1 or not self.url.startswith("file://"):
+            # other borgstore backends might not be safe to use from multiple threads.
+            return [entry for name in names for entry in list_dir(name)]
+        result = []
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for entries in executor.map(list_dir, names):  # same order as names
+                self._lock_refresh()
+                result.extend(entries)
         return result
 
     def get(self, id, read_data=True, raise_missing=True):
         self._lock_refresh()
+        self._wait_async(id)
+        return self._get(id, read_data=read_data, raise_missing=raise_missing)
+
+    def _get(self, id, read_data=True, raise_missing=True):
+        # note: also called from the I/O threads, do not use anything here that is not thread-safe.
         id_hex = bin_to_hex(id)
         key = "data/" + id_hex
         try:
             if read_data:
                 # read everything
-                return self.store.load(key)
+                obj = self.store.load(key)
+                self.io_limiter.throttle(len(obj))
+                return obj
             else:
                 # RepoObj layout supports separately encrypted metadata and data.
                 # We return enough bytes so the client can decrypt the metadata.
@@ -472,6 +789,7 @@ def get(self, id, read_data=True, raise_missing=True):
                 meta = obj[hdr_size : hdr_size + meta_size]
                 if len(meta) != meta_size:
                     raise IntegrityError(f"Object too small [id {id_hex}]: expected {meta_size}, got {len(meta)} bytes")
+                self.io_limiter.throttle(len(obj))
                 return hdr + meta
         except StoreObjectNotFound:
             if raise_missing:
@@ -479,9 +797,67 @@ def get(self, id, read_data=True, raise_missing=True):
             else:
                 return None
 
+    def _submit_get(self, id, read_data=True, raise_missing=True):
+        self._wait_async(id)  # do not read an object while we are still writing or deleting it
+        return self._executor.submit(self._get, id, read_data=read_data, raise_missing=raise_missing)
+
     def get_many(self, ids, read_data=True, is_preloaded=False, raise_missing=True):
-        for id_ in ids:
-            yield self.get(id_, read_data=read_data, raise_missing=raise_missing)
+        if self._executor is None:
+            for id_ in ids:
+                yield self.get(id_, read_data=read_data, raise_missing=raise_missing)
+            return
+        # fetch up to io_window objects in parallel, ahead of what we yield, but yield them in order.
+        fetching = deque()
+        ids = iter(ids)
+        while True:
+            for id_ in itertools.islice(ids, self.io_window - len(fetching)):
+                future = self._take_preloaded(id_) if is_preloaded else None
+                if future is None:
+                    future = self._submit_get(id_, read_data=read_data, raise_missing=raise_missing)
+                fetching.append(future)
+            if not fetching:
+                break
+            self._lock_refresh()
+            yield fetching.popleft().result()
+
+    def has_many(self, ids):
+        """
+        check whether the repo has the objects <ids>.
+
+        returns a bitmap (bytes), bit i (byte i // 8, bit value 1 << i % 8) is set if the repo has ids[i].
+
+        This does not wait for async puts / deletes: the caller knows about the objects it changed itself.
+        """
+        self._lock_refresh()
+
+        def has(id):
+            # note: also called from the I/O threads.
+            return self.store.info("data/" + bin_to_hex(id)).exists
+
+        if self._executor is None:
+            found = map(has, ids)
+        else:
+            found = self._executor.map(has, ids)
+        bitmap = bytearray((len(ids) + 7) // 8)
+        for i, exists in enumerate(found):
+            if exists:
+                bitmap[i // 8] |= 1 << i % 8
+        return bytes(bitmap)
+
+    def _submit_async(self, id, func, *args):
+        self._wait_async(id)  # keep the order of operations on the same object
+        # forget about successfully finished operations, they have nothing to report via async_response.
+        self._async_pending = deque(
+            (id_, future) for id_, future in self._async_pending if not future.done() or future.exception()
+        )
+        running = [future for _, future in self._async_pending if not future.done()]
+        if len(running) >= self.io_window:
+            futures_wait(running, return_when=FIRST_COMPLETED)
+        self._async_pending.append((id, self._executor.submit(func, *args)))
+
+    def _wait_async(self, id=None):
+        """wait until the pending async operations (for object <id> or all) are done"""
+        futures_wait([future for id_, future in self._async_pending if id is None or id_ == id])
 
     def put(self, id, data, wait=True):
         """put a repo object
@@ -495,7 +871,11 @@ def put(self, id, data, wait=True):
             raise IntegrityError(f"More than allowed put data [{data_size} > {MAX_DATA_SIZE}]")
 
         key = "data/" + bin_to_hex(id)
-        self.store.store(key, data)
+        if wait or self._executor is None:
+            self._wait_async(id)
+            self.store.store(key, data)
+        else:
+            self._submit_async(id, self.store.store, key, data)
 
     def delete(self, id, wait=True):
         """delete a repo object
@@ -504,14 +884,22 @@ def delete(self, id, wait=True):
               deal with async results / exceptions later.
         """
         self._lock_refresh()
+        if wait or self._executor is None:
+            self._wait_async(id)
+            self._delete(id)
+        else:
+            self._submit_async(id, self._delete, id)
+
+    def _delete(self, id):
         key = "data/" + bin_to_hex(id)
         try:
             self.store.delete(key)
         except StoreObjectNotFound:
             raise self.ObjectNotFound(id, str(self._location)) from None
+        self.io_limiter.throttle()
 
     def async_response(self, wait=True):
-        """Get one async result (only applies to remote repositories).
+        """Get one async result.
 
         async commands (== calls with wait=False, e.g. delete and put) have no results,
         but may raise exceptions. These async exceptions must get collected later via
@@ -520,9 +908,40 @@ def async_response(self, wait=True):
         If wait=True is given and there are outstanding responses, it will wait for them
         to arrive. With wait=False, it will only return already received responses.
         """
+        if wait:
+            self._wait_async()
+        while True:
+            for entry in self._async_pending:
+                if entry[1].done():
+                    break
+            else:
+                return None
+            self._async_pending.remove(entry)
+            entry[1].result()  # raises the exception of a failed async operation
 
     def preload(self, ids):
-        """Preload objects (only applies to remote repositories)"""
+        """Preload objects (fetch them in the background for a later get_many(..., is_preloaded=True))"""
+        if self._executor is not None:
+            self._preload.extend([id, None] for id in ids)
+            self._fill_preload()
+
+    def _fill_preload(self):
+        for entry in itertools.islice(self._preload, self.io_window):
+            if entry[1] is None:
+                # for preloading objects, the raise_missing behaviour is defined HERE (like for RemoteRepository).
+                entry[1] = self._submit_get(entry[0], raise_missing=False)
+
+    def _take_preloaded(self, id):
+        while self._preload:
+            id_, future = self._preload[0]
+            if id_ == id:
+                self._preload.popleft()
+                self._fill_preload()
+                return future
+            if future is None:
+                break  # id was not preloaded (yet), keep upcoming preloads
+            self._preload.popleft()  # preloaded, but not asked for, forget it
+        return None
 
     def break_lock(self):
         Lock(self.store).break_lock()
@@ -534,6 +953,7 @@ def migrate_lock(self, old_id, new_id):
 
     def get_manifest(self):
         self._lock_refresh()
+        self._wait_async()
         try:
             return self.store.load("config/manifest")
         except StoreObjectNotFound:
@@ -541,10 +961,12 @@ def get_manifest(self):
 
     def put_manifest(self, data):
         self._lock_refresh()
+        self._wait_async()
         return self.store.store("config/manifest", data)
 
     def store_list(self, name, *, deleted=False):
         self._lock_refresh()
+        self._wait_async()
         try:
             return list(self.store.list(name, deleted=deleted))
         except StoreObjectNotFound:
@@ -552,16 +974,20 @@ def store_list(self, name, *, deleted=False):
 
     def store_load(self, name):
         self._lock_refresh()
+        self._wait_async()
         return self.store.load(name)
 
     def store_store(self, name, value):
         self._lock_refresh()
+        self._wait_async()
         return self.store.store(name, value)
 
     def store_delete(self, name, *, deleted=False):
         self._lock_refresh()
+        self._wait_async()
         return self.store.delete(name, deleted=deleted)
 
     def store_move(self, name, new_name=None, *, delete=False, undelete=False, deleted=False):
         self._lock_refresh()
+        self._wait_async()
         return self.store.move(name, new_name, delete=delete, undelete=undelete, deleted=deleted)
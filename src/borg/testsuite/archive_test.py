@@ -1,5 +1,6 @@
 import json
 import os
+import sys
 from collections import OrderedDict
 from datetime import datetime, timezone
 from io import StringIO
@@ -8,13 +9,15 @@
 import pytest
 
 from . import rejected_dotdot_paths
-from ..crypto.key import PlaintextKey
+from ..constants import ROBJ_FILE_STREAM
+from ..crypto.key import PlaintextKey, AESOCBRepoKey
 from ..archive import Archive, CacheChunkBuffer, RobustUnpacker, valid_msgpacked_dict, ITEM_KEYS, Statistics
-from ..archive import BackupOSError, backup_io, backup_io_iter, get_item_uid_gid
+from ..archive import BackupOSError, backup_io, backup_io_iter, get_item_uid_gid, DownloadPipeline
 from ..helpers import msgpack
 from ..item import Item, ArchiveItem
 from ..manifest import Manifest
 from ..platform import uid2user, gid2group, is_win32
+from ..repoobj import RepoObj
 
 
 @pytest.fixture()
@@ -90,6 +93,7 @@ def test_stats_progress_json(stats):
     assert result["path"] == "foo"
     assert result["original_size"] == 20
     assert result["nfiles"] == 1
+    assert result["rpc_window"] is None
 
     out = StringIO()
     stats.show_progress(stream=out, final=True)
@@ -102,6 +106,18 @@ def test_stats_progress_json(stats):
     assert "nfiles" not in result
 
 
+def test_stats_rpc_window(stats):
+    stats.rpc_window = "100 requests (min 4, max 2000), RTT 1.0 ms (base 0.5 ms), 42 responses"
+    assert f"RPC in-flight window: {stats.rpc_window}\n" in str(stats)
+    stats.rpc_window_history = "0s:100 1s:120"
+    data = json.loads(json.dumps(stats.as_dict()))
+    assert data["rpc_window"] == stats.rpc_window
+    assert data["rpc_window_history"] == stats.rpc_window_history
+    for combined in Statistics() + stats, stats + Statistics():
+        assert combined.rpc_window == stats.rpc_window
+        assert combined.rpc_window_history == stats.rpc_window_history
+
+
 @pytest.mark.parametrize(
     "isoformat, expected",
     [
@@ -171,6 +187,29 @@ def test_partial_cache_chunk_buffer():
     assert data == [Item(internal_dict=d) for d in unpacker]
 
 
+def test_download_pipeline_fetch_many_workers():
+    # many objects of one session, parsed (decrypted, decompressed, verified) by several threads.
+    key = AESOCBRepoKey(None)
+    key.init_from_random_data()
+    key.init_ciphers()
+    repo_objs = RepoObj(key)
+    objects = {}
+    for i in range(10000):
+        data = b"object %d" % i
+        id = repo_objs.id_hash(data)
+        objects[id] = repo_objs.format(id, {}, data, ro_type=ROBJ_FILE_STREAM)
+    repository = Mock()
+    repository.get_many = lambda ids, **kwargs: (objects[id] for id in ids)
+    pipeline = DownloadPipeline(repository, repo_objs)
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        fetched = list(pipeline.fetch_many(list(objects), ro_type=ROBJ_FILE_STREAM, workers=8))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert fetched == [b"object %d" % i for i in range(10000)]
+
+
 def make_chunks(items):
     return b"".join(msgpack.packb({"path": item}) for item in items)
 
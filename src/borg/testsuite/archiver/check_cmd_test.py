@@ -36,6 +36,15 @@ def test_check_usage(archivers, request):
     assert "Starting full repository check" in output
     assert "Starting archive consistency check" not in output
 
+    output = cmd(archiver, "check", "-v", "--progress", "--repository-only", "--jobs=4", exit_code=0)
+    assert "Starting full repository check" in output
+    assert "Finished full repository check, no problems found." in output
+    assert "16/16 shards" in output
+
+    output = cmd(archiver, "check", "-v", "--max-read-rate=100000", "--max-ops-rate=10000", exit_code=0)
+    assert "Finished full repository check, no problems found." in output
+    assert "objects/s" in output
+
     output = cmd(archiver, "check", "-v", "--archives-only", exit_code=0)
     assert "Starting full repository check" not in output
     assert "Starting archive consistency check" in output
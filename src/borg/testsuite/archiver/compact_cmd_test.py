@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 import pytest
@@ -5,7 +6,7 @@
 from ...constants import *  # NOQA
 from ...helpers import get_cache_dir
 from ...cache import files_cache_name, discover_files_cache_names
-from . import cmd, create_src_archive, generate_archiver_tests, RK_ENCRYPTION
+from . import cmd, create_regular_file, create_src_archive, generate_archiver_tests, open_repository, RK_ENCRYPTION
 
 pytest_generate_tests = lambda metafunc: generate_archiver_tests(metafunc, kinds="local,remote,binary")  # NOQA
 
@@ -65,6 +66,42 @@ def test_compact_after_deleting_some_archives(archivers, request, stats):
     assert "Finished compaction" in output
 
 
+def test_compact_after_lazy_chunks_index(archivers, request, monkeypatch):
+    archiver = request.getfixturevalue(archivers)
+
+    def repository_ids():
+        with open_repository(archiver) as repository:
+            return {id for id, _ in repository.list()}
+
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    create_src_archive(archiver, "archive1")  # also writes the cached chunks index
+    cmd(archiver, "compact", exit_code=0)
+    count = len(repository_ids())
+    monkeypatch.setenv("BORG_CHUNKS_INDEX_LAZY", "yes")
+    create_regular_file(archiver.input_path, "file1", contents=os.urandom(100000))
+    cmd(archiver, "create", "archive2", "input")
+    cmd(archiver, "delete", "-a", "archive2", exit_code=0)
+    # compact must know the chunks stored with the lazy chunks index, so it can delete them.
+    # (the archives index object was replaced by a new one, thus we only compare the count)
+    cmd(archiver, "compact", exit_code=0)
+    assert len(repository_ids()) == count
+
+
+def test_compact_read_rate_limit(archivers, request):
+    archiver = request.getfixturevalue(archivers)
+
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    create_src_archive(archiver, "archive1")
+    create_src_archive(archiver, "archive2")
+    create_src_archive(archiver, "archive3")
+    cmd(archiver, "delete", "-a", "archive1", exit_code=0)
+
+    output = cmd(archiver, "compact", "-v", "--progress", "--max-read-rate=100000", "--max-ops-rate=10000", exit_code=0)
+    assert "Deleting " in output
+    assert "Computing used chunks 50.0% (" in output
+    assert "Finished compaction" in output
+
+
 def test_compact_index_corruption(archivers, request):
     # see issue #8813 (borg did not write a complete index)
     archiver = request.getfixturevalue(archivers)
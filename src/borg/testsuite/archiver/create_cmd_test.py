@@ -10,13 +10,16 @@
 
 import pytest
 
+from ... import archive as borg_archive
 from ... import platform
+from ...archive import cached_hash
 from ...constants import *  # NOQA
 from ...constants import zeros
 from ...manifest import Manifest
 from ...platform import is_win32, is_darwin
 from ...repository import Repository
 from ...helpers import CommandError, BackupPermissionError
+from ...helpers import fs
 from .. import has_lchflags
 from .. import changedir
 from .. import (
@@ -168,6 +171,138 @@ def test_create_duplicate_root(archivers, request):
     assert sorted(paths) == ["input", "input/a", "input/a/hardlink", "input/b", "input/b/hardlink"]
 
 
+def test_create_jobs(archivers, request):
+    archiver = request.getfixturevalue(archivers)
+    for i in range(10):
+        create_regular_file(archiver.input_path, f"random{i}", contents=os.urandom(300000))
+        create_regular_file(archiver.input_path, f"same{i}", contents=b"same content" * 10000)  # dedup in-flight
+    time.sleep(1)  # the newest file does not get into the files cache, see test_file_status
+    create_regular_file(archiver.input_path, "newest", size=1024)
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    cmd(archiver, "create", "--jobs=4", "--compression=zstd,3", "test", "input")
+    cmd(archiver, "check", "--verify-data")
+    with changedir("output"):
+        cmd(archiver, "extract", "test")
+    assert_dirs_equal("input", "output/input")
+    # the files cache was updated after the chunks were stored:
+    output = cmd(archiver, "create", "--jobs=4", "--list", "test", "input")
+    assert "U input/random9" in output
+    assert "U input/same9" in output
+
+
+def test_create_chunker_threads(archivers, request):
+    archiver = request.getfixturevalue(archivers)
+    create_regular_file(archiver.input_path, "big", contents=os.urandom(20 * 1024 * 1024))  # chunked in parallel
+    create_regular_file(archiver.input_path, "small", contents=os.urandom(300000))
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    chunker_params = "--chunker-params=buzhash,10,16,13,4095"
+    cmd(archiver, "create", chunker_params, "test", "input")
+    cmd(archiver, "create", chunker_params, "--chunker-threads=4", "test-threads", "input")
+    list_format = "--format={path} {num_chunks}{NL}"
+    assert cmd(archiver, "list", "test-threads", list_format) == cmd(archiver, "list", "test", list_format)
+    with changedir("output"):
+        cmd(archiver, "extract", "test-threads")
+    assert_dirs_equal("input", "output/input")
+
+
+def test_create_blocks_cache(archiver, monkeypatch):
+    block_size = 65536
+    create_regular_file(archiver.input_path, "image", contents=os.urandom(8 * block_size))
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    options = ["--chunker-params", f"fixed,{block_size}", "--files-cache=disabled", "--blocks-cache"]
+    monkeypatch.setenv("BORG_FILES_CACHE_SUFFIX", "image")  # use the same blocks cache for test1 and test2
+    cmd(archiver, "create", *options, "test1", "input")
+    # change one block of the image:
+    with open(os.path.join(archiver.input_path, "image"), "r+b") as fd:
+        fd.seek(3 * block_size)
+        fd.write(os.urandom(block_size))
+    hashed = []
+
+    def counting_cached_hash(chunk, id_hash):
+        hashed.append(chunk.meta["size"])
+        return cached_hash(chunk, id_hash)
+
+    monkeypatch.setattr(borg_archive, "cached_hash", counting_cached_hash)
+    cmd(archiver, "create", *options, "test2", "input")
+    assert hashed == [block_size]  # only the changed block got id-hashed
+    with changedir("output"):
+        cmd(archiver, "extract", "test2")
+    assert_dirs_equal("input", "output/input")
+
+
+def test_create_blocks_cache_unchanged(archiver, monkeypatch):
+    # the blocks of a file that is unchanged (according to the files cache) for a while must not expire.
+    block_size = 65536
+    create_regular_file(archiver.input_path, "image", contents=os.urandom(8 * block_size))
+    time.sleep(1)  # the image must not have the newest timestamps, so it gets into the files cache
+    create_regular_file(archiver.input_path, "newer")
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    options = ["--chunker-params", f"fixed,{block_size}", "--blocks-cache"]
+    cmd(archiver, "create", *options, "test", "input")
+    for _ in range(3):  # more runs than BORG_FILES_CACHE_TTL
+        assert "U input/image" in cmd(archiver, "create", "--list", *options, "test", "input")
+    with open(os.path.join(archiver.input_path, "image"), "r+b") as fd:
+        fd.seek(3 * block_size)
+        fd.write(os.urandom(block_size))
+    hashed = []
+
+    def counting_cached_hash(chunk, id_hash):
+        hashed.append(chunk.meta["size"])
+        return cached_hash(chunk, id_hash)
+
+    monkeypatch.setattr(borg_archive, "cached_hash", counting_cached_hash)
+    cmd(archiver, "create", *options, "test", "input")
+    assert hashed.count(block_size) == 1  # only the changed block of the image got id-hashed
+
+
+def test_create_prefetch_threads(archivers, request):
+    archiver = request.getfixturevalue(archivers)
+    for i in range(100):
+        create_regular_file(archiver.input_path, f"dir{i % 7}/sub{i % 3}/file{i}", size=i)
+    create_regular_file(archiver.input_path, "dir3/empty/dir/file")
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    cmd(archiver, "create", "test", "input")
+    cmd(archiver, "create", "--prefetch-threads=4", "test-prefetch", "input")
+    # same items in the same order:
+    assert cmd(archiver, "list", "test-prefetch") == cmd(archiver, "list", "test")
+    with changedir("output"):
+        cmd(archiver, "extract", "test-prefetch")
+    assert_dirs_equal("input", "output/input")
+
+
+def test_create_prefetch_threads_excluded(archivers, request, monkeypatch):
+    archiver = request.getfixturevalue(archivers)
+    if archiver.EXE:
+        pytest.skip("test_create_prefetch_threads_excluded requires an in-process archiver")
+    create_regular_file(archiver.input_path, "dir/file")
+    create_regular_file(archiver.input_path, "dir/file.tmp")
+    create_regular_file(archiver.input_path, "excluded/sub/file")
+    create_regular_file(archiver.input_path, "tagged/sub/file")
+    create_regular_file(archiver.input_path, "tagged/.NOBACKUP")
+    fetched = {}
+    fetch_dir = fs.fetch_dir
+
+    def recording_fetch_dir(path, **kwargs):
+        fetched[path] = st, entries = fetch_dir(path, **kwargs)
+        return st, entries
+
+    monkeypatch.setattr(fs, "fetch_dir", recording_fetch_dir)
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    options = ["--prefetch-threads=4", "--exclude=input/excluded", "--exclude=*.tmp", "--exclude-if-present=.NOBACKUP"]
+    cmd(archiver, "create", *options, "test", "input")
+    assert cmd(archiver, "list", "test", "--short").splitlines() == ["input", "input/dir", "input/dir/file"]
+    # excluded directories are not prefetched, excluded entries are not stat-ed, tagged directories are not listed:
+    assert not [path for path in fetched if path.startswith("input/excluded")]
+    assert {name for name, st in fetched["input/dir"][1] if st is not None} == {"file"}
+    assert fetched["input/tagged"][1] is None
+    assert "input/tagged/sub" not in fetched
+    # with --one-file-system, directories on the same filesystem still get prefetched:
+    fetched.clear()
+    cmd(archiver, "create", *options, "--one-file-system", "test-x", "input")
+    assert "input/dir" in fetched
+    assert cmd(archiver, "list", "test-x", "--short") == cmd(archiver, "list", "test", "--short")
+
+
 def test_create_unreadable_parent(archiver):
     parent_dir = os.path.join(archiver.input_path, "parent")
     root_dir = os.path.join(archiver.input_path, "parent", "root")
@@ -664,6 +799,37 @@ def test_file_status(archivers, request):
     assert "A input/file2" in output
 
 
+def test_file_status_files_cache_rebuild(archivers, request, monkeypatch):
+    archiver = request.getfixturevalue(archivers)
+    create_regular_file(archiver.input_path, "file1", size=1024 * 80)
+    time.sleep(1)  # file2 must have newer timestamps than file1
+    create_regular_file(archiver.input_path, "file2", size=1024 * 80)
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    cmd(archiver, "create", "test", "input")
+    # no local files cache for this suffix, so it is rebuilt from the previous archive:
+    monkeypatch.setenv("BORG_FILES_CACHE_SUFFIX", "rebuild")
+    output = cmd(archiver, "create", "--list", "--jobs=2", "test", "input")
+    assert "U input/file1" in output
+    assert "A input/file2" in output
+
+
+def test_file_status_files_cache_table(archivers, request, monkeypatch):
+    archiver = request.getfixturevalue(archivers)
+    monkeypatch.setenv("BORG_FILES_CACHE_BACKEND", "mmap")
+    create_regular_file(archiver.input_path, "file1", size=1024 * 80)
+    time.sleep(1)  # file2 must have newer timestamps than file1
+    create_regular_file(archiver.input_path, "file2", size=1024 * 80)
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    output = cmd(archiver, "create", "--list", "test", "input")
+    assert "A input/file1" in output
+    assert "A input/file2" in output
+    output = cmd(archiver, "create", "--list", "test", "input")
+    assert "U input/file1" in output
+    assert "A input/file2" in output
+    output = cmd(archiver, "create", "--list", "test", "input")
+    assert "U input/file1" in output
+
+
 @pytest.mark.skipif(
     is_win32, reason="ctime attribute is file creation time on Windows"
 )  # see https://docs.python.org/3/library/os.html#os.stat_result.st_ctime
@@ -700,6 +866,37 @@ def test_file_status_ms_cache_mode(archivers, request):
     assert "U input/file1" in output
 
 
+def test_file_status_moved_cache_mode(archivers, request):
+    """test that renamed files are recognized as unmodified in ctime,size,inode,moved cache_mode"""
+    archiver = request.getfixturevalue(archivers)
+    create_regular_file(archiver.input_path, "dir1/file1", size=10)
+    time.sleep(1)  # file2 must have newer timestamps than file1
+    create_regular_file(archiver.input_path, "file2", size=10)
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    cmd(archiver, "create", "--list", "--files-cache=ctime,size,inode,moved", "test", "input")
+    os.rename("input/dir1", "input/dir2")
+    output = cmd(archiver, "create", "--list", "--files-cache=ctime,size,inode,moved", "test", "input")
+    assert "U input/dir2/file1" in output
+    os.rename("input/dir2", "input/dir3")
+    output = cmd(archiver, "create", "--list", "--files-cache=ctime,size,inode", "test", "input")
+    assert "A input/dir3/file1" in output
+
+
+def test_file_status_lazy_chunks_index(archivers, request, monkeypatch):
+    """test that unchanged files are recognized with a lazy chunks index"""
+    archiver = request.getfixturevalue(archivers)
+    create_regular_file(archiver.input_path, "file1", size=10)
+    time.sleep(1)  # file2 must have newer timestamps than file1
+    create_regular_file(archiver.input_path, "file2", size=10)
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    monkeypatch.setenv("BORG_CHUNKS_INDEX_LAZY", "yes")
+    output = cmd(archiver, "create", "--list", "test", "input")
+    assert "A input/file1" in output
+    output = cmd(archiver, "create", "--list", "test", "input")
+    assert "U input/file1" in output
+    cmd(archiver, "check")
+
+
 def test_file_status_rc_cache_mode(archivers, request):
     """test that files get rechunked unconditionally in rechunk,ctime cache mode"""
     archiver = request.getfixturevalue(archivers)
@@ -795,6 +992,12 @@ def test_create_json(archivers, request):
     assert isinstance(archive["duration"], float)
     assert len(archive["id"]) == 64
     assert "stats" in archive
+    if archiver.get_kind() == "remote":
+        assert archive["stats"]["rpc_window"].endswith(" responses")
+        assert archive["stats"]["rpc_window_history"].startswith("0s:")
+    else:
+        assert archive["stats"]["rpc_window"] is None
+        assert archive["stats"]["rpc_window_history"] is None
 
 
 def test_create_topical(archivers, request):
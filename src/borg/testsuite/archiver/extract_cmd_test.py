@@ -328,6 +328,18 @@ def test_extract_hardlinks_twice(archivers, request):
         assert os.stat("input/b/hardlink").st_nlink == 2
 
 
+def test_extract_remote_connections(remote_archiver):
+    archiver = remote_archiver
+    for i in range(20):
+        create_regular_file(archiver.input_path, f"many/file{i}", size=1024 * 80)
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    cmd(archiver, "create", "--remote-connections=3", "test", "input")
+    with changedir("output"):
+        cmd(archiver, "extract", "--remote-connections=3", "test")
+    assert_dirs_equal("input", "output/input")
+    cmd(archiver, "check", "--remote-connections=3")
+
+
 def test_extract_include_exclude(archivers, request):
     archiver = request.getfixturevalue(archivers)
     cmd(archiver, "repo-create", RK_ENCRYPTION)
@@ -1,8 +1,14 @@
 import json
 import os
 
+import pytest
+from borgstore.store import ItemInfo
+
 from ...constants import *  # NOQA
+from ...helpers import bin_to_hex, hex_to_bin
+from ...manifest import Archives
 from . import cmd, checkts, create_src_archive, create_regular_file, src_dir, generate_archiver_tests, RK_ENCRYPTION
+from . import open_repository
 
 pytest_generate_tests = lambda metafunc: generate_archiver_tests(metafunc, kinds="local,remote,binary")  # NOQA
 
@@ -19,6 +25,61 @@ def test_repo_list_glob(archivers, request):
     assert "something-else" not in output
 
 
+def test_repo_list_archives_index(archivers, request, monkeypatch):
+    archiver = request.getfixturevalue(archivers)
+    if archiver.EXE:
+        pytest.skip("test_repo_list_archives_index requires an in-process archiver")
+
+    def index_names():
+        with open_repository(archiver) as repository:
+            names = [ItemInfo(*info).name for info in repository.store_list("cache")]  # RPC gives tuples
+            return [name for name in names if name.startswith("archives.")]
+
+    def index_ids():
+        return {hex_to_bin(name.removeprefix("archives.")) for name in index_names()}
+
+    def object_ids():
+        with open_repository(archiver) as repository:
+            return {id for id, _ in repository.list()}
+
+    cmd(archiver, "repo-create", RK_ENCRYPTION)
+    cmd(archiver, "create", "--comment", "comment 1", "test-1", src_dir)
+    replaced_ids = index_ids()
+    cmd(archiver, "create", "test-2", src_dir)
+    assert len(index_names()) == 1  # create updates (and merges) the index
+    assert not replaced_ids & object_ids()  # the replaced index object was deleted
+    output = cmd(archiver, "repo-list", "--format", "{name} {comment}{NL}")
+    assert output == "test-1 comment 1" + os.linesep + "test-2 " + os.linesep
+    # a reference to a missing index object is ignored, listing does not write to the repo:
+    with open_repository(archiver) as repository:
+        repository.store_store("cache/archives." + bin_to_hex(bytes(32)), b"")
+    assert cmd(archiver, "repo-list", "--format", "{name} {comment}{NL}") == output
+    assert len(index_names()) == 2
+    # listing must not fetch the archive metadata from the repo any more:
+    get_archive_meta = Archives._get_archive_meta
+    monkeypatch.setattr(Archives, "_get_archive_meta", lambda self, id: pytest.fail("archive metadata fetched"))
+    assert cmd(archiver, "repo-list", "--format", "{name} {comment}{NL}") == output
+    cmd(archiver, "delete", "-a", "test-1")
+    assert len(index_names()) == 1  # the reference to the missing index object was removed
+    cmd(archiver, "undelete", "-a", "test-1")
+    assert cmd(archiver, "repo-list", "--format", "{name} {comment}{NL}") == output
+    cmd(archiver, "delete", "-a", "test-2")
+    cmd(archiver, "compact")
+    assert cmd(archiver, "repo-list", "--format", "{name}{NL}") == "test-1" + os.linesep
+    # an incomplete index gets completed by listing, but only stored by commands that write:
+    monkeypatch.setattr(Archives, "_get_archive_meta", get_archive_meta)
+    names = index_names()
+    with open_repository(archiver) as repository:
+        for name in names:
+            repository.store_delete("cache/" + name)
+    assert cmd(archiver, "repo-list", "--format", "{name}{NL}") == "test-1" + os.linesep
+    assert index_names() == []
+    cmd(archiver, "rename", "test-1", "test-3")
+    assert len(index_names()) == 1
+    cmd(archiver, "compact", "--stats")
+    assert index_ids() <= object_ids()  # compact does not delete the index object
+
+
 def test_archives_format(archivers, request):
     archiver = request.getfixturevalue(archivers)
     cmd(archiver, "repo-create", RK_ENCRYPTION)
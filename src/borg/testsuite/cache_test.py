@@ -1,12 +1,23 @@
 import os
+import stat
+import threading
+from types import SimpleNamespace
 
 import pytest
 
 from .hashindex_test import H
 from .crypto.key_test import TestKey
-from ..archive import Statistics
-from ..cache import AdHocWithFilesCache
+from .. import cache as cache_module
+from ..archive import ChunksProcessor, Statistics
+from ..chunkers import Chunk
+from ..constants import CH_DATA
+from ..cache import AdHocWithFilesCache, FileCacheEntry, build_chunkindex_from_repo, delete_chunkindex_cache
+from ..cache import list_chunkindex_hashes, load_chunkindex_from_repo_cache
+from ..cache import read_chunkindex_from_local_cache, write_chunkindex_to_repo_cache
+from ..checksums import xxh64
 from ..crypto.key import AESOCBRepoKey
+from ..hashindex import ChunkIndex, ChunkIndexEntry
+from ..item import ChunkListEntry, Item
 from ..manifest import Manifest
 from ..repository import Repository
 
@@ -37,6 +48,54 @@ def cache(self, repository, key, manifest):
     def test_does_not_contain_manifest(self, cache):
         assert not cache.seen_chunk(Manifest.MANIFEST_ID)
 
+    def test_chunkindex_local_cache(self, cache, repository, monkeypatch):
+        cache.chunks  # merged from the repo-cached chunk indexes, also stored locally
+        hashes = set(list_chunkindex_hashes(repository))
+        assert read_chunkindex_from_local_cache(repository, ChunkIndex()) == hashes
+        loaded = []
+        load_chunkindex_from_repo_cache = cache_module.load_chunkindex_from_repo_cache
+        monkeypatch.setattr(
+            cache_module,
+            "load_chunkindex_from_repo_cache",
+            lambda repository, hash: loaded.append(hash) or load_chunkindex_from_repo_cache(repository, hash),
+        )
+        # only the new incremental chunk index needs to be loaded from the repo
+        chunks = ChunkIndex()
+        chunks[H(2)] = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=0)
+        new_hash = write_chunkindex_to_repo_cache(repository, chunks)
+        chunks = build_chunkindex_from_repo(repository)
+        assert loaded == [new_hash]
+        assert H(2) in chunks
+        assert read_chunkindex_from_local_cache(repository, ChunkIndex()) == hashes | {new_hash}
+        # nothing new in the repo, nothing to load
+        loaded.clear()
+        chunks = build_chunkindex_from_repo(repository)
+        assert loaded == []
+        assert H(2) in chunks
+        # the repo-cached chunk indexes were replaced (e.g. by compact), the local copy is outdated
+        delete_chunkindex_cache(repository)
+        chunks = ChunkIndex()
+        chunks[H(3)] = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=0)
+        new_hash = write_chunkindex_to_repo_cache(repository, chunks)
+        chunks = build_chunkindex_from_repo(repository)
+        assert loaded == [new_hash]
+        assert H(2) not in chunks and H(3) in chunks
+        assert read_chunkindex_from_local_cache(repository, ChunkIndex()) == {new_hash}
+
+    def test_chunkindex_mmap(self, repository, manifest, monkeypatch):
+        monkeypatch.setenv("BORG_CHUNKS_INDEX_BACKEND", "mmap")
+        cache = AdHocWithFilesCache(manifest)
+        assert cache.chunks.is_mmap
+        assert cache.add_chunk(H(3), {}, b"5678", stats=Statistics()) == (H(3), 4)
+        assert cache.reuse_chunk(H(3), 4, Statistics()) == (H(3), 4)
+        monkeypatch.setenv("BORG_CHUNKS_INDEX_BACKEND", "memory")
+        monkeypatch.setattr(cache_module, "CHUNKINDEX_MMAP_THRESHOLD", 0)
+        assert not build_chunkindex_from_repo(repository).is_mmap
+        monkeypatch.delenv("BORG_CHUNKS_INDEX_BACKEND")
+        assert build_chunkindex_from_repo(repository).is_mmap  # above the threshold
+        # the slow way also estimates the chunks count from the cached chunk indexes:
+        assert build_chunkindex_from_repo(repository, disable_caches=True).is_mmap
+
     def test_seen_chunk_add_chunk_size(self, cache):
         assert cache.add_chunk(H(1), {}, b"5678", stats=Statistics()) == (H(1), 4)
 
@@ -48,6 +107,197 @@ def test_existing_reuse_after_add_chunk(self, cache):
         assert cache.add_chunk(H(1), {}, b"5678", stats=Statistics()) == (H(1), 4)
         assert cache.reuse_chunk(H(1), 4, Statistics()) == (H(1), 4)
 
+    def test_lazy_chunks(self, repository, manifest, monkeypatch):
+        monkeypatch.setenv("BORG_CHUNKS_INDEX_LAZY", "yes")
+        assert not AdHocWithFilesCache(manifest).chunks_lazy  # only if the caller allows it
+        hashes = list_chunkindex_hashes(repository)
+        cache = AdHocWithFilesCache(manifest, lazy_chunks=True)
+        queried = []
+        has_many = repository.has_many
+        monkeypatch.setattr(repository, "has_many", lambda ids: queried.append(ids) or has_many(ids))
+        assert cache.chunks_lazy and len(cache.chunks) == 0  # nothing listed from the repo
+        assert cache.seen_chunks([H(1), H(2), H(1)]) == [True, False, True]
+        assert queried == [[], [H(1), H(2)]]  # one query for all unknown chunks
+        assert cache.seen_chunk(H(1), 4) and not cache.seen_chunk(H(2))
+        assert cache.add_chunk(H(2), {}, b"5678", stats=Statistics()) == (H(2), 4)
+        assert cache.seen_chunks([H(1), H(2)]) == [True, True]
+        assert len(queried) == 2  # known present or missing chunks are not queried again
+        entry = FileCacheEntry(age=0, inode=1, size=4, ctime=0, mtime=0, chunks=[(H(5), 4)])
+        cache.decompress_entry(cache.compress_entry(entry))  # H(5) is not known to be in the repo
+        cache.close()
+        # only the chunks known to be in the repo were written, not the incomplete index:
+        (new_hash,) = set(list_chunkindex_hashes(repository)) - set(hashes)
+        cached = ChunkIndex()
+        cached.merge_serialized(load_chunkindex_from_repo_cache(repository, new_hash))
+        assert {id for id, _ in cached.iteritems()} == {H(1), H(2)}
+
+    def test_lazy_chunks_readahead(self, repository, manifest, key, monkeypatch):
+        monkeypatch.setenv("BORG_CHUNKS_INDEX_LAZY", "yes")
+        cache = AdHocWithFilesCache(manifest, lazy_chunks=True)
+        queried = []
+        has_many = repository.has_many
+        monkeypatch.setattr(repository, "has_many", lambda ids: queried.append(ids) or has_many(ids))
+        chunks = [Chunk(b"chunk%03d" % i, size=8, allocation=CH_DATA) for i in range(250)]
+        processor = ChunksProcessor(key=key, cache=cache, add_item=None, rechunkify=False)
+        item = Item(path="file")
+        processor.process_file_chunks(item, cache, Statistics(), False, iter(chunks))
+        # one has_many call per readahead group, not one per chunk:
+        assert [len(ids) for ids in queried] == [0, 100, 100, 50]
+        assert [entry.id for entry in item.chunks] == [key.id_hash(chunk.data) for chunk in chunks]
+        cache.close()
+
+    def test_lazy_chunks_files_cache(self, repository, manifest, monkeypatch):
+        monkeypatch.setenv("BORG_CHUNKS_INDEX_LAZY", "yes")
+        cache = AdHocWithFilesCache(manifest, lazy_chunks=True)
+        entry = FileCacheEntry(age=0, inode=1, size=8, ctime=0, mtime=0, chunks=[(H(1), 4), (H(5), 4)])
+        # the files cache can refer to chunks we did not check yet:
+        assert cache.decompress_entry(cache.compress_entry(entry)) == entry
+        assert cache.seen_chunks([H(1), H(5)]) == [True, False]
+
+    def test_pending_chunks(self, cache):
+        cache.workers = 2
+        stats = Statistics()
+        assert cache.add_chunk(H(3), {}, b"5678", stats=stats, wait=False) == (H(3), 4)
+        assert cache.seen_chunk(H(3), 4)  # pending chunks are deduplicated
+        assert cache.add_chunk(H(3), {}, b"5678", stats=stats, wait=False) == (H(3), 4)
+        stored = []
+        cache.when_chunks_stored(lambda: stored.append(True))
+        cache.flush_chunks()
+        assert stored == [True]
+        assert H(3) in cache.chunks
+        assert cache.repository.get(H(3))
+
+    def test_discard_pending_chunks(self, cache, monkeypatch):
+        cache.workers = 2
+        release = threading.Event()
+        compress = cache.repo_objs.compress
+        monkeypatch.setattr(cache.repo_objs, "compress", lambda *args, **kw: release.wait() and compress(*args, **kw))
+        cache.add_chunk(H(4), {}, b"5678", stats=Statistics(), wait=False)
+        assert cache.seen_chunk(H(4))
+        release.set()
+        cache._discard_pending_chunks()
+        assert not cache.seen_chunk(H(4))
+
+    def test_blocks_cache(self, manifest):
+        cache = AdHocWithFilesCache(manifest, archive_name="test")
+        checksum = cache.blocks_checksum(b"1234")
+        assert checksum != xxh64(b"1234")  # keyed
+        cache.memorize_blocks(H(5), {checksum: ChunkListEntry(H(1), 4)})
+        assert cache.known_blocks(H(5)) == {checksum: (H(1), 4)}
+        assert cache.known_blocks(H(6)) == {}
+        cache.close()
+        cache = AdHocWithFilesCache(manifest, archive_name="test")
+        assert cache.known_blocks(H(5)) == {checksum: (H(1), 4)}
+        cache.close()
+        # the blocks of a file that was not read again expire, unless they get touched (file unchanged):
+        cache = AdHocWithFilesCache(manifest, archive_name="test")
+        cache.touch_blocks(H(5))
+        cache.close()
+        for _ in range(2):  # BORG_FILES_CACHE_TTL
+            cache = AdHocWithFilesCache(manifest, archive_name="test")
+            assert cache.known_blocks(H(5)) == {checksum: (H(1), 4)}
+            cache.close()
+        cache = AdHocWithFilesCache(manifest, archive_name="test")
+        assert cache.known_blocks(H(5)) == {}
+        cache.close()
+
+    def test_files_cache_table(self, manifest, tmp_path, monkeypatch):
+        monkeypatch.setenv("BORG_FILES_CACHE_BACKEND", "mmap")
+        path = tmp_path / "file"
+        path.write_bytes(b"1234")
+        st = os.stat(path)
+        cache = AdHocWithFilesCache(manifest, archive_name="test", cache_mode="cis")
+        assert cache.file_known_and_unchanged(b"file", H(5), st) == (False, None)
+        cache.add_chunk(H(3), {}, b"1234", stats=Statistics())
+        cache.memorize_file(b"file", H(5), st, [ChunkListEntry(H(3), 4)])
+        assert cache.file_known_and_unchanged(b"file", H(5), st) == (True, [(H(3), 4)])
+        cache.close()
+        assert (cache.path / cache.files_table_name()).exists()
+        cache = AdHocWithFilesCache(manifest, archive_name="test", cache_mode="cis")
+        # the file's ctime is the newest one we have seen, so it was not persisted:
+        assert cache.file_known_and_unchanged(b"file", H(5), st) == (False, None)
+        cache.close()
+
+    @pytest.mark.parametrize("backend", ["msgpack", "mmap"])
+    def test_files_cache_moved(self, manifest, monkeypatch, backend):
+        monkeypatch.setenv("BORG_FILES_CACHE_BACKEND", backend)
+
+        def st(ino, cmtime, ctime=None):
+            ctime = cmtime if ctime is None else ctime
+            return SimpleNamespace(st_mode=stat.S_IFREG, st_ino=ino, st_size=4, st_ctime_ns=ctime, st_mtime_ns=cmtime)
+
+        def open_cache(cache_mode="cisv"):
+            return AdHocWithFilesCache(manifest, archive_name="test", cache_mode=cache_mode, start_backup=10**18)
+
+        cache = open_cache()
+        cache.add_chunk(H(3), {}, b"1234", stats=Statistics())
+        cache.add_chunk(H(4), {}, b"5678", stats=Statistics())
+        cache.memorize_file(b"a", H(10), st(1, 1000), [ChunkListEntry(H(3), 4)])
+        cache.memorize_file(b"b", H(11), st(2, 1000), [ChunkListEntry(H(3), 4)])
+        cache.memorize_file(b"c", H(12), st(2, 1000), [ChunkListEntry(H(4), 4)])  # ambiguous
+        cache.memorize_file(b"z", H(19), st(9, 3000), [ChunkListEntry(H(3), 4)])  # newest, discarded
+        cache.close()
+
+        cache = open_cache("cis")
+        assert cache.file_known_and_unchanged(b"x", H(20), st(1, 1000, 2000)) == (False, None)
+        cache.close()
+
+        cache = open_cache()
+        # a was renamed to x (updating the ctime):
+        assert cache.file_known_and_unchanged(b"x", H(20), st(1, 1000, 2000)) == (True, [(H(3), 4)])
+        assert cache.file_known_and_unchanged(b"x", H(20), st(1, 1000, 2000)) == (True, [(H(3), 4)])
+        assert cache.file_known_and_unchanged(b"y", H(21), st(1, 1001)) == (False, None)
+        assert cache.file_known_and_unchanged(b"y", H(21), st(2, 1000)) == (False, None)
+        cache.close()
+
+    def test_files_cache_journal(self, manifest, monkeypatch):
+        monkeypatch.setattr(AdHocWithFilesCache, "FILES_JOURNAL_RATIO", 100)
+
+        def st(ino, cmtime):
+            return SimpleNamespace(st_mode=stat.S_IFREG, st_ino=ino, st_size=4, st_ctime_ns=cmtime, st_mtime_ns=cmtime)
+
+        def open_cache():
+            return AdHocWithFilesCache(manifest, archive_name="test", cache_mode="cis", start_backup=10**18)
+
+        cache = open_cache()
+        cache.add_chunk(H(3), {}, b"1234", stats=Statistics())
+        cache.memorize_file(b"a", H(10), st(1, 1000), [ChunkListEntry(H(3), 4)])
+        cache.memorize_file(b"b", H(11), st(2, 3000), [ChunkListEntry(H(3), 4)])  # newest, discarded
+        cache.close()
+        base_path = cache.path / cache.files_cache_name()
+        journal_path = cache.path / cache.files_journal_name()
+        base_mtime = base_path.stat().st_mtime_ns
+        assert not journal_path.exists()
+
+        cache = open_cache()
+        assert cache.file_known_and_unchanged(b"a", H(10), st(1, 1000)) == (True, [(H(3), 4)])
+        assert cache.file_known_and_unchanged(b"b", H(11), st(2, 3000)) == (False, None)
+        cache.memorize_file(b"c", H(12), st(3, 2000), [ChunkListEntry(H(3), 4)])
+        cache.memorize_file(b"d", H(13), st(4, 3000), [ChunkListEntry(H(3), 4)])  # newest, discarded
+        cache.close()
+        assert base_path.stat().st_mtime_ns == base_mtime
+        assert journal_path.exists()
+
+        cache = open_cache()
+        assert cache.file_known_and_unchanged(b"c", H(12), st(3, 2000)) == (True, [(H(3), 4)])
+        assert cache.decompress_entry(cache.files[H(10)]).age == 1
+        assert H(13) not in cache.files
+        cache.memorize_file(b"e", H(14), st(5, 3000), [ChunkListEntry(H(3), 4)])  # newest, discarded
+        cache.close()  # a was not seen, c was seen unchanged
+
+        cache = open_cache()
+        assert cache.decompress_entry(cache.files[H(10)]).age == 2
+        assert cache.decompress_entry(cache.files[H(12)]).age == 1
+        cache.FILES_JOURNAL_RATIO = 0  # compact the journal
+        cache.close()
+        assert base_path.stat().st_mtime_ns != base_mtime
+        assert not journal_path.exists()
+
+        cache = open_cache()
+        assert H(10) not in cache.files  # reached the TTL
+        assert cache.decompress_entry(cache.files[H(12)]).age == 2
+        cache.close()
+
     def test_files_cache(self, cache):
         st = os.stat(".")
         assert cache.file_known_and_unchanged(b"foo", bytes(32), st) == (False, None)
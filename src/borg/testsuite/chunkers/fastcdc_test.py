@@ -0,0 +1,106 @@
+from hashlib import sha256
+from io import BytesIO
+import os
+
+from . import cf
+from ...chunkers import ChunkerFastCDC, get_chunker
+from ...chunkers.fastcdc import fastcdc_get_table
+from ...constants import *  # NOQA
+from ...helpers import hex_to_bin
+
+
+# from os.urandom(32)
+key0 = hex_to_bin("ad9f89095817f0566337dc9ee292fcd59b70f054a8200151f1df5f21704824da")
+key1 = hex_to_bin("f1088c7e9e6ae83557ad1558ff36c44a369ea719d1081c29684f52ffccb72cb8")
+
+
+def H(data):
+    return sha256(data).digest()
+
+
+def test_chunkpoints_fastcdc_unchanged():
+    def twist(size):
+        x = 1
+        a = bytearray(size)
+        for i in range(size):
+            x = (x * 1103515245 + 12345) & 0x7FFFFFFF
+            a[i] = x & 0xFF
+        return a
+
+    data = twist(100000)
+
+    runs = []
+    for minexp in (6, 7, 11, 12):
+        for maxexp in (15, 17):
+            for maskbits in (12, 13, 15):
+                if not (minexp <= maskbits <= maxexp):
+                    continue
+                for key in (key0, key1):
+                    fh = BytesIO(data)
+                    chunker = ChunkerFastCDC(key, minexp, maxexp, maskbits)
+                    chunks = [H(c) for c in cf(chunker.chunkify(fh, -1))]
+                    runs.append(H(b"".join(chunks)))
+
+    # The "correct" hash below matches the existing chunker behavior.
+    # Future chunker optimisations must not change this, or existing repos will bloat.
+    overall_hash = H(b"".join(runs))
+    print(overall_hash.hex())
+    assert overall_hash == hex_to_bin("a19ee9591bd04c7d37e0a1675e3d21ab6a285a99102ec9e89ede19586090ccd9")
+
+
+def test_fastcdc_chunksize_distribution():
+    data = os.urandom(1048576)
+    min_exp, max_exp, mask = 10, 16, 14  # chunk size target 16kiB, clip at 1kiB and 64kiB
+    chunker = ChunkerFastCDC(key0, min_exp, max_exp, mask)
+    f = BytesIO(data)
+    chunks = cf(chunker.chunkify(f))
+    del chunks[-1]  # get rid of the last chunk, it can be smaller than 2**min_exp
+    chunk_sizes = [len(chunk) for chunk in chunks]
+    chunks_count = len(chunks)
+    min_chunksize_observed = min(chunk_sizes)
+    max_chunksize_observed = max(chunk_sizes)
+    min_count = sum(int(size == 2**min_exp) for size in chunk_sizes)
+    max_count = sum(int(size == 2**max_exp) for size in chunk_sizes)
+    print(
+        f"count: {chunks_count} min: {min_chunksize_observed} max: {max_chunksize_observed} "
+        f"min count: {min_count} max count: {max_count}"
+    )
+    # usually there will about 64 chunks
+    assert 32 < chunks_count < 128
+    # chunks always must be between min and max (clipping must work):
+    assert min_chunksize_observed >= 2**min_exp
+    assert max_chunksize_observed <= 2**max_exp
+    # normalized chunking: most chunks are near the target size, not clipped at min/max size:
+    assert min_count < 5
+    assert max_count < 5
+
+
+def test_fastcdc_content_defined():
+    # inserting some bytes at the beginning must only change the first chunk(s).
+    data = os.urandom(1048576)
+    chunks = cf(ChunkerFastCDC(key0, 10, 16, 13).chunkify(BytesIO(data)))
+    shifted_chunks = cf(ChunkerFastCDC(key0, 10, 16, 13).chunkify(BytesIO(b"inserted" + data)))
+    assert b"".join(shifted_chunks) == b"inserted" + data
+    assert len(set(chunks) - set(shifted_chunks)) <= 2
+
+
+def test_fastcdc_small_data():
+    assert cf(ChunkerFastCDC(key0, 6, 16, 13).chunkify(BytesIO(b""))) == []
+    assert cf(ChunkerFastCDC(key0, 6, 16, 13).chunkify(BytesIO(b"foobar"))) == [b"foobar"]
+    assert cf(ChunkerFastCDC(key0, 6, 16, 13).chunkify(BytesIO(b"\0" * 100))) == [100]
+
+
+def test_fastcdc_get_chunker():
+    chunker = get_chunker(CH_FASTCDC, 10, 16, 13, key=None, sparse=False)
+    assert isinstance(chunker, ChunkerFastCDC)
+    data = os.urandom(100000)
+    assert b"".join(cf(chunker.chunkify(BytesIO(data)))) == data
+
+
+def test_fastcdc_table():
+    table0 = fastcdc_get_table(key0)
+    assert len(table0) == 256
+    assert all(isinstance(value, int) and 0 <= value < 2**64 for value in table0)
+    # deterministic: same key produces same table, different keys produce different tables
+    assert table0 == fastcdc_get_table(key0)
+    assert table0 != fastcdc_get_table(key1)
@@ -0,0 +1,71 @@
+from io import BytesIO
+import os
+
+import pytest
+
+from . import cf
+from ...chunkers import Chunker, ChunkerParallel, get_chunker
+from ...constants import *  # NOQA
+
+
+def twist(size):
+    x = 1
+    a = bytearray(size)
+    for i in range(size):
+        x = (x * 1103515245 + 12345) & 0x7FFFFFFF
+        a[i] = x & 0xFF
+    return bytes(a)
+
+
+@pytest.mark.parametrize("region_size", [4096, 65536, 1000000])
+@pytest.mark.parametrize(
+    "params",
+    [
+        (6, 12, 8, 31),  # many small chunks, windows crossing region borders
+        (10, 16, 13, 4095),
+        (12, 16, 16, 4095),  # most chunks cut at max_size
+    ],
+)
+def test_parallel_identical_chunks(region_size, params):
+    data = os.urandom(2000000) + bytes(300000) + twist(100000)
+    expected = cf(Chunker(0, *params).chunkify(BytesIO(data)))
+    chunker = ChunkerParallel(0, *params, threads=3, region_size=region_size)
+    assert cf(chunker.chunkify(BytesIO(data))) == expected
+    # the chunker can be reused
+    assert cf(chunker.chunkify(BytesIO(data[:100000]))) == cf(Chunker(0, *params).chunkify(BytesIO(data[:100000])))
+
+
+@pytest.mark.parametrize("size", [0, 1, 100, 4095, 4096, 5000, 65536, 70000])
+def test_parallel_small_data(size):
+    data = os.urandom(size)
+    params = (10, 16, 13, 4095)
+    expected = cf(Chunker(0, *params).chunkify(BytesIO(data)))
+    assert cf(ChunkerParallel(0, *params, threads=2, region_size=4096).chunkify(BytesIO(data))) == expected
+
+
+def test_parallel_file(tmpdir):
+    fn = str(tmpdir / "file")
+    with open(fn, "wb") as fd:
+        fd.write(os.urandom(3000000))
+    params = (10, 16, 13, 4095)
+    with open(fn, "rb") as fd:
+        expected = cf(Chunker(0, *params).chunkify(fd))
+    chunker = get_chunker(CH_BUZHASH, *params, threads=2)
+    assert isinstance(chunker, ChunkerParallel)
+    chunker.region_size = chunker.parallel_min_size = 100000
+    fh = os.open(fn, os.O_RDONLY)
+    try:
+        assert cf(chunker.chunkify(None, fh)) == expected
+    finally:
+        os.close(fh)
+
+
+def test_cut_candidates():
+    data = os.urandom(100000)
+    chunker = Chunker(0, 6, 12, 8, 31)
+    candidates = chunker.cut_candidates(data)
+    assert len(candidates) > 0
+    assert all(0 <= c <= len(data) - 31 for c in candidates)
+    # candidates only depend on the data in the window:
+    assert [c - 1000 for c in candidates if c >= 1000] == chunker.cut_candidates(data[1000:])
+    assert chunker.cut_candidates(data[:30]) == []
@@ -1,6 +1,7 @@
 import argparse
 import os
 import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
@@ -48,6 +49,18 @@ def test_lz4_buffer_allocation(monkeypatch):
     assert incompressible_data == c.decompress(meta, cdata)[1]
 
 
+@pytest.mark.parametrize("c_type", ["lz4", "zstd"])
+def test_compression_threads(c_type):
+    # the compressors release the GIL, each thread must use its own buffer
+    datas = [os.urandom(100) * (1000 + i) for i in range(32)]
+    c = get_compressor(name=c_type)
+    expected = [c.compress({}, data) for data in datas]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(10):
+            assert list(executor.map(lambda data: c.compress({}, data), datas)) == expected
+            assert list(executor.map(lambda mc: c.decompress(dict(mc[0]), mc[1])[1], expected)) == datas
+
+
 @pytest.mark.parametrize("invalid_cdata", [b"\xff\xfftotalcrap", b"\x08\x00notreallyzlib"])
 def test_autodetect_invalid(invalid_cdata):
     with pytest.raises(ValueError):
@@ -1,5 +1,7 @@
+import sys
 import tempfile
 from binascii import a2b_base64
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock
 
 import pytest
@@ -219,6 +221,36 @@ def test_roundtrip(self, key):
         decrypted = loaded_key.decrypt(id, encrypted)
         assert decrypted == plaintext
 
+    def test_decrypt_sessions(self, key):
+        # decrypting objects from multiple sessions, in any order, must use the correct session cipher.
+        if not isinstance(key, AEADKeyBase):
+            pytest.skip("only AEAD keys use session keys")
+        objects = []
+        for session in range(3):
+            key.init_ciphers()
+            for i in range(3):
+                plaintext = b"session %d object %d" % (session, i)
+                id = key.id_hash(plaintext)
+                objects.append((id, key.encrypt(id, plaintext), plaintext))
+        for id, encrypted, plaintext in objects + objects[::-1]:
+            assert key.decrypt(id, encrypted) == plaintext
+
+    def test_decrypt_threads(self, key):
+        # the session ciphers are stateful (iv), threads decrypting objects of the same session must not interfere.
+        objects = []
+        for i in range(3000):
+            plaintext = b"object %d" % i
+            id = key.id_hash(plaintext)
+            objects.append((id, key.encrypt(id, plaintext), plaintext))
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads as often as possible
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda obj: key.decrypt(obj[0], obj[1]), objects))
+        finally:
+            sys.setswitchinterval(switch_interval)
+        assert results == [plaintext for _, _, plaintext in objects]
+
     def test_assert_id(self, key):
         plaintext = b"123456789"
         id = key.id_hash(plaintext)
@@ -0,0 +1,99 @@
+import pytest
+
+from .hashindex_test import H
+from ..filescache import FilesCacheTable, HEADER_SIZE, RECORD_SIZE, MIN_SLOTS
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    return tmp_path / "filestable.test"
+
+
+def test_put_get(table_path):
+    table = FilesCacheTable(table_path, ttl=2)
+    assert table.created
+    assert table.get(H(1)) is None
+    table.put(H(1), 1, 4, 10, 20, [(H(10), 2), (H(11), 2)])
+    assert table.get(H(1)) == (0, 1, 4, 10, 20, [(H(10), 2), (H(11), 2)])
+    table.put(H(1), 2, 2, 30, 40, [(H(12), 2)])
+    assert table.get(H(1)) == (0, 2, 2, 30, 40, [(H(12), 2)])
+    table.delete(H(1))
+    assert table.get(H(1)) is None
+    table.close(discard_after=2**63 - 1)
+
+
+def test_persistence_and_ttl(table_path):
+    table = FilesCacheTable(table_path, ttl=2)
+    table.put(H(1), 1, 0, 10, 20, [])
+    table.close(discard_after=2**63 - 1)
+    for age in 1, 2:
+        table = FilesCacheTable(table_path, ttl=2)
+        assert not table.created
+        assert table.get(H(1)) == (age, 1, 0, 10, 20, [])
+        table.close(discard_after=2**63 - 1)
+    table = FilesCacheTable(table_path, ttl=2)
+    assert table.get(H(1)) is None  # expired
+    table.close(discard_after=2**63 - 1)
+
+
+def test_race_discard(table_path):
+    table = FilesCacheTable(table_path, ttl=2)
+    table.recent_after = 100
+    table.put(H(1), 1, 0, 10, 20, [])  # old enough
+    table.put(H(2), 2, 0, 10, 50, [])  # old enough
+    table.put(H(3), 3, 0, 50, 40, [])  # old enough
+    table.put(H(4), 4, 0, 150, 20, [])  # recent
+    assert table.close(discard_after=100) == 1
+    table = FilesCacheTable(table_path, ttl=2)
+    assert table.get(H(4)) is None
+    table.put(H(4), 4, 0, 60, 20, [])
+    assert table.close(discard_after=60) == 1
+    table = FilesCacheTable(table_path, ttl=2)
+    assert table.get(H(1)) is not None
+    assert table.get(H(2)) is not None
+    assert table.get(H(3)) is not None
+    assert table.get(H(4)) is None
+    table.close(discard_after=2**63 - 1)
+
+
+def test_grow(table_path):
+    count = 2 * MIN_SLOTS
+    table = FilesCacheTable(table_path, ttl=2)
+    for i in range(count):
+        table.put(H(i), i, i, i, i, [(H(i), i)] * 100)
+    table.close(discard_after=2**63 - 1)
+    table = FilesCacheTable(table_path, ttl=2)
+    assert table.slots > MIN_SLOTS
+    for i in range(count):
+        assert table.get(H(i)) == (1, i, i, i, i, [(H(i), i)] * 100)
+    table.close(discard_after=2**63 - 1)
+
+
+def test_corrupted_record(table_path):
+    table = FilesCacheTable(table_path, ttl=2)
+    table.put(H(1), 1, 0, 10, 20, [])
+    table.put(H(2), 2, 0, 10, 20, [])
+    table.close(discard_after=2**63 - 1)
+    with open(table_path, "r+b") as fd:
+        data = fd.read(HEADER_SIZE + MIN_SLOTS * RECORD_SIZE)
+        offset = data.index(H(1))
+        fd.seek(offset + 40)
+        fd.write(b"\xff")
+    table = FilesCacheTable(table_path, ttl=2)
+    assert table.get(H(1)) is None
+    assert table.get(H(2)) is not None
+    table.put(H(1), 1, 0, 10, 20, [])
+    assert table.get(H(1)) is not None
+    table.close(discard_after=2**63 - 1)
+
+
+def test_corrupted_header(table_path):
+    table = FilesCacheTable(table_path, ttl=2)
+    table.put(H(1), 1, 0, 10, 20, [])
+    table.close(discard_after=2**63 - 1)
+    with open(table_path, "r+b") as fd:
+        fd.write(b"XXX")
+    table = FilesCacheTable(table_path, ttl=2)
+    assert table.created
+    assert table.get(H(1)) is None
+    table.close(discard_after=2**63 - 1)
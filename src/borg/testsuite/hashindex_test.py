@@ -1,4 +1,5 @@
 import hashlib
+import io
 import struct
 
 import pytest
@@ -55,3 +56,118 @@ def new_chunks():
     assert new_chunks() == [(key2, value2a)]
     chunks.clear_new()
     assert new_chunks() == []
+    # clear the F_NEW flag only of the matching entries
+    key3, value3 = H2(3), ChunkIndexEntry(flags=ChunkIndex.F_NONE, size=5)
+    chunks[H2(4)] = value2a
+    chunks[key3] = value3
+    chunks.clear_new(ChunkIndex.F_USED)
+    assert new_chunks() == [(key3, value3)]
+
+
+def test_clear_count_flags():
+    chunks = ChunkIndex()
+    chunks[H2(1)] = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=1)
+    chunks[H2(2)] = ChunkIndexEntry(flags=ChunkIndex.F_USED | ChunkIndex.F_COMPRESS, size=2)
+    chunks[H2(3)] = ChunkIndexEntry(flags=ChunkIndex.F_NONE, size=4)
+    del chunks[H2(3)]
+    chunks[H2(4)] = ChunkIndexEntry(flags=ChunkIndex.F_NONE, size=8)
+    assert chunks.count_flags(ChunkIndex.F_USED) == 2
+    assert chunks.count_flags(ChunkIndex.F_COMPRESS) == 1
+    assert chunks.count_flags(ChunkIndex.F_USED, ChunkIndex.F_NONE) == 1
+    assert chunks.count_flags(ChunkIndex.F_NEW) == 3
+    assert chunks.sum_sizes() == 11
+    assert chunks.sum_sizes(ChunkIndex.F_USED) == 3
+    chunks.clear_flags(ChunkIndex.F_USED | ChunkIndex.F_NEW)
+    assert chunks.count_flags(ChunkIndex.F_USED) == 0
+    assert chunks.count_flags(ChunkIndex.F_NEW) == 0
+    assert chunks[H2(2)] == ChunkIndexEntry(flags=ChunkIndex.F_COMPRESS, size=2)
+
+
+def test_extract():
+    chunks = ChunkIndex()
+    for i in range(1000):
+        chunks[H2(i)] = ChunkIndexEntry(flags=ChunkIndex.F_USED if i % 3 else ChunkIndex.F_NONE, size=i)
+    unused = chunks.extract(ChunkIndex.F_USED, ChunkIndex.F_NONE)
+    assert len(unused) == 334
+    assert dict(unused.iteritems()) == {H2(i): (ChunkIndex.F_NONE, i) for i in range(0, 1000, 3)}
+    assert len(unused.extract(ChunkIndex.F_NEW)) == 334  # system flags are kept
+    used = chunks.extract(ChunkIndex.F_USED, keys_only=True)
+    assert dict(used.iteritems()) == {H2(i): (ChunkIndex.F_NONE, 0) for i in range(1000) if i % 3}
+    empty = chunks.extract(ChunkIndex.F_COMPRESS)
+    assert len(empty) == 0
+    empty.merge(used)  # an empty extracted index can grow
+    assert len(empty) == len(used)
+
+
+def test_merge():
+    chunks = ChunkIndex()
+    chunks[H2(1)] = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=1)
+    chunks[H2(2)] = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=2)
+    chunks.clear_new()
+    chunks[H2(3)] = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=3)
+    other = ChunkIndex()
+    other[H2(2)] = ChunkIndexEntry(flags=ChunkIndex.F_COMPRESS, size=2)
+    other[H2(3)] = ChunkIndexEntry(flags=ChunkIndex.F_NONE, size=3)
+    for i in range(4, 1000):
+        other[H2(i)] = ChunkIndexEntry(flags=ChunkIndex.F_USED, size=i)
+    expected = {key: value for key, value in chunks.iteritems()}
+    expected.update(other.iteritems())
+    chunks.merge(other)
+    assert dict(chunks.iteritems()) == expected
+    assert chunks[H2(2)] == ChunkIndexEntry(flags=ChunkIndex.F_COMPRESS, size=2)
+    # existing items keep their F_NEW state, merged in items are new
+    assert {key for key, _ in chunks.iteritems(only_new=True)} == {H2(i) for i in range(3, 1000)}
+
+
+def test_write_keys_merge_serialized():
+    chunks = ChunkIndex()
+    for i in range(1000):
+        chunks[H2(i)] = ChunkIndexEntry(flags=ChunkIndex.F_USED if i % 3 else ChunkIndex.F_NONE, size=i)
+    with io.BytesIO() as f:
+        assert chunks.write_keys(f, ChunkIndex.F_USED) == 666
+        data = f.getvalue()
+    expected = {H2(i): (ChunkIndex.F_NONE, 0) for i in range(1000) if i % 3}
+    assert dict(ChunkIndex.read(io.BytesIO(data)).iteritems()) == expected
+    merged = ChunkIndex()
+    merged[H2(1)] = ChunkIndexEntry(flags=ChunkIndex.F_COMPRESS, size=1)
+    merged.clear_new()
+    assert merged.merge_serialized(data) == 666
+    assert dict(merged.iteritems()) == {H2(i): (ChunkIndex.F_NONE, 0) for i in range(1000) if i % 3}
+    assert {key for key, _ in merged.iteritems(only_new=True)} == {H2(i) for i in range(2, 1000) if i % 3}
+    with pytest.raises(ValueError):
+        merged.merge_serialized(data[:-1])
+    with pytest.raises(ValueError):
+        merged.merge_serialized(data + b"x")
+
+
+def test_mmap_chunkindex(tmp_path):
+    mmapped, chunks = ChunkIndex(mmap_dir=tmp_path), ChunkIndex()
+    assert mmapped.is_mmap and not chunks.is_mmap
+    for index in mmapped, chunks:
+        for i in range(10000):
+            index[H2(i)] = ChunkIndexEntry(flags=ChunkIndex.F_USED if i % 3 else ChunkIndex.F_NONE, size=i)
+        for i in range(0, 10000, 7):
+            del index[H2(i)]
+        index.clear_new()
+        for i in range(10000, 12000):
+            index.add(H2(i), i)
+    assert len(mmapped) == len(chunks)
+    assert dict(mmapped.iteritems()) == dict(chunks.iteritems())
+    assert dict(mmapped.iteritems(only_new=True)) == dict(chunks.iteritems(only_new=True))
+    assert H2(0) not in mmapped and mmapped.get(H2(0)) is None
+    assert mmapped[H2(1)] == ChunkIndexEntry(flags=ChunkIndex.F_USED, size=1)
+    assert mmapped.idx_to_k(mmapped.k_to_idx(H2(1))) == H2(1)
+    assert mmapped.count_flags(ChunkIndex.F_USED) == chunks.count_flags(ChunkIndex.F_USED)
+    assert mmapped.sum_sizes() == chunks.sum_sizes()
+    with io.BytesIO() as f:
+        mmapped.write(f)
+        assert dict(ChunkIndex.read(io.BytesIO(f.getvalue())).iteritems()) == dict(chunks.iteritems())
+    with io.BytesIO() as f:
+        mmapped.write_keys(f, ChunkIndex.F_NEW)
+        data = f.getvalue()
+    merged = ChunkIndex(mmap_dir=tmp_path)
+    assert merged.merge_serialized(data) == 2000
+    merged.merge(chunks.extract(ChunkIndex.F_USED))
+    assert len(merged) == chunks.count_flags(ChunkIndex.F_USED)
+    mmapped.clear()
+    assert len(mmapped) == 0 and H2(1) not in mmapped
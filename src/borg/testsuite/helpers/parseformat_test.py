@@ -583,6 +583,7 @@ def test_eval_escapes():
         ("10,23,16,4095", ("buzhash", 10, 23, 16, 4095)),
         ("fixed,4096", ("fixed", 4096, 0)),
         ("fixed,4096,200", ("fixed", 4096, 200)),
+        ("fastcdc,19,23,21", ("fastcdc", 19, 23, 21)),
     ],
 )
 def test_valid_chunkerparams(chunker_params, expected_return):
@@ -597,6 +598,10 @@ def test_valid_chunkerparams(chunker_params, expected_return):
         "buzhash,19,24,21,4095",  # too big max. size
         "buzhash,23,19,21,4095",  # violates min <= mask <= max
         "buzhash,19,23,21,4096",  # even window size
+        "fastcdc,5,7,6",  # too small min. size
+        "fastcdc,19,24,21",  # too big max. size
+        "fastcdc,19,23,24",  # violates min <= mask <= max
+        "fastcdc,19,19,19",  # violates min < max
         "fixed,63",  # too small block size
         "fixed,%d,%d" % (MAX_DATA_SIZE + 1, 4096),  # too big block size
         "fixed,%d,%d" % (4096, MAX_DATA_SIZE + 1),  # too big header size
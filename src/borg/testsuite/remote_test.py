@@ -1,4 +1,5 @@
 import errno
+import heapq
 import os
 import io
 import time
@@ -6,11 +7,15 @@
 
 import pytest
 
+from ..compress import ZSTD
 from ..constants import ROBJ_FILE_STREAM
-from ..remote import SleepingBandwidthLimiter, RepositoryCache, cache_if_remote
+from .. import remote
+from ..remote import SleepingBandwidthLimiter, InflightWindow, RepositoryCache, cache_if_remote
+from ..remote import RPCCompression, FRAME, FRAME_SIZE, RPC_COMPRESSION_MIN_SIZE
+from ..remote import UnexpectedRPCDataFormatFromClient, UnexpectedRPCDataFormatFromServer
 from ..repository import Repository
 from ..crypto.key import PlaintextKey
-from ..helpers import IntegrityError
+from ..helpers import IntegrityError, DecompressionError, msgpack
 from ..repoobj import RepoObj
 from .hashindex_test import H
 from .repository_test import fchunk, pdchunk
@@ -71,6 +76,122 @@ def test_write(self, monkeypatch):
         it.write(5, b"1")
 
 
+class TestInflightWindow:
+    def run(self, monkeypatch, latency, service_time, count=10000, **kw):
+        """simulate a link with this latency to a server needing service_time per request"""
+        now = 0.0
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        window = InflightWindow(**kw)
+        responses = []  # heap of (time, msgid)
+        server_free = msgid = 0
+        for _ in range(count):
+            while msgid < count and window.can_send():
+                msgid += 1
+                window.sent(msgid, 100)
+                server_free = max(now + latency / 2, server_free) + service_time
+                heapq.heappush(responses, (server_free + latency / 2, msgid))
+            now, id = heapq.heappop(responses)
+            window.received(id, 100)
+        return window
+
+    def test_grow(self, monkeypatch):
+        # the requests are on the wire, not queued at the server, so we grow the window
+        window = self.run(monkeypatch, latency=0.15, service_time=0.0001, initial=10)
+        assert window.window_min == 10
+        assert int(window.window) == window.window_max > 100
+        assert len(window) == 0 and window.outstanding_bytes == 0
+        window = self.run(monkeypatch, latency=0.15, service_time=0.0001, initial=10, maximum=50)
+        assert int(window.window) == 50
+
+    def test_shrink(self, monkeypatch):
+        # the server is the bottleneck, more requests in flight would only queue up there
+        window = self.run(monkeypatch, latency=0.05, service_time=0.01, initial=100)
+        assert not window.slow_start
+        assert window.window_max > 100
+        assert int(window.window) < 20
+        assert "RTT" in window.summary()
+        assert window.history_str().startswith("0s:100 ")
+
+    def test_max_bytes(self, monkeypatch):
+        window = InflightWindow(initial=100, max_bytes=1000)
+        window.sent(1, 2000)
+        assert not window.can_send()
+        window.received(1, 10)
+        assert window.can_send()
+        for msgid in range(2, 12):
+            assert window.can_send()
+            window.sent(msgid, 90)  # 90 bytes request + 10 bytes expected response
+        assert window.outstanding_bytes == 1000
+        assert not window.can_send()
+
+
+class TestRPCCompression:
+    @pytest.fixture
+    def compression(self):
+        compression = RPCCompression("client")
+        compression.enabled = compression.accept = True
+        return compression
+
+    def test_disabled(self):
+        msg = msgpack.packb({"r": [b"x" * 10000]})
+        assert RPCCompression("client").compress("list", msg) is msg
+
+    def test_uncompressed(self, compression, monkeypatch):
+        monkeypatch.setattr(remote, "RPC_COMPRESSION_MAX_SIZE", 100000)
+        payload = msgpack.packb({"r": b"x" * 10000})
+        assert compression.compress("get", payload) is payload
+        small = msgpack.packb({"r": b"x" * (RPC_COMPRESSION_MIN_SIZE // 2)})
+        assert compression.compress("list", small) is small
+        big = msgpack.packb({"r": b"x" * 100000})
+        assert compression.compress("list", big) is big
+        assert compression.size == 0
+
+    def test_roundtrip(self, compression):
+        messages = [{"r": (b"x" * 32,) * 1000}, {"i": 1, "r": None}]
+        msg = b"".join(msgpack.packb(m) for m in messages)
+        framed = compression.compress("list", msg)
+        assert len(framed) < len(msg) // 10
+        frame = msgpack.unpackb(framed)
+        assert FRAME in frame
+        assert compression.unframe(frame) == messages
+        assert compression.unframe({"i": 2, "r": 42}) == [{"i": 2, "r": 42}]
+        assert compression.size == len(msg)
+
+    def test_not_negotiated(self, compression):
+        frame = msgpack.unpackb(compression.compress("list", msgpack.packb({"r": b"x" * 10000})))
+        with pytest.raises(UnexpectedRPCDataFormatFromServer):
+            RPCCompression("client").unframe(frame)
+        with pytest.raises(UnexpectedRPCDataFormatFromClient):
+            RPCCompression("server").unframe(frame)
+
+    def test_bomb(self, compression, monkeypatch):
+        monkeypatch.setattr(remote, "RPC_COMPRESSION_MAX_SIZE", 100000)
+        msg = msgpack.packb({"r": b"x" * 100000})
+        _, data = ZSTD(level=1).compress({}, msg)
+        # the frame size is checked against the limit ...
+        with pytest.raises(UnexpectedRPCDataFormatFromServer):
+            compression.unframe({FRAME: data, FRAME_SIZE: len(msg)})
+        # ... and against the size in the zstd frame header, before decompressing
+        with pytest.raises(DecompressionError):
+            compression.unframe({FRAME: data, FRAME_SIZE: 10000})
+        with pytest.raises(UnexpectedRPCDataFormatFromServer):
+            compression.unframe({FRAME: data})
+
+    def test_skip_incompressible(self, compression):
+        msg = msgpack.packb({"r": os.urandom(10000)})
+        compression.compress("list", msg)
+        assert compression.skip["list"] == RPCCompression.SKIP
+        for _ in range(RPCCompression.SKIP):
+            assert compression.compress("list", msg) is msg
+        assert compression.skip["list"] == 0
+        # other methods are not affected
+        compressible = msgpack.packb({"r": b"x" * 10000})
+        assert compression.compress("store_list", compressible) is not compressible
+        # after skipping, we try again
+        assert compression.compress("list", msg) is msg
+        assert compression.skip["list"] == RPCCompression.SKIP
+
+
 class TestRepositoryCache:
     @pytest.fixture
     def repository(self, tmpdir):
@@ -1,17 +1,23 @@
 import logging
 import os
+import select
 import sys
+import time
+import types
 
 import pytest
 
 from ..checksums import xxh64
 from ..helpers import Location
 from ..helpers import IntegrityError
+from ..helpers import bin_to_hex
 from ..platformflags import is_win32
-from ..remote import RemoteRepository, InvalidRPCMethod, PathNotAllowed
-from ..repository import Repository, MAX_DATA_SIZE
+from .. import remote
+from ..cache import build_chunkindex_from_repo
+from ..remote import RemoteRepository, InvalidRPCMethod, PathNotAllowed, FRAME
+from ..repository import Repository, IORateLimiter, MAX_DATA_SIZE, repo_sharded_lister
 from ..repoobj import RepoObj
-from .hashindex_test import H
+from .hashindex_test import H, H2
 
 
 @pytest.fixture()
@@ -46,7 +52,7 @@ def reopen(repository, exclusive: bool | None = True, create=False):
         return Repository(repository._location, exclusive=exclusive, create=create)
 
     if isinstance(repository, RemoteRepository):
-        if repository.p is not None or repository.sock is not None:
+        if repository.connections:
             raise RuntimeError("Remote repo must be closed before a reopen. Cannot support nested repository contexts.")
         return RemoteRepository(repository.location, exclusive=exclusive, create=create)
 
@@ -136,6 +142,91 @@ def test_list(repo_fixtures, request):
         assert len(repository.list(limit=50)) == 50
 
 
+def test_list_paging(repo_fixtures, request):
+    with get_repository_from_fixture(repo_fixtures, request) as repository:
+        # H2 ids are spread over many nested data/xx/yy/ directories
+        ids = sorted(H2(x) for x in range(1000))
+        for id in ids:
+            repository.put(id, fchunk(b"SOMEDATA"))
+        assert [id for id, _ in repository.list()] == ids
+        # page through everything, continuing from the last id of each page
+        listed, marker = [], None
+        while page := repository.list(limit=77, marker=marker):
+            listed.extend(id for id, _ in page)
+            marker = page[-1][0]
+        assert listed == ids
+        # the marker does not need to be the last id returned or even an existing object
+        assert [id for id, _ in repository.list(limit=10, marker=ids[500])] == ids[501:511]
+        repository.delete(ids[600])
+        assert [id for id, _ in repository.list(limit=10, marker=ids[600])] == ids[601:611]
+        assert len(repository.list(marker=ids[-1])) == 0
+
+
+@pytest.mark.parametrize("threads", ["1", "4"])
+def test_list_prefix(repo_fixtures, request, monkeypatch, threads):
+    monkeypatch.setenv("BORG_LIST_THREADS", threads)
+    with get_repository_from_fixture(repo_fixtures, request) as repository:
+        ids = sorted(H2(x) for x in range(1000))
+        for id in ids:
+            repository.put(id, fchunk(b"SOMEDATA"))
+        for prefix in "", "a", "5c", "5c3", "ffff":
+            assert [id for id, _ in repository.list_prefix(prefix)] == [id for id in ids if id.hex().startswith(prefix)]
+        assert list(repo_sharded_lister(repository)) == list(repository.list())
+
+
+def test_async_put_delete(repo_fixtures, request):
+    with get_repository_from_fixture(repo_fixtures, request) as repository:
+        for x in range(100):
+            repository.put(H(x), fchunk(b"DATA%d" % x), wait=False)
+            repository.async_response(wait=False)
+        repository.put(H(0), fchunk(b"DATA"), wait=False)  # overwrite, while the first put might be pending
+        assert pdchunk(repository.get(H(0))) == b"DATA"
+        for x in range(50):
+            repository.delete(H(x), wait=False)
+        assert repository.async_response(wait=True) is None
+        assert len(repository.list()) == 50
+        repository.delete(H(0), wait=False)  # does not exist any more
+        with pytest.raises(Repository.ObjectNotFound):
+            while repository.async_response(wait=True) is not None:
+                pass
+        assert repository.async_response(wait=True) is None
+
+
+def test_close_raises_uncollected_async_error(repository):
+    with repository:
+        repository.delete(H(0), wait=False)  # does not exist
+        with pytest.raises(Repository.ObjectNotFound):
+            repository.close()
+        assert repository.lock is None
+
+
+def test_has_many(repo_fixtures, request):
+    with get_repository_from_fixture(repo_fixtures, request) as repository:
+        for x in range(0, 20, 3):
+            repository.put(H(x), fchunk(b"DATA%d" % x), wait=False)
+        assert repository.async_response(wait=True) is None  # has_many does not wait for these
+        bitmap = repository.has_many([H(x) for x in range(20)])
+        assert len(bitmap) == 3
+        assert [bool(bitmap[i // 8] & (1 << i % 8)) for i in range(20)] == [x % 3 == 0 for x in range(20)]
+        assert repository.has_many([]) == b""
+
+
+def test_get_many_preload(repo_fixtures, request):
+    with get_repository_from_fixture(repo_fixtures, request) as repository:
+        for x in range(100):
+            repository.put(H(x), fchunk(b"DATA%d" % x))
+        ids = [H(x) for x in reversed(range(100))] + [H(x) for x in range(100, 110)]  # the last 10 are missing
+        assert [pdchunk(c) for c in repository.get_many(ids[:100])] == [b"DATA%d" % x for x in reversed(range(100))]
+        assert list(repository.get_many(ids[100:], raise_missing=False)) == [None] * 10
+        with pytest.raises(Repository.ObjectNotFound):
+            list(repository.get_many(ids[90:]))
+        repository.preload(ids[:50])
+        repository.preload(ids[50:])
+        chunks = list(repository.get_many(ids[:50], is_preloaded=True, raise_missing=False))
+        chunks += list(repository.get_many(ids[50:], is_preloaded=True, raise_missing=False))
+        assert [c and pdchunk(c) for c in chunks] == [b"DATA%d" % x for x in range(99, -1, -1)] + [None] * 10
+
+
 def test_max_data_size(repo_fixtures, request):
     with get_repository_from_fixture(repo_fixtures, request) as repository:
         max_data = b"x" * (MAX_DATA_SIZE - RepoObj.obj_header.size)
@@ -153,6 +244,85 @@ def check(repository, repo_path, repair=False, status=True):
     assert tmp_files == [], "Found tmp files"
 
 
+def test_partial_check_resumes(repository):
+    with repository:
+        ids = sorted(H2(x) for x in range(100))
+        for id in ids:
+            repository.put(id, fchunk(b"SOMEDATA"))
+        repository.store.store("data/" + bin_to_hex(ids[10]), b"corrupted")
+        # continue a partial check after ids[50], the corrupted object is not checked again.
+        repository.store.store("cache/last-key-checked", ("data/" + bin_to_hex(ids[50])).encode())
+        assert repository.check(max_duration=3600) is True
+        assert repository.check() is False
+
+
+def test_partial_check_resumes_shards(repository):
+    with repository:
+        ids = sorted(H2(x) for x in range(100))
+        for id in ids:
+            repository.put(id, fchunk(b"SOMEDATA"))
+        corrupted = bin_to_hex(ids[10])
+        repository.store.store("data/" + corrupted, b"corrupted")
+        # continue a (parallel) partial check without --jobs, the corrupted object's shard is done already.
+        repository.store.store(f"cache/last-key-checked.{corrupted[0]}", b"done")
+        assert repository.check(max_duration=3600) is True
+        assert repository.check() is False
+
+
+def test_check_parallel(repo_fixtures, request):
+    with get_repository_from_fixture(repo_fixtures, request) as repository:
+        ids = sorted(H2(x) for x in range(200))
+        for id in ids:
+            repository.put(id, fchunk(b"SOMEDATA"))
+        assert repository.check(jobs=4) is True
+    with reopen(repository) as repository:
+        chunks = build_chunkindex_from_repo(repository)  # cached by the full check
+        assert sorted(id for id, _ in chunks.iteritems()) == ids
+        assert repository.check(jobs=4, max_duration=3600) is True
+        repository.put(ids[10], b"corrupted")
+        repository.put(ids[150], b"corrupted")
+        assert repository.check(jobs=4) is False
+        assert repository.check(jobs=4, repair=True) is True
+        assert repository.check(jobs=4) is True
+        assert [id for id, _ in repository.list()] == ids[:10] + ids[11:150] + ids[151:]
+
+
+def test_io_rate_limiter(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("borg.repository.time.sleep", sleeps.append)
+    limiter = IORateLimiter(max_bytes=1000, max_ops=10)
+    limiter.throttle(1000)  # burst of up to 1s worth of I/O is ok
+    assert sleeps == []
+    limiter.throttle(500)  # 500 bytes over the limit -> 0.5s
+    assert sleeps[-1] == pytest.approx(0.5, abs=0.1)
+    limiter = IORateLimiter(max_ops=10)
+    for i in range(15):
+        limiter.throttle(10**9)  # no byte limit
+    assert len(sleeps) == 1 + 5
+    assert sleeps[-1] == pytest.approx(0.5, abs=0.1)  # 5 objects over the limit
+    limiter = IORateLimiter()  # unlimited
+    limiter.throttle(10**9, 10**9)
+    assert len(sleeps) == 6
+
+
+def test_repository_read_rate_limit(tmp_path, monkeypatch):
+    repository_location = os.fspath(tmp_path / "repository")
+    with Repository(repository_location, exclusive=True, create=True, max_ops_rate=10) as repository:
+        throttled = []
+        monkeypatch.setattr(repository.io_limiter, "throttle", lambda nbytes=0, nops=1: throttled.append(nbytes))
+        for x in range(20):
+            repository.put(H(x), fchunk(b"SOMEDATA"))
+        assert throttled == []  # writes are not throttled
+        assert list(repository.get_many([H(x) for x in range(20)])) == [fchunk(b"SOMEDATA")] * 20
+        assert throttled == [len(fchunk(b"SOMEDATA"))] * 20
+        del throttled[:]
+        assert repository.check() is True  # reads all objects again
+        assert len(throttled) == 20
+        del throttled[:]
+        repository.delete(H(0))
+        assert throttled == [0]
+
+
 def _get_mock_args():
     class MockArgs:
         remote_path = "borg"
@@ -173,6 +343,106 @@ def test_remote_invalid_rpc(remote_repository):
             remote_repository.call("__init__", {})
 
 
+def test_remote_batch_rpc(remote_repository):
+    with remote_repository as repository:
+        assert repository.batch_rpc_version == 1
+        for batch_rpc_version in 1, 0:
+            repository.batch_rpc_version = batch_rpc_version
+            responses = repository.connections[0].window.responses
+            for x in range(250):
+                repository.put(H(x), fchunk(b"DATA%d" % x), wait=False)
+                repository.async_response(wait=False)
+            assert repository.async_response(wait=True) is None
+            ids = [H(x) for x in range(260)]  # the last 10 are missing
+            chunks = list(repository.get_many(ids, raise_missing=False))
+            assert [c and pdchunk(c) for c in chunks] == [b"DATA%d" % x for x in range(250)] + [None] * 10
+            with pytest.raises(Repository.ObjectNotFound):
+                list(repository.get_many(ids))
+            for x in range(250):
+                repository.delete(H(x), wait=False)
+            assert repository.async_response(wait=True) is None
+            messages = repository.connections[0].window.responses - responses
+            # batched: 3 put batches, 2 * 3 get batches, 3 delete batches
+            assert messages == (12 if batch_rpc_version else 250 + 2 * 260 + 250)
+
+
+def test_remote_async_responses_received_early(remote_repository, monkeypatch):
+    # the responses for the first requests of an async call may arrive while we still send the other requests.
+    def slow_select(*args):
+        time.sleep(0.01)  # give the server time to respond
+        return select.select(*args)
+
+    with remote_repository as repository:
+        monkeypatch.setattr(remote, "select", types.SimpleNamespace(select=slow_select))
+        for x in range(2):
+            # two puts of this size are sent as two requests (see BATCH_MAX_BYTES)
+            repository.put(H(x), fchunk(b"x" * 2500 * 1000), wait=False)
+            assert not repository.ignore_responses & repository.responses.keys()
+        monkeypatch.undo()
+        assert repository.async_response(wait=True) is None
+
+
+def test_remote_rpc_compression(tmp_path, monkeypatch):
+    if is_win32:
+        pytest.skip("Remote repository does not yet work on Windows.")
+    monkeypatch.setenv("BORG_RPC_COMPRESSION", "zstd")
+    repository_location = Location("ssh://__testsuite__/" + os.fspath(tmp_path / "repository"))
+    with RemoteRepository(repository_location, exclusive=True, create=True) as repository:
+        compression = repository.connections[0].compression
+        assert compression.enabled
+        frames = []
+        unframe = compression.unframe
+        monkeypatch.setattr(compression, "unframe", lambda msg: frames.append(FRAME in msg) or unframe(msg))
+        for x in range(100):
+            repository.put(H(x), fchunk(b"DATA" * 10000))  # repo objects are not compressed
+        assert compression.size == 0
+        names = sorted(bin_to_hex(H(x)) for x in range(1000))
+        for name in names:
+            repository.store_store(f"archives/{name}", b"")
+        assert not any(frames)
+        assert sorted(info[0] for info in repository.store_list("archives")) == names
+        assert frames[-1]  # the big store_list response was compressed
+        repository.store_store("cache/test", b"metadata" * 10000)
+        assert compression.size > 80000 > 10 * compression.compressed_size
+        assert repository.store_load("cache/test") == b"metadata" * 10000
+
+
+def test_remote_connections(tmp_path):
+    if is_win32:
+        pytest.skip("Remote repository does not yet work on Windows.")
+    args = _get_mock_args()
+    args.upload_ratelimit = args.upload_buffer = None
+    args.remote_connections = 3
+    repository_location = Location("ssh://__testsuite__/" + os.fspath(tmp_path / "repository"))
+    with RemoteRepository(repository_location, exclusive=True, create=True, args=args) as repository:
+        assert len(repository.connections) == 3
+        responses = [conn.window.responses for conn in repository.connections]
+        for x in range(300):
+            repository.put(H2(x), fchunk(b"DATA%d" % x), wait=False)
+        assert repository.async_response(wait=True) is None
+        # the puts were spread over all connections
+        assert all(conn.window.responses > r for conn, r in zip(repository.connections, responses))
+        summary = repository.rpc_window_summary()
+        assert summary.startswith("connection 0: ") and "; connection 2: " in summary
+        assert repository.rpc_window_history().count("0s:") == 3
+        # the first connection waits for the async puts via the other connections
+        assert sorted(id for id, _ in repository.list()) == sorted(H2(x) for x in range(300))
+        ids = [H2(x) for x in range(310)]  # the last 10 are missing
+        chunks = list(repository.get_many(ids, raise_missing=False))
+        assert [c and pdchunk(c) for c in chunks] == [b"DATA%d" % x for x in range(300)] + [None] * 10
+        with pytest.raises(Repository.ObjectNotFound):
+            list(repository.get_many(ids))
+        repository.preload(ids[::-1])
+        chunks = list(repository.get_many(ids[::-1], is_preloaded=True))
+        assert [c and pdchunk(c) for c in chunks] == [None] * 10 + [b"DATA%d" % x for x in range(299, -1, -1)]
+        assert not repository.chunkid_to_msgids
+        for x in range(300):
+            repository.delete(H2(x), wait=False)
+        assert repository.async_response(wait=True) is None
+        assert not repository.list()
+    assert not repository.connections
+
+
 def test_remote_rpc_exception_transport(remote_repository):
     with remote_repository:
         s1 = "test string"